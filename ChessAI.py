@@ -1,80 +1,49 @@
 '''
 This class handles the AI moves.
 '''
+import time
 import numpy as np
-#Evaluation scores taken from https://www.chessprogramming.org/Simplified_Evaluation_Function
-pieceScore = {'K': 20000, 'Q': 900, 'R': 500, 'N': 320, 'B': 330, 'P': 100}
-#Board evaluations for each piece are given for white side, mirrored for black side
-pawnScores = [[ 0,  0,  0,  0,  0,  0,  0,  0],
-              [50, 50, 50, 50, 50, 50, 50, 50], 
-              [10, 10, 20, 30, 30, 20, 10, 10], 
-              [ 5,  5, 10, 25, 25, 10,  5,  5], 
-              [ 0,  0,  0, 20, 20,  0,  0,  0], 
-              [ 5, -5,-10,  0,  0,-10, -5, -5], 
-              [ 5, 10, 10,-20,-20, 10, 10,  5], 
-              [ 0,  0,  0,  0,  0,  0,  0,  0]]
-
-rookScores = [[ 0,  0,  0,  0,  0,  0,  0,  0],
-              [ 5, 10, 10, 10, 10, 10, 10, 10], 
-              [-5,  0,  0,  0,  0,  0,  0,  0], 
-              [-5,  0,  0,  0,  0,  0,  0,  0], 
-              [-5,  0,  0,  0,  0,  0,  0,  0], 
-              [-5,  0,  0,  0,  0,  0,  0,  0], 
-              [-5,  0,  0,  0,  0,  0,  0,  0], 
-              [ 0,  0,  0,  5,  5,  0,  0,  0]]
-
-knightScores = [[-50,-40,-30,-30,-30,-30,-40,-50],
-                [-40,-20,  0,  0,  0,  0,-20,-40], 
-                [-30, 0 , 10, 15, 15, 10,  0,-30], 
-                [-30,  5, 15, 20, 20, 15,  5,-30], 
-                [-30,  5, 15, 20, 20, 15,  5,-30], 
-                [-30, 0 , 10, 15, 15, 10,  0,-30], 
-                [-40,-20,  0,  0,  0,  0,-20,-40],
-                [-50,-40,-30,-30,-30,-30,-40,-50]]
-
-bishopScores = [[-20,-10,-10,-10,-10,-10,-10,-20],
-                [-10,  0,  0,  0,  0,  0,  0,-10], 
-                [-10,  0,  5, 10, 10,  5,  0,-10], 
-                [-10,  5,  5, 10, 10,  5,  5,-10], 
-                [-10,  0, 10, 10, 10, 10,  0,-10], 
-                [-10, 10, 10, 10, 10, 10, 10,-10], 
-                [-10,  5,  0,  0,  0,  0,  5,-10], 
-                [-20,-10,-10,-10,-10,-10,-10,-20]]
-
-queenScores = [[-20,-10,-10, -5, -5,-10,-10,-20],
-               [-10,  0,  0,  0,  0,  0,  0,-10], 
-               [-10,  0,  5,  5,  5,  5,  0,-10], 
-               [ -5,  0,  5,  5,  5,  5,  0, -5], 
-               [  0,  0,  5,  5,  5,  5,  0, -5], 
-               [-10,  0,  5,  5,  5,  5,  0,-10], 
-               [-10,  0,  5,  0,  0,  0,  0,-10], 
-               [-20,-10,-10, -5, -5,-10,-10,-20]]
-
-kingScores = [[-30,-40,-40,-50,-50,-40,-40,-30],
-              [-30,-40,-40,-50,-50,-40,-40,-30], 
-              [-30,-40,-40,-50,-50,-40,-40,-30], 
-              [-30,-40,-40,-50,-50,-40,-40,-30],
-              [-20,-30,-30,-40,-40,-30,-30,-20],
-              [-10,-20,-20,-20,-20,-20,-20,-10],
-              [ 20, 20,  0,  0,  0,  0, 20, 20],
-              [ 20, 30, 10,  0,  0, 10, 30, 20]]
-
-endGameKingScores = [[-50,-40,-30,-20,-20,-30,-40,-50],
-                     [-30,-20,-10,  0,  0,-10,-20,-30], 
-                     [-30,-10, 20, 30, 30, 20,-10,-30], 
-                     [-30,-10, 30, 40, 40, 30,-10,-30],
-                     [-30,-10, 30, 40, 40, 30,-10,-30],
-                     [-30,-10, 20, 30, 30, 20,-10,-30], 
-                     [-30,-30,  0,  0,  0,  0,-30,-30], 
-                     [-50,-30,-30,-30,-30,-30,-30,-50]]
-
-piecePositionScores = {'wP': pawnScores, 'bP': np.flip(pawnScores), 'wR': rookScores, 'bR': np.flip(rookScores), 'wN': knightScores, 'bN': np.flip(knightScores), 
-                       'wB': bishopScores, 'bB': np.flip(bishopScores), 'wQ': queenScores, 'bQ': np.flip(queenScores), 'wK': kingScores, 'bK': np.flip(kingScores),
-                       'endGameWK': endGameKingScores, 'endGameBK': np.flip(endGameKingScores)} #flip the values if black piece
+import ChessBitbase
+import ChessBook
+import ChessEvaluation
+import ChessTranspositionTable
+#Evaluation scores taken from https://www.chessprogramming.org/Simplified_Evaluation_Function, see ChessEvaluation
+pieceScore, piecePositionScores = ChessEvaluation.pieceScore, ChessEvaluation.piecePositionScores
+pawnScores, rookScores, knightScores, bishopScores = ChessEvaluation.pawnScores, ChessEvaluation.rookScores, ChessEvaluation.knightScores, ChessEvaluation.bishopScores
+queenScores, kingScores, endGameKingScores = ChessEvaluation.queenScores, ChessEvaluation.kingScores, ChessEvaluation.endGameKingScores
 
 CHECKMATE = 60000 #must be greater 9Q's + 1K. Since if both sides promotes all pawns to queens, board score must be < 60000
 STALEMATE = 0
-DEPTH = 4 #how far deep we want to look for best move
+DEPTH = 4 #how far deep we want to look for best move, unless the caller passes its own budget
+TIME_CHECK_INTERVAL = 256 #nodes searched between clock reads (and stop checks) when searching under a time budget
+HASH_SIZE_MB = 16 #memory used by the transposition table
+SHOW_SEARCH_STATS = False #print transposition table hit rate and fill after each search, ChessMain turns it on
+transpositionTable = ChessTranspositionTable.TranspositionTable(HASH_SIZE_MB) #scores of positions already searched, reused between transpositions
+rootDepth = DEPTH #depth of the current iteration, the search is at the root when depth == rootDepth
+nodesSearched, nodeLimit, deadline, searchStart = 0, None, None, 0 #budget of the current search
+quiescenceNodes = 0 #nodes searched past the horizon, counted apart from nodesSearched. The node budget covers both
+DELTA_MARGIN = 200 #a capture is skipped in the quiescence search if winning the piece plus this margin still can't raise alpha
+stopCheck = None #function returning True once the search has been told to stop, checked with the clock
+USE_OPENING_BOOK = True #play a move from the opening book (ChessBook.BOOK_FILE) instead of searching when the position is in it
+openingBook, openingBookLoaded = None, False #loaded on the 1st search, None if there is no book file
+USE_BITBASES = True #take the score of positions covered by the endgame bitbases (ChessBitbase.BITBASE_DIR) from them instead of searching
+BITBASE_WIN = 50000 #score of a bitbase win, minus the plies to mate so shorter wins score higher. Below CHECKMATE, above any material score
+#Move ordering, highest score is searched first: the hash move, then captures by MVV-LVA (most valuable victim, least valuable attacker), then
+#the 2 killer moves of the ply (quiet moves that caused a cutoff in a sibling position), then the other quiet moves by their history score
+HASH_MOVE_SCORE, CAPTURE_SCORE, KILLER_SCORE = 1 << 30, 1 << 24, 1 << 22
+HISTORY_LIMIT = 1 << 20 #history scores are halved once one reaches this, so they stay below the killers
+MAX_PLY = 128
+killerMoves = [[None, None] for ply in range(MAX_PLY)] #moveIDs of the 2 latest killers per ply from the root, newest first
+historyTable = [[0] * 4096 for color in range(2)] #butterfly table: [white to move][start square * 64 + end square], bumped on quiet cutoffs
+betaCutoffs, firstMoveCutoffs = 0, 0 #how often a node cut off, and how often it was the 1st move that did, to measure the ordering
+#Batch evaluation encodes each position as 64 piece codes (row * 8 + col order), 0 for an empty square. Planes are in the same piece order
+PIECES = ['wP', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bP', 'bR', 'bN', 'bB', 'bQ', 'bK']
+PIECE_CODES = {piece: code for code, piece in enumerate(['--'] + PIECES)}
+#(13, 64) lookup tables: score or phase weight of piece code c on square s, so a batch of codes can be scored with one gather
+MIDDLEGAME_TABLE = np.array([[0] * 64] + [[value for row in ChessEvaluation.MIDDLEGAME_VALUES[piece] for value in row] for piece in PIECES], dtype = np.int64)
+ENDGAME_TABLE = np.array([[0] * 64] + [[value for row in ChessEvaluation.ENDGAME_VALUES[piece] for value in row] for piece in PIECES], dtype = np.int64)
+PHASE_TABLE = np.array([0] + [ChessEvaluation.PHASE_WEIGHTS[piece[1]] for piece in PIECES], dtype = np.int64)
+MINOR_CODES = [PIECE_CODES[piece] for piece in ('wN', 'wB', 'bN', 'bB')]
 
 '''
 Looks through every valid move in the current game state for current side's turn. Finds the 'best' move based on board score, and returns it.
@@ -91,6 +60,7 @@ def findBestMove(gameState, validMoves):
 
         if gameState.checkmate:
 
+            gameState.undoMove()
             return AImove
 
         elif gameState.stalemate:
@@ -111,38 +81,251 @@ def findBestMove(gameState, validMoves):
     return bestMove
 
 '''
-Calls a helper function to get the best valid move and adds it to the return queue.
+Raised inside the search once the node or time budget runs out, so the unfinished iteration can be thrown away
 '''
-def findBestNegaMaxAlphaBetaMove(gameState, validMoves, returnQueue):
+class SearchAborted(Exception):
 
-    global nextMove
-    nextMove = None
-    findNegaMaxAlphaBetaMove(gameState, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gameState.whiteToMove else -1)
-    returnQueue.put(nextMove)
+    pass
+
+'''
+Calls a helper function to get the best valid move and adds it to the return queue. The search is limited by the depth, time (milliseconds)
+and node budgets given, by default it searches to DEPTH with no time or node limit.
+'''
+def findBestNegaMaxAlphaBetaMove(gameState, validMoves, returnQueue, maxDepth = None, maxTimeMs = None, maxNodes = None):
+
+    move, score, depth = iterativeDeepening(gameState, validMoves, maxDepth, maxTimeMs, maxNodes)
+    if SHOW_SEARCH_STATS and depth == 0 and move is not None:
+
+        print('Book move ' + move.getChessNotation())
+
+    elif SHOW_SEARCH_STATS:
+
+        stats = transpositionTable.getStats()
+        print('Depth %d, score %d, %d nodes + %d quiescence nodes in %.0fms. Hash: %.1f%% hits (%d/%d probes), %.1f%% full of %dMB. %.1f%% first move cutoffs' % (
+              depth, score, nodesSearched, quiescenceNodes, (time.perf_counter() - searchStart) * 1000, stats['hitRate'], stats['hits'], stats['probes'],
+              stats['fillPercentage'], stats['sizeMB'], 100 * firstMoveCutoffs / betaCutoffs if betaCutoffs else 0))
+
+    returnQueue.put(move)
+
+'''
+Prepares the tables kept between searches for a new one: old table entries become the first to be replaced, killers from the last move are
+dropped (the plies have shifted) and history scores are halved so recent cutoffs count for more
+'''
+def newSearch():
+
+    global betaCutoffs, firstMoveCutoffs
+    transpositionTable.newSearch()
+    for killers in killerMoves:
+
+        killers[0], killers[1] = None, None
+
+    for history in historyTable:
+
+        for index in range(len(history)):
+
+            history[index] >>= 1
+
+    betaCutoffs, firstMoveCutoffs = 0, 0
+
+'''
+Returns the score of the position for the side to move from the endgame bitbases, or None if it isn't in them
+'''
+def bitbaseScore(gameState):
+
+    result = ChessBitbase.probe(gameState)
+    if result is None:
+
+        return None
+
+    outcome, plies = result
+    if outcome < 0 and plies == 0: #checkmated, scored the same as when the search finds it
+
+        return -CHECKMATE
+
+    return outcome * (BITBASE_WIN - plies)
+
+'''
+Returns a move from the opening book for the game state, or None if it isn't in the book (or the book is turned off or missing)
+'''
+def findBookMove(gameState, validMoves):
+
+    global openingBook, openingBookLoaded
+    if not USE_OPENING_BOOK:
+
+        return None
+
+    if not openingBookLoaded:
+
+        openingBook, openingBookLoaded = ChessBook.loadBook(), True
+
+    return openingBook.chooseMove(gameState, validMoves) if openingBook is not None else None
+
+'''
+Searches depth 1, 2, 3, ... until maxDepth is reached, the time (milliseconds) or node budget runs out or shouldStop returns True. Each
+iteration searches the previous best move first (it is in the transposition table) and leaves the table filled for the next one. Returns
+(move, score, depth) of the last completed iteration, the 1st iteration always completes so there is always a move unless there are no valid moves.
+A move from the opening book is returned straight away, with score and depth 0.
+'''
+def iterativeDeepening(gameState, validMoves, maxDepth = None, maxTimeMs = None, maxNodes = None, shouldStop = None):
+
+    global nextMove, rootDepth, nodesSearched, quiescenceNodes, nodeLimit, deadline, searchStart, stopCheck
+    newSearch()
+    searchStart = time.perf_counter()
+    nodesSearched, quiescenceNodes = 0, 0
+    nodeLimit, deadline, stopCheck = None, None, None #no budget while the 1st iteration runs
+    bestMove, bestScore, completedDepth = None, 0, 0
+    maxDepth = DEPTH if maxDepth is None else maxDepth
+    startingMoves = len(gameState.moveLog)
+    bookMove = findBookMove(gameState, validMoves)
+    if bookMove is not None:
+
+        return bookMove, 0, 0
+
+    for depth in range(1, maxDepth + 1):
+
+        nextMove = None
+        rootDepth = depth
+        try:
+
+            score = findNegaMaxAlphaBetaMove(gameState, validMoves, depth, -CHECKMATE, CHECKMATE, 1 if gameState.whiteToMove else -1)
+
+        except SearchAborted: #out of budget, take back the moves the unfinished search was in the middle of
+
+            while len(gameState.moveLog) > startingMoves:
+
+                gameState.undoMove()
+
+            break
+
+        bestMove, bestScore, completedDepth = nextMove, score, depth
+        if len(validMoves) <= 1 or abs(score) >= CHECKMATE: #forced move or mate found, searching deeper won't change the move
+
+            break
+
+        nodeLimit, stopCheck = maxNodes, shouldStop
+        deadline = searchStart + maxTimeMs / 1000 if maxTimeMs is not None else None
+        if (deadline is not None and time.perf_counter() >= deadline) or (stopCheck is not None and stopCheck()):
+
+            break
+
+    return bestMove, bestScore, completedDepth
+
+'''
+Returns the moves of the principal variation starting with move, following the best moves stored in the transposition table for at most
+length moves. Stops early at a position that isn't in the table or a stored move that isn't valid (the entry was overwritten). The game
+state is left as it was, checkmate and stalemate flags included
+'''
+def principalVariation(gameState, move, length):
+
+    checkmate, stalemate = gameState.checkmate, gameState.stalemate
+    line = [move]
+    gameState.makeMove(move)
+    while len(line) < length:
+
+        entry = transpositionTable.probe(gameState.zobristHash)
+        reply = gameState.getMove(entry[3]) if entry is not None and entry[3] is not None else None
+        if reply is None:
+
+            break
+
+        line.append(reply)
+        gameState.makeMove(reply)
+
+    for played in line:
+
+        gameState.undoMove()
+
+    gameState.checkmate, gameState.stalemate = checkmate, stalemate
+    return line
 
 '''
 Uses nega-max algorithm to recursively find the best possible move at certain depth. For each valid move, find the opponents valid moves and get their
 best valid move. Includes alpha-beta pruning to improve search efficiency so we don't need to search through the unneccesary subtrees if there exists a 
 subtree that contains a better move for opponent.
+Positions already searched deep enough are looked up in the transposition table before generating any moves. validMoves is None below the
+root, there the moves are generated in stages by stagedMoves, so a node that cuts off early never generates the rest. The root moves are
+sorted by orderMoves.
 '''
 def findNegaMaxAlphaBetaMove(gameState, validMoves, depth, alpha, beta, turnMultiplier):
 
-    global nextMove
-    if depth == 0:
+    global nextMove, nodesSearched, betaCutoffs, firstMoveCutoffs
+    nodesSearched += 1
+    if nodeLimit is not None and nodesSearched + quiescenceNodes > nodeLimit:
+
+        raise SearchAborted
+
+    if nodesSearched % TIME_CHECK_INTERVAL == 0 and ((deadline is not None and time.perf_counter() >= deadline) or (stopCheck is not None and stopCheck())):
+
+        raise SearchAborted
+
+    if depth != rootDepth and gameState.insufficientMaterial(): #a draw however it is played, the root still has to pick a move
+
+        return STALEMATE
+
+    if USE_BITBASES and depth != rootDepth and gameState.pieceCount <= ChessBitbase.maxPieces: #exact result, no need to search any deeper
+
+        score = bitbaseScore(gameState)
+        if score is not None:
+
+            return score
+
+    alphaOriginal = alpha
+    key = gameState.zobristHash
+    entry = transpositionTable.probe(key)
+    hashMoveID = None
+    if entry is not None:
+
+        entryDepth, entryScore, entryBound, hashMoveID = entry
+        if entryDepth >= depth and depth != rootDepth: #never cut at the root, the best move has to be found there
+
+            if entryBound == ChessTranspositionTable.EXACT:
+
+                return entryScore
+
+            elif entryBound == ChessTranspositionTable.LOWER_BOUND:
+
+                alpha = max(alpha, entryScore)
+
+            else:
+
+                beta = min(beta, entryScore)
+
+            if alpha >= beta:
+
+                return entryScore
+
+    if depth == 0: #once we reach the max depth, keep searching captures until the position is quiet, so the score isn't taken mid exchange
         
-        return turnMultiplier * boardScore(gameState) #once we reach the max depth, evaluate the board state and return it (white wants +score, black -score)
+        score = quiescenceSearch(gameState, alpha, beta, turnMultiplier, True)
+        if score <= alphaOriginal:
+
+            bound = ChessTranspositionTable.UPPER_BOUND
+
+        elif score >= beta:
+
+            bound = ChessTranspositionTable.LOWER_BOUND
+
+        else:
+
+            bound = ChessTranspositionTable.EXACT
+
+        transpositionTable.store(key, 0, score, bound, None)
+        return score
 
+    ply = rootDepth - depth
     maxScore = -CHECKMATE #start at the lowest possible score
-    for move in validMoves:
+    bestMove = None
+    moveNumber = -1
+    for moveNumber, move in enumerate(orderMoves(gameState, validMoves, hashMoveID, ply) if validMoves is not None else stagedMoves(gameState, hashMoveID, ply)):
 
         gameState.makeMove(move)
-        nextMoves = gameState.getValidMoves()
         #recursive call on next validmoves, go down another depth. now its the other players turn, so we negate our values
-        score = -findNegaMaxAlphaBetaMove(gameState, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
-        if score > maxScore: #if found new max score, update it
+        score = -findNegaMaxAlphaBetaMove(gameState, None, depth - 1, -beta, -alpha, -turnMultiplier)
+        if score > maxScore or bestMove is None: #if found new max score, update it. The 1st move counts even if it gets mated, so there is always a best move
 
             maxScore = score
-            if depth == DEPTH: #if reach max depth, then we found new best move
+            bestMove = move
+            if depth == rootDepth: #if at the root, then we found new best move
 
                 nextMove = move
 
@@ -153,21 +336,236 @@ def findNegaMaxAlphaBetaMove(gameState, validMoves, depth, alpha, beta, turnMult
 
         if alpha >= beta: #if we already found a move thats better than current move, then dont need to search down this subtree
 
+            betaCutoffs += 1
+            firstMoveCutoffs += moveNumber == 0
+            if move.pieceCaptured == '--' and not move.isPawnPromotion: #captures are already searched early, remember quiet moves that cut off
+
+                updateQuietCutoff(gameState, move, depth, ply)
+
             break
 
-    if gameState.stalemate:
+    if moveNumber == -1 and not gameState.inCheck(): #no valid moves and not in check, stalemate. In check it stays -CHECKMATE
+
+        maxScore = STALEMATE
+
+    if maxScore <= alphaOriginal: #no move raised alpha, real score may be even lower
+
+        bound = ChessTranspositionTable.UPPER_BOUND
+
+    elif maxScore >= beta: #cut off, real score may be even higher
+
+        bound = ChessTranspositionTable.LOWER_BOUND
 
-        maxScore = 0
+    else:
 
+        bound = ChessTranspositionTable.EXACT
+
+    transpositionTable.store(key, depth, maxScore, bound, bestMove.moveID if bestMove is not None else None)
     return maxScore
+
+'''
+Searches only captures and promotions below the horizon until the position is quiet. The side to move can always 'stand pat' and take the
+board score instead of capturing, so that is the lowest the score can be, and it cuts off straight away if that is already >= beta. Captures
+that couldn't raise alpha even if the piece was won for free (plus DELTA_MARGIN) are skipped (delta pruning), and so are losing captures.
+Only the noisy moves are generated, unless in check: then the check can't be ignored, so there is no stand pat or pruning and every evasion
+is searched, which also rules out checkmate (stalemate isn't looked for below the horizon).
+horizon is True for the depth 0 node of the main search, which is already counted in nodesSearched.
+'''
+def quiescenceSearch(gameState, alpha, beta, turnMultiplier, horizon = False):
+
+    global quiescenceNodes
+    if not horizon:
+
+        quiescenceNodes += 1
+        if nodeLimit is not None and nodesSearched + quiescenceNodes > nodeLimit:
+
+            raise SearchAborted
+
+        if quiescenceNodes % TIME_CHECK_INTERVAL == 0 and ((deadline is not None and time.perf_counter() >= deadline) or (stopCheck is not None and stopCheck())):
+
+            raise SearchAborted
+
+    if gameState.insufficientMaterial():
+
+        return STALEMATE
+
+    inCheck = gameState.inCheck()
+    if inCheck:
+
+        moves = gameState.getValidMoves()
+        maxScore = -CHECKMATE #mated unless an evasion is found
+
+    else:
+
+        moves = gameState.getNoisyMoves()
+        standPat = turnMultiplier * positionScore(gameState) #white wants +score, black -score
+        if standPat >= beta:
+
+            return standPat
+
+        maxScore = standPat
+        alpha = max(alpha, standPat)
+
+    for move in sorted(moves, key = captureScore, reverse = True):
+
+        if not inCheck and not move.isPawnPromotion:
+
+            if standPat + pieceScore[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha:
+
+                continue
+
+            if isLosingCapture(gameState, move):
+
+                continue
+
+        gameState.makeMove(move)
+        score = -quiescenceSearch(gameState, -beta, -alpha, -turnMultiplier)
+        gameState.undoMove()
+        if score > maxScore:
+
+            maxScore = score
+
+        if maxScore > alpha:
+
+            alpha = maxScore
+
+        if alpha >= beta:
+
+            break
+
+    return maxScore
+
+'''
+MVV-LVA score of a capture or promotion: the most valuable victim first, the least valuable attacker first between equal victims.
+A promotion counts as also winning the new queen
+'''
+def captureScore(move):
+
+    score = 10 * pieceScore[move.pieceCaptured[1]] - pieceScore[move.pieceMoved[1]] if move.pieceCaptured != '--' else 0
+    if move.isPawnPromotion:
+
+        score += 10 * pieceScore['Q']
+
+    return score
+
+'''
+Returns the moves in the order they should be searched, see HASH_MOVE_SCORE. hashMoveID is the best move stored in the transposition table
+for the position (or None), ply is the distance from the root
+'''
+def orderMoves(gameState, moves, hashMoveID, ply):
+
+    killers = killerMoves[ply] if ply < MAX_PLY else (None, None)
+    history = historyTable[gameState.whiteToMove]
+    scores = []
+    for move in moves:
+
+        if move.moveID == hashMoveID:
+
+            scores.append(HASH_MOVE_SCORE)
+
+        elif move.pieceCaptured != '--' or move.isPawnPromotion:
+
+            scores.append(CAPTURE_SCORE + captureScore(move))
+
+        elif move.moveID == killers[0]:
+
+            scores.append(KILLER_SCORE + 1)
+
+        elif move.moveID == killers[1]:
+
+            scores.append(KILLER_SCORE)
+
+        else:
+
+            scores.append(history[historyIndex(move)])
+
+    return [moves[i] for i in sorted(range(len(moves)), key = scores.__getitem__, reverse = True)]
+
+'''
+Yields the valid moves of the position in the same order as orderMoves, but in stages, each generated only once the one before is used up:
+the hash move, the captures and promotions that don't lose material, the killers of the ply, the quiet moves by history score, and last the
+losing captures. The hash move and killers are checked to be valid in this position before they are yielded
+'''
+def stagedMoves(gameState, hashMoveID, ply):
+
+    hashMove = gameState.getMove(hashMoveID) if hashMoveID is not None else None
+    if hashMove is not None:
+
+        yield hashMove
+
+    losingCaptures = []
+    for move in sorted(gameState.getNoisyMoves(), key = captureScore, reverse = True):
+
+        if move.moveID == hashMoveID:
+
+            continue
+
+        if isLosingCapture(gameState, move):
+
+            losingCaptures.append(move)
+
+        else:
+
+            yield move
+
+    killers = [killerID for killerID in (killerMoves[ply] if ply < MAX_PLY else ()) if killerID is not None and killerID != hashMoveID]
+    for killerID in killers:
+
+        killer = gameState.getMove(killerID)
+        if killer is not None and killer.pieceCaptured == '--' and not killer.isPawnPromotion: #the killer square may hold a piece by now
+
+            yield killer
+
+    history = historyTable[gameState.whiteToMove]
+    for move in sorted(gameState.getQuietMoves(), key = lambda move: history[historyIndex(move)], reverse = True):
+
+        if move.moveID != hashMoveID and move.moveID not in killers:
+
+            yield move
+
+    yield from losingCaptures
+
+'''
+Returns True if the move captures a defended piece worth less than the capturing piece, which loses material if the capture is taken back
+'''
+def isLosingCapture(gameState, move):
+
+    return (not move.isPawnPromotion and pieceScore[move.pieceMoved[1]] > pieceScore[move.pieceCaptured[1]] and
+            gameState.squareUnderAttack(move.endSq[0], move.endSq[1]))
+
+'''
+Index of the move in the butterfly history table: start square * 64 + end square
+'''
+def historyIndex(move):
+
+    return (move.startSq[0] * 8 + move.startSq[1]) * 64 + move.endSq[0] * 8 + move.endSq[1]
+
+'''
+Records a quiet move that caused a beta cutoff: it becomes the newest killer of its ply, and its history score grows with the depth searched
+'''
+def updateQuietCutoff(gameState, move, depth, ply):
+
+    if ply < MAX_PLY and killerMoves[ply][0] != move.moveID:
+
+        killerMoves[ply][1] = killerMoves[ply][0]
+        killerMoves[ply][0] = move.moveID
+
+    history = historyTable[gameState.whiteToMove]
+    index = historyIndex(move)
+    history[index] += depth * depth
+    if history[index] >= HISTORY_LIMIT:
+
+        for i in range(len(history)):
+
+            history[i] >>= 1
+
 '''
 Evaluates the current board. Positive score is better for white. Negative score is better for black.
+The game state keeps its middlegame and endgame scores (material + piece positions) up to date as moves are made, here they are only blended
+by the game phase: all middlegame with every piece on the board, all endgame once only kings and pawns are left.
 '''
 def boardScore(gameState):
-    #If there are no more queens or one side has no rooks, then scale is set to 2
-    scale = 2 if (gameState.boardMaterial['wQ'] == 0 and gameState.boardMaterial['bQ'] == 0 and
-                 (gameState.boardMaterial['wR'] == 0 or gameState.boardMaterial['bR'] == 0)) else 1
-    
+
     if gameState.checkmate:
 
         if gameState.whiteToMove:
@@ -182,46 +580,56 @@ def boardScore(gameState):
 
         return STALEMATE #Tie
 
-    score = 0
-    #Iterate through entire board
-    for row in range(0, gameState.ROWS):
-
-        for col in range(0, gameState.COLS):
-
-            square = gameState.board[row][col]
-
-            if square[1] != '--':
-
-                if square[1] == 'K':
-                    #If piece is a king and no more queens on board, use endgame king positional scores
-                    if gameState.boardMaterial['wQ'] == 0 and gameState.boardMaterial['bQ'] == 0:
-
-                        if square[0] == 'w':
+    return positionScore(gameState)
 
-                            score += (pieceScore[square[1]] + piecePositionScores['endGameWK'][row][col])
+'''
+Material and piece position score of the board, positive is better for white, a draw with insufficient material. Unlike boardScore it
+doesn't look at the checkmate and stalemate flags, which are only up to date after getValidMoves
+'''
+def positionScore(gameState):
 
-                        elif square[0] == 'b':
+    if gameState.insufficientMaterial(): #neither side can mate, whatever the material says
 
-                            score -= (pieceScore[square[1]] + piecePositionScores['endGameBK'][row][col])
+        return STALEMATE
 
-                    else:
+    phase = min(gameState.gamePhase, ChessEvaluation.MAX_PHASE) #promotions can push the phase past the starting position's
+    return int((gameState.middlegameScore * phase + gameState.endgameScore * (ChessEvaluation.MAX_PHASE - phase)) / ChessEvaluation.MAX_PHASE)
 
-                        if square[0] == 'w':
+'''
+Encodes the board of each game state as a row of 64 piece codes. Returns an (N, 64) uint8 array for batchBoardScore
+'''
+def encodePositions(gameStates):
 
-                            score += pieceScore[square[1]]
+    codes = np.zeros((len(gameStates), 64), dtype = np.uint8)
+    for i, gameState in enumerate(gameStates):
 
-                        elif square[0] == 'b':
+        codes[i] = [PIECE_CODES[piece] for row in gameState.board for piece in row]
 
-                            score -= pieceScore[square[1]]
+    return codes
 
-                elif square[1] != 'K':
+'''
+Scores many positions at once with numpy instead of a python loop per position. positions is either an (N, 64) array of piece codes or an
+(N, 12, 64) array of 0/1 piece planes (PIECES order). Returns an (N,) array with the same scores boardScore gives, positive is better for white.
+Checkmate and stalemate need the valid moves, so they are not detected here, insufficient material scores 0 like in positionScore.
+'''
+def batchBoardScore(positions):
 
-                    if square[0] == 'w':
+    positions = np.asarray(positions)
+    if positions.ndim == 3: #planes, turn them into codes: plane i holds piece code i + 1
 
-                        score += (pieceScore[square[1]] + piecePositionScores[square][row][col] * scale)
+        codes = (positions.astype(np.int64) * np.arange(1, len(PIECES) + 1)[None, :, None]).sum(axis = 1)
 
-                    elif square[0] == 'b':
+    else:
 
-                        score -= (pieceScore[square[1]] + piecePositionScores[square][row][col] * scale)
+        codes = positions.astype(np.int64)
 
-    return score
\ No newline at end of file
+    squares = np.arange(64)[None, :]
+    middlegameScores = MIDDLEGAME_TABLE[codes, squares].sum(axis = 1)
+    endgameScores = ENDGAME_TABLE[codes, squares].sum(axis = 1)
+    phases = np.minimum(PHASE_TABLE[codes].sum(axis = 1), ChessEvaluation.MAX_PHASE)
+    blended = middlegameScores * phases + endgameScores * (ChessEvaluation.MAX_PHASE - phases)
+    scores = np.sign(blended) * (np.abs(blended) // ChessEvaluation.MAX_PHASE) #round towards 0 like boardScore
+    pieceCounts = (codes != 0).sum(axis = 1)
+    minorCounts = np.isin(codes, MINOR_CODES).sum(axis = 1)
+    scores[(pieceCounts == 2) | ((pieceCounts == 3) & (minorCounts == 1))] = STALEMATE #only the kings, or the kings and one knight or bishop
+    return scores
@@ -0,0 +1,211 @@
+'''
+Batch analysis of large position sets. Positions (FEN or EPD lines) are read from a file or stdin and handed out to a pool of worker
+processes. Every worker keeps its transposition table and history between the positions it searches. Each result is written as one JSON
+line as soon as it is ready:
+    {"index": 0, "id": "WAC.001", "fen": "...", "bestmove": "g3g6", "san": "Qg6", "score": 1450, "mate": null, "depth": 5, "nodes": 81234,
+     "time": 812, "pv": ["g3g6", "f7g6", ...]}
+index is the position's place in the input, id its EPD id if it has one. score is in centipawns for the side to move, mate the moves to
+mate (negative if the side to move gets mated) once the search found one. A position that can't be loaded gets an "error" instead.
+Results come out in the order they finish, or in input order with --ordered. The output file doubles as the checkpoint: with --resume,
+positions whose index is already in it are skipped and the new results are appended, so an interrupted run picks up where it stopped.
+Usage:
+    python ChessAnalysis.py positions.epd --depth 5 --workers 4 --output results.jsonl
+    python ChessAnalysis.py positions.epd --movetime 1000 --output results.jsonl --resume
+    cat positions.fen | python ChessAnalysis.py - --nodes 50000 --ordered
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import ChessAI
+import ChessBitboard
+import ChessFEN
+import ChessPGN
+import ChessUCI
+
+MAX_DEPTH = 64 #depth limit when the search is only limited by time or nodes
+
+'''
+Runs once in every worker process when the pool starts
+'''
+def initWorker(hashMB, useBook):
+
+    ChessAI.USE_OPENING_BOOK = useBook
+    if ChessAI.transpositionTable.sizeMB != hashMB:
+
+        ChessAI.transpositionTable.resize(hashMB)
+
+'''
+Runs in a worker process: searches one position with the budget, returns its result dict. job is (index, fen, operations, maxDepth, maxTimeMs,
+maxNodes)
+'''
+def analyzePosition(job):
+
+    index, fen, operations, maxDepth, maxTimeMs, maxNodes = job
+    result = {'index': index}
+    if 'id' in operations:
+
+        result['id'] = ' '.join(operations['id'])
+
+    result['fen'] = fen
+    try:
+
+        gameState = ChessFEN.loadFEN(ChessBitboard.GameState(), fen)
+
+    except ValueError as error:
+
+        result['error'] = str(error)
+        return result
+
+    validMoves = gameState.getValidMoves()
+    start = time.perf_counter()
+    move, score, depth = ChessAI.iterativeDeepening(gameState, validMoves, maxDepth, maxTimeMs, maxNodes) if validMoves else (None, 0, 0)
+    if not validMoves:
+
+        score = -ChessAI.CHECKMATE if gameState.checkmate else 0
+
+    line = ChessAI.principalVariation(gameState, move, max(depth, 1)) if move is not None else []
+    mate = None
+    if abs(score) >= ChessAI.CHECKMATE: #the search doesn't keep the distance to mate, this is the most moves it can take at the depth searched
+
+        mate = (depth + 1) // 2 if score > 0 else -(depth // 2)
+
+    result.update({'bestmove': ChessUCI.moveToUCI(move) if move is not None else None, 'san': ChessPGN.getSAN(gameState, move, validMoves) if move is not None else None,
+                   'score': score, 'mate': mate, 'depth': depth, 'nodes': ChessAI.nodesSearched + ChessAI.quiescenceNodes,
+                   'time': round((time.perf_counter() - start) * 1000), 'pv': [ChessUCI.moveToUCI(played) for played in line]})
+    return result
+
+'''
+Yields (index, fen, operations) for every position of the input, a file path or '-' for stdin. Empty lines and lines starting with # don't
+count towards the index
+'''
+def readInput(path):
+
+    if path != '-':
+
+        for index, (lineNumber, fen, operations) in enumerate(ChessFEN.readPositions(path)):
+
+            yield index, fen, operations
+
+        return
+
+    index = 0
+    for line in sys.stdin:
+
+        line = line.strip()
+        if line and not line.startswith('#'):
+
+            fen, operations = ChessFEN.parseEPD(line)
+            yield index, fen, operations
+            index += 1
+
+'''
+Returns the set of position indexes already in a results file, for resuming. A last line cut off when the run was killed is removed from
+the file, so the results appended next start on a line of their own
+'''
+def readCheckpoint(path):
+
+    done, complete = set(), 0
+    if not os.path.exists(path):
+
+        return done
+
+    with open(path, 'rb+') as file:
+
+        for line in file:
+
+            if not line.endswith(b'\n'):
+
+                break
+
+            complete += len(line)
+            try:
+
+                done.add(json.loads(line)['index'])
+
+            except (ValueError, KeyError, TypeError):
+
+                continue
+
+        file.truncate(complete)
+
+    return done
+
+'''
+Analyzes the positions, (index, fen, operations) tuples, on a pool of worker processes and yields the result dicts, in the order they finish
+or in the order of the positions if ordered. Positions whose index is in skip are left out. The search budget works like in
+ChessAI.iterativeDeepening, the depth goes up to MAX_DEPTH if there is a time or node budget and no depth is given
+'''
+def analyzePositions(positions, maxDepth = None, maxTimeMs = None, maxNodes = None, workers = None, ordered = False, skip = (), hashMB = None,
+                     useBook = False):
+
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    hashMB = ChessAI.HASH_SIZE_MB if hashMB is None else hashMB
+    if maxDepth is None:
+
+        maxDepth = MAX_DEPTH if maxTimeMs is not None or maxNodes is not None else ChessAI.DEPTH
+
+    jobs = ((index, fen, operations, maxDepth, maxTimeMs, maxNodes) for index, fen, operations in positions if index not in skip)
+    pool = multiprocessing.Pool(workers, initWorker, (hashMB, useBook))
+    try:
+
+        for result in (pool.imap(analyzePosition, jobs) if ordered else pool.imap_unordered(analyzePosition, jobs)):
+
+            yield result
+
+    finally:
+
+        pool.terminate()
+        pool.join()
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Analyzes every position of a FEN or EPD file and writes the results as JSON lines.')
+    parser.add_argument('input', help = "FEN or EPD file, '-' for stdin")
+    parser.add_argument('--output', help = 'JSON lines file for the results, stdout if not given')
+    parser.add_argument('--resume', action = 'store_true', help = 'skip the positions already in the output file and append to it')
+    parser.add_argument('--ordered', action = 'store_true', help = 'write the results in input order instead of as they finish')
+    parser.add_argument('--depth', type = int)
+    parser.add_argument('--movetime', type = int, help = 'time per position in milliseconds')
+    parser.add_argument('--nodes', type = int, help = 'nodes per position')
+    parser.add_argument('--workers', type = int, default = os.cpu_count() or 1)
+    parser.add_argument('--hash', type = int, default = ChessAI.HASH_SIZE_MB, help = 'transposition table size of each worker in MB')
+    parser.add_argument('--book', action = 'store_true', help = 'answer positions in the opening book with the book move instead of searching')
+    args = parser.parse_args()
+    if args.resume and not args.output:
+
+        parser.error('--resume needs --output')
+
+    skip = readCheckpoint(args.output) if args.resume else set()
+    output = open(args.output, 'a' if args.resume else 'w', encoding = 'utf-8') if args.output else sys.stdout
+    count, start = 0, time.perf_counter()
+    try:
+
+        for result in analyzePositions(readInput(args.input), args.depth, args.movetime, args.nodes, args.workers, args.ordered, skip, args.hash,
+                                       args.book):
+
+            output.write(json.dumps(result) + '\n')
+            output.flush() #every finished result is in the checkpoint straight away
+            count += 1
+
+    except KeyboardInterrupt:
+
+        print('Interrupted after %d positions, run again with --resume to continue' % count, file = sys.stderr)
+        return 1
+
+    finally:
+
+        if output is not sys.stdout:
+
+            output.close()
+
+    print('Analyzed %d positions in %.1fs%s' % (count, time.perf_counter() - start, ', skipped %d already done' % len(skip) if skip else ''),
+          file = sys.stderr)
+    return 0
+
+#this is convention to protect from accidentally running the program when we import another class
+if __name__ == '__main__':
+
+    raise SystemExit(main())
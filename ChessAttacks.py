@@ -0,0 +1,272 @@
+'''
+Precomputed attack tables for the bitboard backend. Knight, king and pawn attacks are stored per square, and rook and bishop attacks for
+any occupancy are looked up with magic bitboards: the relevant blockers are multiplied by a per square magic number so that the top bits of
+the product are a perfect index into that square's slice of the attack table.
+Finding the magic numbers and filling the tables takes a while in python, so the result is written once to a cache file and memory-mapped
+on every later startup.
+'''
+import mmap
+import os
+import random
+from array import array
+
+FULL_BOARD = (1 << 64) - 1
+SQUARE_BB = [1 << sq for sq in range(64)]
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (1, 1), (-1, 1), (1, -1)]
+KNIGHT_OFFSETS = [(-2, -1), (-1, -2), (2, -1), (1, -2), (-2, 1), (-1, 2), (2, 1), (1, 2)]
+KING_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'attacks.cache')
+CACHE_HEADER = b'CHESSATK'
+CACHE_VERSION = 1
+BYTE_ORDER_MARK = 0x0102030405060708 #read back as a different value if the cache was written on a machine with another byte order
+MAGIC_SEED = 2022
+
+'''
+Returns a bitboard of every square reached from sq by stepping once with each of the given offsets
+'''
+def leaperAttacks(sq, offsets):
+
+    row, col = sq // 8, sq % 8
+    attacks = 0
+    for r, c in offsets:
+
+        if 0 <= row + r < 8 and 0 <= col + c < 8:
+
+            attacks |= SQUARE_BB[(row + r) * 8 + col + c]
+
+    return attacks
+
+'''
+Returns a bitboard of every square from sq (exclusive) to the edge of the board in the given direction
+'''
+def rayAttacks(sq, direction):
+
+    row, col = sq // 8, sq % 8
+    ray = 0
+    for scale in range(1, 8):
+
+        endRow, endCol = row + direction[0] * scale, col + direction[1] * scale
+        if not (0 <= endRow < 8 and 0 <= endCol < 8):
+
+            break
+
+        ray |= SQUARE_BB[endRow * 8 + endCol]
+
+    return ray
+
+RAYS = {direction: [rayAttacks(sq, direction) for sq in range(64)] for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+
+'''
+Slow reference attack set of a slider on sq, walking each ray until (and including) the first blocker. Only used to fill the lookup tables
+'''
+def slidingAttacks(sq, occupied, directions):
+
+    attacks = 0
+    for direction in directions:
+
+        for endSq in squaresAlong(sq, direction):
+
+            attacks |= SQUARE_BB[endSq]
+            if occupied & SQUARE_BB[endSq]:
+
+                break
+
+    return attacks
+
+'''
+Returns the squares from sq to the edge of the board in the given direction, nearest first
+'''
+def squaresAlong(sq, direction):
+
+    row, col = sq // 8, sq % 8
+    squares = []
+    for scale in range(1, 8):
+
+        endRow, endCol = row + direction[0] * scale, col + direction[1] * scale
+        if not (0 <= endRow < 8 and 0 <= endCol < 8):
+
+            break
+
+        squares.append(endRow * 8 + endCol)
+
+    return squares
+
+'''
+Returns the blocker mask for a slider on sq: every square along its rays except the last one, since a piece on the edge never blocks anything
+'''
+def relevantOccupancy(sq, directions):
+
+    mask = 0
+    for direction in directions:
+
+        for endSq in squaresAlong(sq, direction)[:-1]:
+
+            mask |= SQUARE_BB[endSq]
+
+    return mask
+
+'''
+Searches for a magic number for a slider on sq. Returns (mask, magic, shift, table) where table[((occupied & mask) * magic) >> shift] is the
+attack set for the occupancy
+'''
+def findMagic(sq, directions, rng):
+
+    mask = relevantOccupancy(sq, directions)
+    shift = 64 - bin(mask).count('1')
+    occupancies, attacks = [], []
+    subset = 0
+    while True: #carry-rippler trick, enumerates every subset of the mask
+
+        occupancies.append(subset)
+        attacks.append(slidingAttacks(sq, subset, directions))
+        subset = (subset - mask) & mask
+        if subset == 0:
+
+            break
+
+    while True:
+
+        magic = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64) #sparse random numbers make the best magics
+        if bin(((mask * magic) & FULL_BOARD) >> 56).count('1') < 6:
+
+            continue
+
+        table = [0] * (1 << (64 - shift))
+        for occupied, attack in zip(occupancies, attacks):
+
+            index = ((occupied * magic) & FULL_BOARD) >> shift
+            if table[index] == 0:
+
+                table[index] = attack #slider attacks are never empty, so 0 marks an unused slot
+
+            elif table[index] != attack: #2 occupancies with different attacks share an index, try another magic
+
+                break
+
+        else:
+
+            return mask, magic, shift, table
+
+'''
+Builds every attack table from scratch. Returns a flat array laid out as the cache file: header, the per square arrays, then the rook and
+bishop attack tables
+'''
+def buildAttackTables():
+
+    rng = random.Random(MAGIC_SEED)
+    perSquare = {name: [] for name in ('rookMasks', 'rookMagics', 'rookShifts', 'rookOffsets', 'bishopMasks', 'bishopMagics', 'bishopShifts', 'bishopOffsets')}
+    rookTable, bishopTable = [], []
+
+    for sq in range(64):
+
+        mask, magic, shift, table = findMagic(sq, ROOK_DIRECTIONS, rng)
+        perSquare['rookMasks'].append(mask)
+        perSquare['rookMagics'].append(magic)
+        perSquare['rookShifts'].append(shift)
+        perSquare['rookOffsets'].append(len(rookTable))
+        rookTable.extend(table)
+
+        mask, magic, shift, table = findMagic(sq, BISHOP_DIRECTIONS, rng)
+        perSquare['bishopMasks'].append(mask)
+        perSquare['bishopMagics'].append(magic)
+        perSquare['bishopShifts'].append(shift)
+        perSquare['bishopOffsets'].append(len(bishopTable))
+        bishopTable.extend(table)
+
+    data = array('Q', [int.from_bytes(CACHE_HEADER, 'little'), CACHE_VERSION, BYTE_ORDER_MARK, len(rookTable), len(bishopTable)])
+    for name in ('rookMasks', 'rookMagics', 'rookShifts', 'rookOffsets', 'bishopMasks', 'bishopMagics', 'bishopShifts', 'bishopOffsets'):
+
+        data.extend(perSquare[name])
+
+    data.extend(leaperAttacks(sq, KNIGHT_OFFSETS) for sq in range(64))
+    data.extend(leaperAttacks(sq, KING_OFFSETS) for sq in range(64))
+    data.extend(leaperAttacks(sq, [(-1, -1), (-1, 1)]) for sq in range(64)) #white pawns capture towards row 0
+    data.extend(leaperAttacks(sq, [(1, -1), (1, 1)]) for sq in range(64))
+    data.extend(rookTable)
+    data.extend(bishopTable)
+    return data
+
+'''
+Writes the tables to the cache file. Writes to a temporary file first so a crash can never leave a half written cache behind
+'''
+def saveAttackTables(data, path = CACHE_FILE):
+
+    tempPath = path + '.' + str(os.getpid()) + '.tmp'
+    try:
+
+        with open(tempPath, 'wb') as file:
+
+            data.tofile(file)
+
+        os.replace(tempPath, path)
+
+    except OSError: #read-only install, the tables are still usable from memory
+
+        if os.path.exists(tempPath):
+
+            os.remove(tempPath)
+
+'''
+Memory-maps the cache file and returns it as an array of 64-bit ints, or None if there is no valid cache
+'''
+def mapAttackTables(path = CACHE_FILE):
+
+    try:
+
+        with open(path, 'rb') as file:
+
+            mapped = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+    except (OSError, ValueError): #missing or empty file
+
+        return None
+
+    if len(mapped) % 8 != 0 or len(mapped) < 8 * 5:
+
+        return None
+
+    data = memoryview(mapped).cast('Q')
+    if data[0] != int.from_bytes(CACHE_HEADER, 'little') or data[1] != CACHE_VERSION or data[2] != BYTE_ORDER_MARK or \
+       len(data) != 5 + 12 * 64 + data[3] + data[4]:
+
+        return None
+
+    return data
+
+'''
+Returns the attack tables, memory-mapped from the cache file if possible, otherwise built and written to the cache
+'''
+def loadAttackTables(path = CACHE_FILE):
+
+    data = mapAttackTables(path)
+    if data is None:
+
+        data = buildAttackTables()
+        saveAttackTables(data, path)
+        data = memoryview(data)
+
+    return data
+
+TABLES = loadAttackTables()
+ROOK_TABLE_SIZE, BISHOP_TABLE_SIZE = TABLES[3], TABLES[4]
+#small per square arrays are copied into lists, since indexing a list is faster than indexing the mapped memory
+ROOK_MASKS, ROOK_MAGICS, ROOK_SHIFTS, ROOK_OFFSETS, BISHOP_MASKS, BISHOP_MAGICS, BISHOP_SHIFTS, BISHOP_OFFSETS, \
+KNIGHT_ATTACKS, KING_ATTACKS, WHITE_PAWN_ATTACKS, BLACK_PAWN_ATTACKS = [TABLES[5 + 64 * i: 5 + 64 * (i + 1)].tolist() for i in range(12)]
+PAWN_ATTACKS = {'w': WHITE_PAWN_ATTACKS, 'b': BLACK_PAWN_ATTACKS} #squares attacked by a pawn of the given color standing on the square
+ROOK_TABLE = TABLES[5 + 12 * 64: 5 + 12 * 64 + ROOK_TABLE_SIZE]
+BISHOP_TABLE = TABLES[5 + 12 * 64 + ROOK_TABLE_SIZE:]
+
+'''
+Returns the rook attack set from sq, including the first blocker in each direction
+'''
+def rookAttacks(sq, occupied):
+
+    return ROOK_TABLE[ROOK_OFFSETS[sq] + ((((occupied & ROOK_MASKS[sq]) * ROOK_MAGICS[sq]) & FULL_BOARD) >> ROOK_SHIFTS[sq])]
+
+'''
+Returns the bishop attack set from sq, including the first blocker in each direction
+'''
+def bishopAttacks(sq, occupied):
+
+    return BISHOP_TABLE[BISHOP_OFFSETS[sq] + ((((occupied & BISHOP_MASKS[sq]) * BISHOP_MAGICS[sq]) & FULL_BOARD) >> BISHOP_SHIFTS[sq])]
@@ -0,0 +1,522 @@
+'''
+Endgame bitbases for positions with few pieces (KQK, KRK, KPK, and 4 piece sets like KQKR). Every position of a material signature is solved
+offline by retrograde analysis: starting from the checkmates, positions are walked backwards one ply at a time, so each position gets its exact
+distance to mate. Moves that capture or promote leave the signature, their positions are looked up in the smaller signatures, which are
+generated first.
+Each signature is written to its own file in BITBASE_DIR as 1 byte per position: 0 for a draw, otherwise the number of plies to mate + 1 with
+the side to move winning if that number is odd. The files are memory-mapped when this module is imported and probed by the AI search once
+the material on the board matches a signature.
+Positions are indexed by the side to move and the square of every piece, in the order of the signature: white's pieces, then black's, each
+in KQRBNP order. A signature is stored with the stronger side as white, the other colors are probed by mirroring the board. Castling and en
+passant aren't part of a position, so positions where either is possible aren't probed. Like GameState, pawns only promote to queens.
+Generating 4 piece signatures takes a long time in python (64 times as many positions as a 3 piece signature).
+Usage:
+    python ChessBitbase.py generate [KQK KRK KPK ...]       generate the signatures (and the smaller ones they need)
+    python ChessBitbase.py probe --fen "<fen>"               print the bitbase result of a position
+'''
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import time
+from array import array
+import ChessAttacks
+import ChessBitboard
+import ChessEvaluation
+import ChessFEN
+
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bitbases')
+BITBASE_HEADER = b'CHESSBB1'
+HEADER_FORMAT = '<8sI8s' #header, version, signature
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+BITBASE_VERSION = 1
+DEFAULT_SIGNATURES = ['KQK', 'KRK', 'KPK']
+DRAWN_SIGNATURES = ('KK', 'KBK', 'KNK') #no mate is possible, these don't need a file
+PIECE_ORDER = 'KQRBNP'
+MAX_PLIES = 254 #longest distance to mate a byte can hold
+
+'''
+Splits a signature into white's and black's pieces, e.g. 'KRKP' into ('KR', 'KP')
+'''
+def splitSignature(signature):
+
+    blackKing = signature.index('K', 1)
+    return signature[:blackKing], signature[blackKing:]
+
+'''
+Returns (signature, flipped) for the given white and black pieces. flipped is True if the colors are swapped in the signature, since the
+stronger side is always white
+'''
+def canonicalSignature(white, black):
+
+    white, black = ''.join(sorted(white, key = PIECE_ORDER.index)), ''.join(sorted(black, key = PIECE_ORDER.index))
+    strength = lambda pieces: (sum(ChessEvaluation.pieceScore[piece] for piece in pieces), [-PIECE_ORDER.index(piece) for piece in pieces])
+    if strength(white) >= strength(black):
+
+        return white + black, False
+
+    return black + white, True
+
+'''
+Returns the value byte stored for a position, given as a list of (piece, square) with squares numbered row * 8 + col. tables maps signatures
+to their values. Returns None if the signature isn't in tables
+'''
+def lookupValue(tables, pieces, whiteToMove):
+
+    white = sorted(((piece[1], sq) for piece, sq in pieces if piece[0] == 'w'), key = lambda piece: PIECE_ORDER.index(piece[0]))
+    black = sorted(((piece[1], sq) for piece, sq in pieces if piece[0] == 'b'), key = lambda piece: PIECE_ORDER.index(piece[0]))
+    signature, flipped = canonicalSignature([piece for piece, sq in white], [piece for piece, sq in black])
+    if flipped: #mirror the board top to bottom and swap the colors
+
+        white, black = [(piece, sq ^ 56) for piece, sq in black], [(piece, sq ^ 56) for piece, sq in white]
+        whiteToMove = not whiteToMove
+
+    if signature in DRAWN_SIGNATURES:
+
+        return 0
+
+    table = tables.get(signature)
+    if table is None:
+
+        return None
+
+    index = 0 if whiteToMove else 1
+    for piece, sq in white + black:
+
+        index = index * 64 + sq
+
+    return table[HEADER_SIZE + index] if isinstance(table, mmap.mmap) else table[index]
+
+'''
+Returns the bitboard of squares attacked by a piece on sq
+'''
+def pieceAttacks(piece, sq, occupied):
+
+    pieceType = piece[1]
+    if pieceType == 'K':
+
+        return ChessAttacks.KING_ATTACKS[sq]
+
+    elif pieceType == 'N':
+
+        return ChessAttacks.KNIGHT_ATTACKS[sq]
+
+    elif pieceType == 'P':
+
+        return ChessAttacks.PAWN_ATTACKS[piece[0]][sq]
+
+    elif pieceType == 'R':
+
+        return ChessAttacks.rookAttacks(sq, occupied)
+
+    elif pieceType == 'B':
+
+        return ChessAttacks.bishopAttacks(sq, occupied)
+
+    return ChessAttacks.rookAttacks(sq, occupied) | ChessAttacks.bishopAttacks(sq, occupied)
+
+'''
+Returns True if any piece of color (other than the one on the captured square) attacks sq
+'''
+def isAttacked(pieces, squares, sq, color, occupied, captured = -1):
+
+    target = ChessAttacks.SQUARE_BB[sq]
+    for piece, pieceSq in zip(pieces, squares):
+
+        if piece[0] == color and pieceSq != captured and pieceAttacks(piece, pieceSq, occupied) & target:
+
+            return True
+
+    return False
+
+'''
+Yields (slot, endSq, capturedSlot, promotes) for every pseudo-legal move of color. capturedSlot is -1 for a non capture
+'''
+def pseudoMoves(pieces, squares, color, occupied, colorBB):
+
+    for slot, (piece, sq) in enumerate(zip(pieces, squares)):
+
+        if piece[0] != color:
+
+            continue
+
+        if piece[1] == 'P':
+
+            step, startRow, lastRow = (-8, 6, 0) if color == 'w' else (8, 1, 7)
+            targets = ChessAttacks.PAWN_ATTACKS[color][sq] & (occupied & ~colorBB)
+            if not occupied & ChessAttacks.SQUARE_BB[sq + step]:
+
+                targets |= ChessAttacks.SQUARE_BB[sq + step]
+                if sq // 8 == startRow and not occupied & ChessAttacks.SQUARE_BB[sq + 2 * step]:
+
+                    targets |= ChessAttacks.SQUARE_BB[sq + 2 * step]
+
+        else:
+
+            targets = pieceAttacks(piece, sq, occupied) & ~colorBB
+            lastRow = -1
+
+        while targets:
+
+            lowBit = targets & -targets
+            endSq = lowBit.bit_length() - 1
+            targets ^= lowBit
+            capturedSlot = squares.index(endSq) if occupied & lowBit else -1
+            yield slot, endSq, capturedSlot, endSq // 8 == lastRow
+
+'''
+Returns the bitboards (occupied, white, black) of the pieces on squares
+'''
+def occupancy(pieces, squares):
+
+    white, black = 0, 0
+    for piece, sq in zip(pieces, squares):
+
+        if piece[0] == 'w':
+
+            white |= ChessAttacks.SQUARE_BB[sq]
+
+        else:
+
+            black |= ChessAttacks.SQUARE_BB[sq]
+
+    return white | black, white, black
+
+'''
+Solves every position of the signature by retrograde analysis and returns their value bytes. tables must hold every smaller signature a
+capture or promotion can lead to
+'''
+def generateBitbase(signature, tables):
+
+    white, black = splitSignature(signature)
+    pieces = ['w' + piece for piece in white] + ['b' + piece for piece in black]
+    kingSlots = {'w': 0, 'b': len(white)}
+    count = len(pieces)
+    half = 64 ** count
+    values = bytearray(2 * half)
+    remaining = array('b', [-1]) * (2 * half) #in-table moves not yet known to lose, -1 for an illegal position
+    blocked = bytearray(2 * half) #1 if the position can't be lost: it has a drawing or winning move out of the table, or is stalemate
+    exitLoss = bytearray(2 * half) #plies to the latest mate forced by the moves out of the table, 0 if there are none
+    levels = {} #plies to mate -> positions that reach mate in that many plies, unless they were found to do it sooner
+
+    for squares in itertools.product(range(64), repeat = count):
+
+        if len(set(squares)) < count or any(piece[1] == 'P' and sq // 8 in (0, 7) for piece, sq in zip(pieces, squares)):
+
+            continue
+
+        occupied, whiteBB, blackBB = occupancy(pieces, squares)
+        index = 0
+        for sq in squares:
+
+            index = index * 64 + sq
+
+        for side, color, enemy in ((0, 'w', 'b'), (1, 'b', 'w')):
+
+            if isAttacked(pieces, squares, squares[kingSlots[enemy]], color, occupied): #the side that just moved left its king in check
+
+                continue
+
+            position = side * half + index
+            colorBB = whiteBB if color == 'w' else blackBB
+            moves, inTable, bestWin, latestLoss, drawn = 0, 0, None, 0, False
+            for slot, endSq, capturedSlot, promotes in pseudoMoves(pieces, squares, color, occupied, colorBB):
+
+                after = list(squares)
+                after[slot] = endSq
+                kingSq = after[kingSlots[color]]
+                afterOccupied = (occupied & ~ChessAttacks.SQUARE_BB[squares[slot]]) | ChessAttacks.SQUARE_BB[endSq]
+                if isAttacked(pieces, after, kingSq, enemy, afterOccupied, endSq if capturedSlot >= 0 else -1):
+
+                    continue
+
+                moves += 1
+                if capturedSlot < 0 and not promotes:
+
+                    inTable += 1
+                    continue
+
+                afterPieces = [(color + 'Q' if promotes and i == slot else piece, sq) for i, (piece, sq) in enumerate(zip(pieces, after)) if i != capturedSlot]
+                value = lookupValue(tables, afterPieces, color == 'b')
+                if value is None:
+
+                    raise ValueError('A smaller bitbase is missing to generate ' + signature)
+
+                if value == 0:
+
+                    drawn = True
+
+                elif (value - 1) % 2 == 0: #the opponent loses
+
+                    bestWin = value if bestWin is None else min(bestWin, value)
+
+                else:
+
+                    latestLoss = max(latestLoss, value)
+
+            remaining[position] = inTable
+            if moves == 0: #checkmate or stalemate
+
+                if isAttacked(pieces, squares, squares[kingSlots[color]], enemy, occupied):
+
+                    levels.setdefault(0, array('q')).append(position)
+
+                else:
+
+                    blocked[position] = 1
+
+                continue
+
+            exitLoss[position] = latestLoss
+            if bestWin is not None:
+
+                levels.setdefault(bestWin, array('q')).append(position)
+
+            if bestWin is not None or drawn:
+
+                blocked[position] = 1
+
+            elif inTable == 0: #every move leaves the table and loses
+
+                levels.setdefault(latestLoss, array('q')).append(position)
+
+    #walk back from the mates: a position is won once one move reaches a lost position, and lost once every move reaches a won one
+    plies = 0
+    while levels:
+
+        if plies > MAX_PLIES:
+
+            raise ValueError('Mate is too far away in ' + signature)
+
+        for position in levels.pop(plies, []):
+
+            if values[position]:
+
+                continue
+
+            values[position] = plies + 1
+            for previous in predecessors(pieces, position, half):
+
+                if values[previous] or remaining[previous] < 0:
+
+                    continue
+
+                if plies % 2 == 0: #position is lost, so its predecessor wins
+
+                    levels.setdefault(plies + 1, array('q')).append(previous)
+
+                else:
+
+                    remaining[previous] -= 1
+                    if remaining[previous] == 0 and not blocked[previous]:
+
+                        levels.setdefault(max(plies + 1, exitLoss[previous]), array('q')).append(previous)
+
+        plies += 1
+
+    return values
+
+'''
+Returns the indexes of every position one non capturing move before the one at index, made by the side that isn't to move there
+'''
+def predecessors(pieces, index, half):
+
+    side, index = divmod(index, half)
+    squares = []
+    for piece in pieces:
+
+        index, sq = divmod(index, 64)
+        squares.append(sq)
+
+    squares.reverse()
+    color = 'w' if side == 1 else 'b' #the side that made the last move
+    occupied = occupancy(pieces, squares)[0]
+    previousSide = (1 - side) * half
+    weights = [64 ** (len(pieces) - 1 - slot) for slot in range(len(pieces))]
+    found = []
+    for slot, (piece, sq) in enumerate(zip(pieces, squares)):
+
+        if piece[0] != color:
+
+            continue
+
+        if piece[1] == 'P': #pawns only move forward, so they come from behind
+
+            step, doubleRow, firstRow = (8, 4, 6) if color == 'w' else (-8, 3, 1)
+            starts = 0
+            if sq // 8 != firstRow and not occupied & ChessAttacks.SQUARE_BB[sq + step]:
+
+                starts |= ChessAttacks.SQUARE_BB[sq + step]
+                if sq // 8 == doubleRow and not occupied & ChessAttacks.SQUARE_BB[sq + 2 * step]:
+
+                    starts |= ChessAttacks.SQUARE_BB[sq + 2 * step]
+
+        else:
+
+            starts = pieceAttacks(piece, sq, occupied) & ~occupied
+
+        base = previousSide + sum(otherSq * weights[other] for other, otherSq in enumerate(squares) if other != slot)
+        while starts:
+
+            lowBit = starts & -starts
+            starts ^= lowBit
+            found.append(base + (lowBit.bit_length() - 1) * weights[slot])
+
+    return found
+
+'''
+Writes a signature's values to its file in directory. Written to a temporary file first so a half written file is never mapped
+'''
+def saveBitbase(signature, values, directory = BITBASE_DIR):
+
+    os.makedirs(directory, exist_ok = True)
+    path = os.path.join(directory, signature + '.bin')
+    tempPath = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tempPath, 'wb') as file:
+
+        file.write(struct.pack(HEADER_FORMAT, BITBASE_HEADER, BITBASE_VERSION, signature.encode()))
+        file.write(values)
+
+    os.replace(tempPath, path)
+
+'''
+Memory-maps every valid bitbase file in directory. Returns a dict of signature -> mapped file
+'''
+def loadBitbases(directory = BITBASE_DIR):
+
+    tables = {}
+    if not os.path.isdir(directory):
+
+        return tables
+
+    for name in sorted(os.listdir(directory)):
+
+        if not name.endswith('.bin'):
+
+            continue
+
+        try:
+
+            with open(os.path.join(directory, name), 'rb') as file:
+
+                mapped = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        except (OSError, ValueError): #unreadable or empty file
+
+            continue
+
+        header, version, signature = struct.unpack_from(HEADER_FORMAT, mapped, 0) if len(mapped) >= HEADER_SIZE else (b'', 0, b'')
+        signature = signature.rstrip(b'\x00').decode(errors = 'replace')
+        if header != BITBASE_HEADER or version != BITBASE_VERSION or signature + '.bin' != name or \
+           len(mapped) != HEADER_SIZE + 2 * 64 ** len(signature):
+
+            mapped.close()
+            continue
+
+        tables[signature] = mapped
+
+    return tables
+
+'''
+Generates the signatures (and every smaller signature they need that isn't in tables yet), writes them to directory and adds them to tables
+'''
+def generate(signatures, tables, directory = BITBASE_DIR):
+
+    for signature in signatures:
+
+        signature = canonicalSignature(*splitSignature(signature))[0]
+        if signature in tables or signature in DRAWN_SIGNATURES:
+
+            continue
+
+        white, black = splitSignature(signature)
+        smaller = []
+        for pieces, other, isWhite in ((white, black, True), (black, white, False)):
+
+            for i, piece in enumerate(pieces):
+
+                if piece == 'K':
+
+                    continue
+
+                rest = pieces[:i] + pieces[i + 1:]
+                smaller.append(rest + other if isWhite else other + rest) #the piece is captured
+                if piece == 'P':
+
+                    smaller.append(rest + 'Q' + other if isWhite else other + rest + 'Q') #the pawn promotes
+
+        generate(smaller, tables, directory)
+        start = time.perf_counter()
+        tables[signature] = generateBitbase(signature, tables)
+        saveBitbase(signature, tables[signature], directory)
+        print('Generated %s in %.1fs' % (signature, time.perf_counter() - start))
+
+bitbases = loadBitbases()
+maxPieces = max((len(signature) for signature in bitbases), default = 0) #positions with more pieces than this are never in a bitbase
+
+'''
+Returns True if either side could still castle, which the bitbases don't cover
+'''
+def castlingPossible(gameState):
+
+    board = gameState.board
+    return (board[7][4] == 'wK' and not gameState.wKMove and ((board[7][0] == 'wR' and not gameState.wLRMove) or (board[7][7] == 'wR' and not gameState.wRRMove))) or \
+           (board[0][4] == 'bK' and not gameState.bKMove and ((board[0][0] == 'bR' and not gameState.bLRMove) or (board[0][7] == 'bR' and not gameState.bRRMove)))
+
+'''
+Returns (result, plies) for the position if it is in a bitbase, otherwise None. result is 1 if the side to move wins, -1 if it loses and 0 for
+a draw, plies is the number of plies to mate (0 for a draw)
+'''
+def probe(gameState):
+
+    if gameState.pieceCount > maxPieces or gameState.enPassantPossible != () or castlingPossible(gameState):
+
+        return None
+
+    pieces = [(piece, row * 8 + col) for row, pieces in enumerate(gameState.board) for col, piece in enumerate(pieces) if piece != '--']
+    value = lookupValue(bitbases, pieces, gameState.whiteToMove)
+    if value is None:
+
+        return None
+
+    elif value == 0:
+
+        return 0, 0
+
+    return (1 if (value - 1) % 2 == 1 else -1), value - 1
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Generates and probes the endgame bitbases.')
+    parser.add_argument('--dir', default = BITBASE_DIR, help = 'bitbase directory')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    generateParser = commands.add_parser('generate', help = 'generate bitbases')
+    generateParser.add_argument('signatures', nargs = '*', default = DEFAULT_SIGNATURES)
+    probeParser = commands.add_parser('probe', help = 'print the bitbase result of a position')
+    probeParser.add_argument('--fen', required = True)
+    args = parser.parse_args()
+    tables = loadBitbases(args.dir)
+
+    if args.command == 'generate':
+
+        generate(args.signatures, tables, args.dir)
+
+    else:
+
+        gameState = ChessFEN.loadFEN(ChessBitboard.GameState(), args.fen)
+        pieces = [(piece, row * 8 + col) for row, pieces in enumerate(gameState.board) for col, piece in enumerate(pieces) if piece != '--']
+        value = lookupValue(tables, pieces, gameState.whiteToMove)
+        if value is None:
+
+            print('Not in the bitbases')
+            return 1
+
+        print('Draw' if value == 0 else '%s in %d plies' % ('Win' if (value - 1) % 2 == 1 else 'Loss', value - 1))
+
+    return 0
+
+#this is convention to protect from accidentally running the program when we import another class
+if __name__ == '__main__':
+
+    raise SystemExit(main())
@@ -0,0 +1,383 @@
+'''
+Bitboard backed game state. Stores the position as 64-bit integers, one per piece type and color, plus occupancy masks, and generates the
+valid moves with bitwise operations and the precomputed tables in ChessAttacks instead of scanning the 8x8 board. It keeps the same public
+API as ChessEngine.GameState (the 8x8 board list is still kept up to date for the pygame UI), so it can be used anywhere a
+ChessEngine.GameState is used. Squares are indexed as row * 8 + col, so bit 0 is a8 and bit 63 is h1.
+'''
+import ChessAttacks
+import ChessEngine
+
+FULL_BOARD = ChessAttacks.FULL_BOARD
+SQUARES = [(sq // 8, sq % 8) for sq in range(64)] #maps a square index back to its (row, col) coordinates
+SQUARE_BB = ChessAttacks.SQUARE_BB
+ROOK_DIRECTIONS, BISHOP_DIRECTIONS, RAYS = ChessAttacks.ROOK_DIRECTIONS, ChessAttacks.BISHOP_DIRECTIONS, ChessAttacks.RAYS
+KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS = ChessAttacks.KNIGHT_ATTACKS, ChessAttacks.KING_ATTACKS, ChessAttacks.PAWN_ATTACKS
+rookAttacks, bishopAttacks = ChessAttacks.rookAttacks, ChessAttacks.bishopAttacks
+ROOK_RAYS = [rookAttacks(sq, 0) for sq in range(64)]
+BISHOP_RAYS = [bishopAttacks(sq, 0) for sq in range(64)]
+
+'''
+Returns the squares strictly between sq1 and sq2 if they share a row, column or diagonal, otherwise 0
+'''
+def squaresBetween(sq1, sq2):
+
+    for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+
+        if RAYS[direction][sq1] & SQUARE_BB[sq2]:
+
+            return RAYS[direction][sq1] & ~RAYS[direction][sq2] & ~SQUARE_BB[sq2]
+
+    return 0
+
+'''
+Returns the full line (edge to edge) passing through sq1 and sq2 if they share a row, column or diagonal, otherwise 0
+'''
+def lineThrough(sq1, sq2):
+
+    for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+
+        if RAYS[direction][sq1] & SQUARE_BB[sq2]:
+
+            return RAYS[direction][sq1] | RAYS[(-direction[0], -direction[1])][sq1] | SQUARE_BB[sq1]
+
+    return 0
+
+BETWEEN = [[squaresBetween(sq1, sq2) for sq2 in range(64)] for sq1 in range(64)]
+LINE = [[lineThrough(sq1, sq2) for sq2 in range(64)] for sq1 in range(64)]
+
+'''
+Yields the square index of every set bit in the bitboard, lowest first
+'''
+def squaresOf(bitboard):
+
+    while bitboard:
+
+        lowBit = bitboard & -bitboard
+        yield lowBit.bit_length() - 1
+        bitboard ^= lowBit
+
+class GameState(ChessEngine.GameState):
+
+    def __init__(self):
+
+        super().__init__()
+        self.pieceBitboards = {piece: 0 for piece in self.boardMaterial} #one bitboard per piece, e.g. pieceBitboards['wN'] holds every white knight
+        self.colorBitboards = {'w': 0, 'b': 0}
+        self.occupied = 0
+        self.moveContext, self.moveContextHash = None, None #king square, checkers, check mask and pins of the position with this zobrist hash
+        self.loadBitboards()
+
+    '''
+    Rebuilds every bitboard from the 8x8 board list
+    '''
+    def loadBitboards(self):
+
+        self.pieceBitboards = {piece: 0 for piece in self.pieceBitboards}
+        self.colorBitboards = {'w': 0, 'b': 0}
+        for row in range(0, self.ROWS):
+
+            for col in range(0, self.COLS):
+
+                piece = self.board[row][col]
+                if piece != '--':
+
+                    self.pieceBitboards[piece] |= SQUARE_BB[row * 8 + col]
+                    self.colorBitboards[piece[0]] |= SQUARE_BB[row * 8 + col]
+
+        self.occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+
+    def reloadPosition(self):
+
+        super().reloadPosition()
+        self.loadBitboards()
+
+    def makeMove(self, move):
+
+        super().makeMove(move)
+        self.toggleMove(move)
+
+    def undoMove(self):
+
+        move = self.moveLog[-1] if len(self.moveLog) > 0 else None
+        super().undoMove()
+        if move is not None:
+
+            self.toggleMove(move)
+
+    '''
+    XORs the move into the bitboards. Every change is a toggle, so applying the same move twice restores the bitboards, which is how undoMove reverts it
+    '''
+    def toggleMove(self, move):
+
+        start, end = move.startSq[0] * 8 + move.startSq[1], move.endSq[0] * 8 + move.endSq[1]
+        allyColor = move.pieceMoved[0]
+        enemyColor = 'b' if allyColor == 'w' else 'w'
+        fromTo = SQUARE_BB[start] | SQUARE_BB[end]
+        self.pieceBitboards[move.pieceMoved] ^= fromTo
+        self.colorBitboards[allyColor] ^= fromTo
+
+        if move.isEnpassantMove: #captured pawn is beside the starting square, not on the end square
+
+            capturedBB = SQUARE_BB[move.startSq[0] * 8 + move.endSq[1]]
+            self.pieceBitboards[move.pieceCaptured] ^= capturedBB
+            self.colorBitboards[enemyColor] ^= capturedBB
+
+        elif move.pieceCaptured != '--':
+
+            self.pieceBitboards[move.pieceCaptured] ^= SQUARE_BB[end]
+            self.colorBitboards[enemyColor] ^= SQUARE_BB[end]
+
+        if move.isPawnPromotion: #pawn becomes a queen on the end square
+
+            self.pieceBitboards[move.pieceMoved] ^= SQUARE_BB[end]
+            self.pieceBitboards[allyColor + 'Q'] ^= SQUARE_BB[end]
+
+        if move.isCastleMove:
+
+            if move.endSq[1] - move.startSq[1] == 2: #king side, rook jumps from the corner to the left of the king
+
+                rookFromTo = SQUARE_BB[end + 1] | SQUARE_BB[end - 1]
+
+            else: #queen side
+
+                rookFromTo = SQUARE_BB[end - 2] | SQUARE_BB[end + 1]
+
+            self.pieceBitboards[allyColor + 'R'] ^= rookFromTo
+            self.colorBitboards[allyColor] ^= rookFromTo
+
+        self.occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+
+    '''
+    Returns a bitboard of every piece of the given color that attacks sq, with occupied used as the blockers for sliding pieces
+    '''
+    def attackersTo(self, sq, color, occupied):
+
+        pieces = self.pieceBitboards
+        return ((KNIGHT_ATTACKS[sq] & pieces[color + 'N']) | (KING_ATTACKS[sq] & pieces[color + 'K']) |
+                (PAWN_ATTACKS['b' if color == 'w' else 'w'][sq] & pieces[color + 'P']) |
+                (rookAttacks(sq, occupied) & (pieces[color + 'R'] | pieces[color + 'Q'])) |
+                (bishopAttacks(sq, occupied) & (pieces[color + 'B'] | pieces[color + 'Q'])))
+
+    '''
+    Determine if current player turn's square is under attack by enemy piece
+    '''
+    def squareUnderAttack(self, row, col):
+
+        return self.attackersTo(row * 8 + col, 'b' if self.whiteToMove else 'w', self.occupied) != 0
+
+    def inCheck(self):
+
+        allyColor = 'w' if self.whiteToMove else 'b'
+        return self.squareUnderAttack(*SQUARES[self.pieceBitboards[allyColor + 'K'].bit_length() - 1])
+
+    '''
+    All moves considering checks. King moves are tested against the attackers with the king lifted off the board, every other piece is
+    restricted to the squares that resolve a single check and to its pin line if it is pinned to the king.
+    '''
+    def getValidMoves(self):
+
+        moves = self.generateMoves()
+        self.updateGameOver(moves)
+        return moves #in generation order, the AI search orders the moves itself
+
+    '''
+    Valid captures, en-passant captures and promotions only. Doesn't update the checkmate and stalemate flags
+    '''
+    def getNoisyMoves(self):
+
+        return self.generateMoves(True, False)
+
+    '''
+    Valid moves that are not in getNoisyMoves, including castling. Doesn't update the checkmate and stalemate flags
+    '''
+    def getQuietMoves(self):
+
+        return self.generateMoves(False, True)
+
+    '''
+    Returns the valid move with the given moveID, or None if there is no such move in this position. Only the moves of the piece on its
+    start square are generated, so a stored move can be checked without generating the rest
+    '''
+    def getMove(self, moveID):
+
+        startSq = (moveID // 1000) * 8 + (moveID // 100) % 10
+        for move in self.generateMoves(True, True, SQUARE_BB[startSq]):
+
+            if move.moveID == moveID:
+
+                return move
+
+        return None
+
+    '''
+    Returns (kingSq, checkers, checkMask, pinned, pinLines) of the side to move. Worked out once per position, so generating the moves of a
+    position in stages doesn't redo it
+    '''
+    def getMoveContext(self, allyColor, enemyColor):
+
+        if self.moveContextHash != self.zobristHash:
+
+            kingSq = self.pieceBitboards[allyColor + 'K'].bit_length() - 1
+            checkers = self.attackersTo(kingSq, enemyColor, self.occupied)
+            if checkers:
+
+                checkMask = BETWEEN[kingSq][checkers.bit_length() - 1] | checkers #block the check or capture the checking piece
+
+            else:
+
+                checkMask = FULL_BOARD
+
+            pinned, pinLines = self.getPins(kingSq, allyColor, enemyColor)
+            self.moveContext, self.moveContextHash = (kingSq, checkers, checkMask, pinned, pinLines), self.zobristHash
+
+        return self.moveContext
+
+    '''
+    Generates the valid moves of the pieces in fromMask. noisy selects captures, en-passant and promotions, quiet selects every other move
+    '''
+    def generateMoves(self, noisy = True, quiet = True, fromMask = FULL_BOARD):
+
+        moves = []
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        pieces = self.pieceBitboards
+        allies, enemies, occupied = self.colorBitboards[allyColor], self.colorBitboards[enemyColor], self.occupied
+        kingSq, checkers, checkMask, pinned, pinLines = self.getMoveContext(allyColor, enemyColor)
+        self.checked = checkers != 0
+        endMask = (enemies if noisy else 0) | (FULL_BOARD & ~occupied if quiet else 0)
+
+        if SQUARE_BB[kingSq] & fromMask:
+
+            occupiedWithoutKing = occupied ^ SQUARE_BB[kingSq] #king can't hide from a slider by stepping along the checking ray
+            for endSq in squaresOf(KING_ATTACKS[kingSq] & endMask):
+
+                if not self.attackersTo(endSq, enemyColor, occupiedWithoutKing):
+
+                    moves.append(ChessEngine.Move(2 if SQUARE_BB[endSq] & enemies else 5, SQUARES[kingSq], SQUARES[endSq], self.board))
+
+        if checkers & (checkers - 1) == 0: #with more than 1 check only the king can move
+
+            targets = endMask & checkMask
+            for startSq in squaresOf(pieces[allyColor + 'N'] & ~pinned & fromMask): #pinned knights can never move
+
+                self.addMoves(moves, startSq, KNIGHT_ATTACKS[startSq] & targets, enemies, 3)
+
+            for startSq in squaresOf((pieces[allyColor + 'B'] | pieces[allyColor + 'Q']) & fromMask):
+
+                endSquares = bishopAttacks(startSq, occupied) & targets
+                self.addMoves(moves, startSq, endSquares & pinLines[startSq] if SQUARE_BB[startSq] & pinned else endSquares, enemies, 3)
+
+            for startSq in squaresOf((pieces[allyColor + 'R'] | pieces[allyColor + 'Q']) & fromMask):
+
+                endSquares = rookAttacks(startSq, occupied) & targets
+                self.addMoves(moves, startSq, endSquares & pinLines[startSq] if SQUARE_BB[startSq] & pinned else endSquares, enemies, 4)
+
+            self.getPawnBitboardMoves(moves, allyColor, enemyColor, kingSq, checkMask, pinned, pinLines, noisy, quiet, fromMask)
+
+            if not checkers and quiet and SQUARE_BB[kingSq] & fromMask:
+
+                self.getCastleBitboardMoves(moves, allyColor, enemyColor, kingSq)
+
+        return moves
+
+    '''
+    Returns a bitboard of the ally pieces pinned to the king, and a dict mapping each pinned square to the line it is allowed to move along
+    '''
+    def getPins(self, kingSq, allyColor, enemyColor):
+
+        pieces = self.pieceBitboards
+        pinned, pinLines = 0, {}
+        snipers = ((ROOK_RAYS[kingSq] & (pieces[enemyColor + 'R'] | pieces[enemyColor + 'Q'])) |
+                   (BISHOP_RAYS[kingSq] & (pieces[enemyColor + 'B'] | pieces[enemyColor + 'Q'])))
+
+        for sniperSq in squaresOf(snipers):
+
+            blockers = BETWEEN[kingSq][sniperSq] & self.occupied
+            if blockers and blockers & (blockers - 1) == 0 and blockers & self.colorBitboards[allyColor]: #exactly 1 piece in between and its ours
+
+                pinned |= blockers
+                pinLines[blockers.bit_length() - 1] = LINE[kingSq][sniperSq]
+
+        return pinned, pinLines
+
+    '''
+    Adds a move from startSq to every square in endSquares, captures get priority 2 and quiet moves get quietPriority
+    '''
+    def addMoves(self, moves, startSq, endSquares, enemies, quietPriority):
+
+        for endSq in squaresOf(endSquares):
+
+            moves.append(ChessEngine.Move(2 if SQUARE_BB[endSq] & enemies else quietPriority, SQUARES[startSq], SQUARES[endSq], self.board))
+
+    '''
+    Get all pawn moves for the current player, including double pushes, promotions and en-passant. noisy selects captures and promotions,
+    quiet the other pushes
+    '''
+    def getPawnBitboardMoves(self, moves, allyColor, enemyColor, kingSq, checkMask, pinned, pinLines, noisy = True, quiet = True, fromMask = FULL_BOARD):
+
+        pieces = self.pieceBitboards
+        occupied, enemies = self.occupied, self.colorBitboards[enemyColor]
+        step, startRow, promotionRow = (-8, 6, 0) if allyColor == 'w' else (8, 1, 7)
+        enPassantSq = self.enPassantPossible[0] * 8 + self.enPassantPossible[1] if self.enPassantPossible != () and noisy else None
+
+        for startSq in squaresOf(pieces[allyColor + 'P'] & fromMask):
+
+            allowed = checkMask & pinLines[startSq] if SQUARE_BB[startSq] & pinned else checkMask
+            pushSq = startSq + step
+            if not SQUARE_BB[pushSq] & occupied and (noisy if pushSq // 8 == promotionRow else quiet): #1 square pawn advance
+
+                if SQUARE_BB[pushSq] & allowed:
+
+                    moves.append(ChessEngine.Move(5, SQUARES[startSq], SQUARES[pushSq], self.board))
+
+                if startSq // 8 == startRow and not SQUARE_BB[pushSq + step] & occupied and SQUARE_BB[pushSq + step] & allowed:
+
+                    moves.append(ChessEngine.Move(5, SQUARES[startSq], SQUARES[pushSq + step], self.board))
+
+            if noisy:
+
+                for endSq in squaresOf(PAWN_ATTACKS[allyColor][startSq] & enemies & allowed):
+
+                    moves.append(ChessEngine.Move(2, SQUARES[startSq], SQUARES[endSq], self.board))
+
+            if enPassantSq is not None and PAWN_ATTACKS[allyColor][startSq] & SQUARE_BB[enPassantSq]:
+
+                capturedSq = enPassantSq - step
+                if checkMask & (SQUARE_BB[enPassantSq] | SQUARE_BB[capturedSq]):
+                    #remove both pawns from the board and check if it uncovers a slider on the king (covers pins and the pawns sharing the king's row)
+                    occupiedAfter = (occupied ^ SQUARE_BB[startSq] ^ SQUARE_BB[capturedSq]) | SQUARE_BB[enPassantSq]
+                    if not ((rookAttacks(kingSq, occupiedAfter) & (pieces[enemyColor + 'R'] | pieces[enemyColor + 'Q'])) or
+                            (bishopAttacks(kingSq, occupiedAfter) & (pieces[enemyColor + 'B'] | pieces[enemyColor + 'Q']))):
+
+                        moves.append(ChessEngine.Move(1, SQUARES[startSq], SQUARES[enPassantSq], self.board, isEnpassantMove = True))
+
+    '''
+    Generates all valid castle moves for the current player's king. Only called when the king is not in check
+    '''
+    def getCastleBitboardMoves(self, moves, allyColor, enemyColor, kingSq):
+
+        if allyColor == 'w':
+
+            kingMoved, leftRookMoved, rightRookMoved = self.wKMove, self.wLRMove, self.wRRMove
+
+        else:
+
+            kingMoved, leftRookMoved, rightRookMoved = self.bKMove, self.bLRMove, self.bRRMove
+
+        if kingMoved:
+
+            return
+
+        row = kingSq // 8
+        rook = self.pieceBitboards[allyColor + 'R']
+        #queen side: 3 squares to the left must be empty and the 2 the king passes through can't be under attack
+        if not leftRookMoved and rook & SQUARE_BB[row * 8] and not self.occupied & (SQUARE_BB[kingSq - 1] | SQUARE_BB[kingSq - 2] | SQUARE_BB[kingSq - 3]):
+
+            if not self.attackersTo(kingSq - 1, enemyColor, self.occupied) and not self.attackersTo(kingSq - 2, enemyColor, self.occupied):
+
+                moves.append(ChessEngine.Move(2, SQUARES[kingSq], SQUARES[kingSq - 2], self.board, isCastleMove = True))
+        #king side: 2 squares to the right must be empty and not under attack
+        if not rightRookMoved and rook & SQUARE_BB[row * 8 + 7] and not self.occupied & (SQUARE_BB[kingSq + 1] | SQUARE_BB[kingSq + 2]):
+
+            if not self.attackersTo(kingSq + 1, enemyColor, self.occupied) and not self.attackersTo(kingSq + 2, enemyColor, self.occupied):
+
+                moves.append(ChessEngine.Move(2, SQUARES[kingSq], SQUARES[kingSq + 2], self.board, isCastleMove = True))
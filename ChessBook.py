@@ -0,0 +1,254 @@
+'''
+Opening book. The book file is a sorted array of fixed width entries (zobrist hash of the position, moveID, weight) after a small header, so
+it can be memory-mapped and probed with a binary search without reading the whole file. ChessAI plays a book move, picked at random by weight,
+before searching whenever the position is in the book.
+Books are built from PGN game collections (the moves of the first plies of every game, weighted by the result) or from self-play games.
+Usage:
+    python ChessBook.py pgn games.pgn [more.pgn ...] --plies 16     build book.bin from PGN files
+    python ChessBook.py selfplay --games 100 --depth 3              build book.bin from self-play games
+    python ChessBook.py probe [--fen "<fen>"]                       list the book moves of a position
+'''
+import argparse
+import mmap
+import os
+import random
+import struct
+import ChessBitboard
+import ChessFEN
+import ChessPGN
+
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')
+BOOK_HEADER = b'CHESSBK1'
+HEADER_FORMAT = '<8sII' #header, version, number of entries
+ENTRY_FORMAT = '<QHH' #zobrist hash, moveID, weight
+HEADER_SIZE, ENTRY_SIZE = struct.calcsize(HEADER_FORMAT), struct.calcsize(ENTRY_FORMAT)
+BOOK_VERSION = 2 #2: zobrist hashes keyed by castling rights instead of castle flags
+MAX_WEIGHT = 0xFFFF
+BOOK_PLIES = 16 #positions deeper into the game than this aren't added to the book
+RESULT_WEIGHTS = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1), '*': (1, 1)} #weight added for (white, black) moves of a game with this result
+bookRandom = random.Random()
+
+class OpeningBook():
+
+    '''
+    Memory-maps the book file. Raises ValueError if the file isn't a book
+    '''
+    def __init__(self, path = BOOK_FILE):
+
+        with open(path, 'rb') as file:
+
+            self.mapped = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        header, version, self.entries = struct.unpack_from(HEADER_FORMAT, self.mapped, 0) if len(self.mapped) >= HEADER_SIZE else (b'', 0, 0)
+        if header != BOOK_HEADER or version != BOOK_VERSION or len(self.mapped) != HEADER_SIZE + self.entries * ENTRY_SIZE:
+
+            self.mapped.close()
+            raise ValueError(path + ' is not an opening book')
+
+    def close(self):
+
+        self.mapped.close()
+
+    '''
+    Returns a list of (moveID, weight) stored for the position with the given zobrist hash, empty if the position isn't in the book
+    '''
+    def probe(self, key):
+
+        low, high = 0, self.entries
+        while low < high: #first entry with a key >= the one searched for
+
+            middle = (low + high) // 2
+            if struct.unpack_from('<Q', self.mapped, HEADER_SIZE + middle * ENTRY_SIZE)[0] < key:
+
+                low = middle + 1
+
+            else:
+
+                high = middle
+
+        moves = []
+        for index in range(low, self.entries):
+
+            entryKey, moveID, weight = struct.unpack_from(ENTRY_FORMAT, self.mapped, HEADER_SIZE + index * ENTRY_SIZE)
+            if entryKey != key:
+
+                break
+
+            moves.append((moveID, weight))
+
+        return moves
+
+    '''
+    Returns a book move for the game state, picked at random with the book weights as odds, or None if none of its valid moves are in the book
+    '''
+    def chooseMove(self, gameState, validMoves):
+
+        movesByID = {move.moveID: move for move in validMoves}
+        candidates = [(movesByID[moveID], weight) for moveID, weight in self.probe(gameState.zobristHash) if moveID in movesByID and weight > 0]
+        if not candidates:
+
+            return None
+
+        return bookRandom.choices([move for move, weight in candidates], [weight for move, weight in candidates])[0]
+
+'''
+Returns the book at path, or None if there is no valid book there
+'''
+def loadBook(path = BOOK_FILE):
+
+    try:
+
+        return OpeningBook(path)
+
+    except (OSError, ValueError):
+
+        return None
+
+'''
+Writes a book from a dict mapping (zobrist hash, moveID) to weight. Moves with no weight are left out, weights are capped at MAX_WEIGHT.
+Written to a temporary file first, so a book that is being probed is never seen half written
+'''
+def writeBook(weights, path = BOOK_FILE):
+
+    entries = sorted((key, moveID, min(weight, MAX_WEIGHT)) for (key, moveID), weight in weights.items() if weight > 0)
+    tempPath = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tempPath, 'wb') as file:
+
+        file.write(struct.pack(HEADER_FORMAT, BOOK_HEADER, BOOK_VERSION, len(entries)))
+        for entry in entries:
+
+            file.write(struct.pack(ENTRY_FORMAT, *entry))
+
+    os.replace(tempPath, path)
+    return len(entries)
+
+'''
+Adds the first plies moves of a game to the book weights. Stops at the first move that can't be played (illegal, ambiguous or an
+under-promotion). Returns the number of moves added
+'''
+def addGame(weights, sanMoves, result, plies = BOOK_PLIES):
+
+    gameState = ChessBitboard.GameState()
+    whiteWeight, blackWeight = RESULT_WEIGHTS.get(result, RESULT_WEIGHTS['*'])
+    added = 0
+    for san in sanMoves[:plies]:
+
+        move = ChessPGN.moveFromSAN(san, gameState.getValidMoves())
+        if move is None:
+
+            break
+
+        key = (gameState.zobristHash, move.moveID)
+        weights[key] = weights.get(key, 0) + (whiteWeight if gameState.whiteToMove else blackWeight)
+        gameState.makeMove(move)
+        added += 1
+
+    return added
+
+'''
+Builds a book from PGN files. Games that start from a set-up position (a FEN tag) are skipped. Returns the number of entries written
+'''
+def buildFromPGN(paths, bookPath = BOOK_FILE, plies = BOOK_PLIES):
+
+    weights, games = {}, 0
+    for path in paths:
+
+        for tags, sanMoves in ChessPGN.readGames(path):
+
+            if 'FEN' not in tags:
+
+                games += addGame(weights, sanMoves, tags['Result'], plies) > 0
+
+    print('Read %d games' % games)
+    return writeBook(weights, bookPath)
+
+'''
+Builds a book from games the AI plays against itself, searching each move to depth. Every game starts on empty search tables and the root
+moves are shuffled before every search, so equally good moves are picked at random and the games branch out. Every move played gets weight 1. Returns the number of entries written
+'''
+def buildFromSelfPlay(games, bookPath = BOOK_FILE, plies = BOOK_PLIES, depth = 3, seed = None):
+
+    import ChessAI #imported here, ChessAI imports this module to probe the book
+    rng = random.Random(seed)
+    useBook = ChessAI.USE_OPENING_BOOK
+    ChessAI.USE_OPENING_BOOK = False #the book being built can't be used to play its own games
+    weights = {}
+    try:
+
+        for game in range(games):
+
+            gameState = ChessBitboard.GameState()
+            gameState.getBoardMaterial()
+            ChessAI.transpositionTable.clear()
+            for history in ChessAI.historyTable:
+
+                history[:] = [0] * len(history)
+
+            for ply in range(plies):
+
+                validMoves = gameState.getValidMoves()
+                if not validMoves:
+
+                    break
+
+                rng.shuffle(validMoves)
+                move = ChessAI.iterativeDeepening(gameState, validMoves, depth)[0]
+                key = (gameState.zobristHash, move.moveID)
+                weights[key] = weights.get(key, 0) + 1
+                gameState.makeMove(move)
+
+            print('Game %d: %s' % (game + 1, ' '.join(ChessPGN.getMovetext(gameState)[1])))
+
+    finally:
+
+        ChessAI.USE_OPENING_BOOK = useBook
+
+    return writeBook(weights, bookPath)
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Builds and probes the opening book.')
+    parser.add_argument('--book', default = BOOK_FILE, help = 'book file')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    pgnParser = commands.add_parser('pgn', help = 'build the book from PGN files')
+    pgnParser.add_argument('files', nargs = '+')
+    pgnParser.add_argument('--plies', type = int, default = BOOK_PLIES)
+    selfPlayParser = commands.add_parser('selfplay', help = 'build the book from self-play games')
+    selfPlayParser.add_argument('--games', type = int, default = 100)
+    selfPlayParser.add_argument('--plies', type = int, default = BOOK_PLIES)
+    selfPlayParser.add_argument('--depth', type = int, default = 3)
+    selfPlayParser.add_argument('--seed', type = int)
+    probeParser = commands.add_parser('probe', help = 'list the book moves of a position')
+    probeParser.add_argument('--fen', default = ChessFEN.START_FEN)
+    args = parser.parse_args()
+
+    if args.command == 'pgn':
+
+        print('Wrote %d entries to %s' % (buildFromPGN(args.files, args.book, args.plies), args.book))
+
+    elif args.command == 'selfplay':
+
+        print('Wrote %d entries to %s' % (buildFromSelfPlay(args.games, args.book, args.plies, args.depth, args.seed), args.book))
+
+    else:
+
+        book = loadBook(args.book)
+        if book is None:
+
+            print('No opening book at ' + args.book)
+            return 1
+
+        gameState = ChessFEN.loadFEN(ChessBitboard.GameState(), args.fen)
+        movesByID = {move.moveID: move for move in gameState.getValidMoves()}
+        for moveID, weight in book.probe(gameState.zobristHash):
+
+            print('%-8s %d' % (ChessPGN.getSAN(gameState, movesByID[moveID]) if moveID in movesByID else moveID, weight))
+
+        book.close()
+
+    return 0
+
+#this is convention to protect from accidentally running the program when we import another class
+if __name__ == '__main__':
+
+    raise SystemExit(main())
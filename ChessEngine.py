@@ -1,6 +1,41 @@
 '''
 Stores all the information about the current state of a chess game. It will also determine the valid moves at the current state.
 '''
+import random
+import ChessEvaluation
+
+#Zobrist keys: a random 64-bit number for every piece on every square, the side to move, each castling right and each en-passant column.
+#XOR-ing together the keys of everything in a position gives its hash. Fixed seed so hashes are the same across runs and processes
+zobristRandom = random.Random(20220720)
+ZOBRIST_PIECES = {piece: [[zobristRandom.getrandbits(64) for col in range(8)] for row in range(8)]
+                  for piece in ('wP', 'bP', 'wR', 'bR', 'wN', 'bN', 'wB', 'bB', 'wQ', 'bQ', 'wK', 'bK')}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLE = [zobristRandom.getrandbits(64) for right in range(4)] #same order as castlingRights: K, Q, k, q
+ZOBRIST_EN_PASSANT = [zobristRandom.getrandbits(64) for col in range(8)]
+
+#Squares reached from each (row, col) by a knight or king step, and the squares along each sliding direction (nearest first), so attack
+#detection can look outward from a square without bounds checks
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+KNIGHT_OFFSETS = [(-2, -1), (-1, -2), (2, -1), (1, -2), (-2, 1), (-1, 2), (2, 1), (1, 2)]
+KING_OFFSETS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KNIGHT_SQUARES = [[[(row + r, col + c) for r, c in KNIGHT_OFFSETS if 0 <= row + r < 8 and 0 <= col + c < 8] for col in range(8)] for row in range(8)]
+KING_SQUARES = [[[(row + r, col + c) for r, c in KING_OFFSETS if 0 <= row + r < 8 and 0 <= col + c < 8] for col in range(8)] for row in range(8)]
+ROOK_RAYS = [[[[(row + r * scale, col + c * scale) for scale in range(1, 8) if 0 <= row + r * scale < 8 and 0 <= col + c * scale < 8]
+               for r, c in ROOK_DIRECTIONS] for col in range(8)] for row in range(8)]
+BISHOP_RAYS = [[[[(row + r * scale, col + c * scale) for scale in range(1, 8) if 0 <= row + r * scale < 8 and 0 <= col + c * scale < 8]
+                 for r, c in BISHOP_DIRECTIONS] for col in range(8)] for row in range(8)]
+
+'''
+Returns the castling rights (K, Q, k, q) of a castle log entry (wLRMove, wRRMove, wKMove, bLRMove, bRRMove, bKMove): a side keeps a right as
+long as neither its king nor that rook has moved. The hash is keyed by the rights rather than the flags, so a position gets the same hash
+however the rights were lost, and the same as when it is loaded from a FEN
+'''
+def castlingRights(flags):
+
+    wLRMove, wRRMove, wKMove, bLRMove, bRRMove, bKMove = flags
+    return (not wKMove and not wRRMove, not wKMove and not wLRMove, not bKMove and not bRRMove, not bKMove and not bLRMove)
+
 class GameState():
 
     def __init__(self):
@@ -32,6 +67,16 @@ class GameState():
         self.wLRMove, self.wRRMove, self.wKMove, self.bLRMove, self.bRRMove, self.bKMove = False, False, False, False, False, False #flag variable for if piece moved
         self.castleLog = [(self.wLRMove, self.wRRMove, self.wKMove, self.bLRMove, self.bRRMove, self.bKMove)]
         self.boardMaterial = {'wP': 0, 'bP': 0, 'wR': 0, 'bR': 0, 'wN': 0, 'bN': 0, 'wB': 0, 'bB': 0, 'wQ': 0, 'bQ': 0, 'wK': 0, 'bK': 0}
+        self.zobristHash = self.computeZobristHash() #64-bit key of the current position, updated incrementally in makeMove
+        self.zobristLog = [self.zobristHash]
+        #running material + piece position sums for the middlegame and endgame, and the game phase used to blend them
+        self.middlegameScore, self.endgameScore, self.gamePhase = self.computeEvaluation()
+        self.evaluationLog = [(self.middlegameScore, self.endgameScore, self.gamePhase)]
+        self.attackMaps, self.attackMapHash = {}, None #attack maps of the position with zobrist hash attackMapHash, see getAttackMap
+        self.pieceCount = 32 #pieces on the board, kings included. Unlike boardMaterial it is kept up to date by makeMove and undoMove
+        self.halfmoveClock = 0 #plies since the last capture or pawn move, for the fifty-move rule
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = 1 #starts at 1 and goes up after every black move, like in a FEN
 
     '''
     Takes a Move as a parameter and executes it. Updates the flag variable for if king or rook moved.
@@ -76,6 +121,27 @@ class GameState():
                 
                 self.bRRMove = True
 
+        #a rook taken on its starting square can't castle any more, the flag is set so another rook can't take over its right
+        if move.pieceCaptured == 'wR' and move.endSq[0] == 7:
+
+            if move.endSq[1] == 0:
+
+                self.wLRMove = True
+
+            elif move.endSq[1] == 7:
+
+                self.wRRMove = True
+
+        elif move.pieceCaptured == 'bR' and move.endSq[0] == 0:
+
+            if move.endSq[1] == 0:
+
+                self.bLRMove = True
+
+            elif move.endSq[1] == 7:
+
+                self.bRRMove = True
+
         if move.isPawnPromotion:
 
             # choosePromotionPiece = input("Enter into console promotion piece. Type 'q' for queen, 'r' for rook, 'b' for bishop, 'n' for knight. \n")
@@ -107,7 +173,142 @@ class GameState():
 
         self.enPassantLog.append(self.enPassantPossible)
         self.castleLog.append((self.wLRMove, self.wRRMove, self.wKMove, self.bLRMove, self.bRRMove, self.bKMove))
-        
+        self.updateZobristHash(move)
+        self.zobristLog.append(self.zobristHash)
+        self.updateEvaluation(move)
+        self.evaluationLog.append((self.middlegameScore, self.endgameScore, self.gamePhase))
+        if move.pieceCaptured != '--':
+
+            self.pieceCount -= 1
+
+        self.halfmoveClock = 0 if move.pieceCaptured != '--' or move.pieceMoved[1] == 'P' else self.halfmoveClock + 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if self.whiteToMove: #black moved
+
+            self.fullmoveNumber += 1
+
+    '''
+    XORs the changes made by the move into the zobrist hash. Called at the end of makeMove, once the board and logs are updated
+    '''
+    def updateZobristHash(self, move):
+
+        zobristHash = self.zobristHash ^ ZOBRIST_BLACK_TO_MOVE
+        startRow, startCol, endRow, endCol = move.startSq[0], move.startSq[1], move.endSq[0], move.endSq[1]
+        #remove the piece from its starting square and add what is now on the end square (a queen if the pawn promoted)
+        zobristHash ^= ZOBRIST_PIECES[move.pieceMoved][startRow][startCol] ^ ZOBRIST_PIECES[self.board[endRow][endCol]][endRow][endCol]
+
+        if move.isEnpassantMove:
+
+            zobristHash ^= ZOBRIST_PIECES[move.pieceCaptured][startRow][endCol]
+
+        elif move.pieceCaptured != '--':
+
+            zobristHash ^= ZOBRIST_PIECES[move.pieceCaptured][endRow][endCol]
+
+        if move.isCastleMove:
+
+            rook = move.pieceMoved[0] + 'R'
+            if endCol - startCol == 2:
+
+                zobristHash ^= ZOBRIST_PIECES[rook][endRow][endCol + 1] ^ ZOBRIST_PIECES[rook][endRow][endCol - 1]
+
+            else:
+
+                zobristHash ^= ZOBRIST_PIECES[rook][endRow][endCol - 2] ^ ZOBRIST_PIECES[rook][endRow][endCol + 1]
+
+        if self.castleLog[-2] != self.castleLog[-1]: #only a right that was actually lost changes the hash
+
+            for right, (previous, current) in enumerate(zip(castlingRights(self.castleLog[-2]), castlingRights(self.castleLog[-1]))):
+
+                if previous != current:
+
+                    zobristHash ^= ZOBRIST_CASTLE[right]
+
+        if self.enPassantLog[-2] != ():
+
+            zobristHash ^= ZOBRIST_EN_PASSANT[self.enPassantLog[-2][1]]
+
+        if self.enPassantPossible != ():
+
+            zobristHash ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+
+        self.zobristHash = zobristHash
+
+    '''
+    Computes the zobrist hash of the current position from scratch. Used to initialize the hash, and to check the incremental updates against
+    '''
+    def computeZobristHash(self):
+
+        zobristHash = 0 if self.whiteToMove else ZOBRIST_BLACK_TO_MOVE
+        for row in range(0, self.ROWS):
+
+            for col in range(0, self.COLS):
+
+                if self.board[row][col] != '--':
+
+                    zobristHash ^= ZOBRIST_PIECES[self.board[row][col]][row][col]
+
+        for right, possible in enumerate(castlingRights((self.wLRMove, self.wRRMove, self.wKMove, self.bLRMove, self.bRRMove, self.bKMove))):
+
+            if possible:
+
+                zobristHash ^= ZOBRIST_CASTLE[right]
+
+        if self.enPassantPossible != ():
+
+            zobristHash ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+
+        return zobristHash
+
+    '''
+    Adds the change in material and piece positions made by the move to the middlegame and endgame scores, and updates the game phase if a
+    piece was captured or a pawn promoted. Called at the end of makeMove, once the board is updated
+    '''
+    def updateEvaluation(self, move):
+
+        middlegame, endgame = ChessEvaluation.MIDDLEGAME_VALUES, ChessEvaluation.ENDGAME_VALUES
+        startRow, startCol, endRow, endCol = move.startSq[0], move.startSq[1], move.endSq[0], move.endSq[1]
+        pieceAfter = self.board[endRow][endCol] #a queen if the pawn promoted
+        middlegameScore = self.middlegameScore - middlegame[move.pieceMoved][startRow][startCol] + middlegame[pieceAfter][endRow][endCol]
+        endgameScore = self.endgameScore - endgame[move.pieceMoved][startRow][startCol] + endgame[pieceAfter][endRow][endCol]
+        gamePhase = self.gamePhase + ChessEvaluation.PHASE_WEIGHTS[pieceAfter[1]] - ChessEvaluation.PHASE_WEIGHTS[move.pieceMoved[1]]
+
+        if move.pieceCaptured != '--':
+
+            capturedRow = startRow if move.isEnpassantMove else endRow
+            middlegameScore -= middlegame[move.pieceCaptured][capturedRow][endCol]
+            endgameScore -= endgame[move.pieceCaptured][capturedRow][endCol]
+            gamePhase -= ChessEvaluation.PHASE_WEIGHTS[move.pieceCaptured[1]]
+
+        if move.isCastleMove:
+
+            rook = move.pieceMoved[0] + 'R'
+            rookStartCol, rookEndCol = (endCol + 1, endCol - 1) if endCol - startCol == 2 else (endCol - 2, endCol + 1)
+            middlegameScore += middlegame[rook][endRow][rookEndCol] - middlegame[rook][endRow][rookStartCol]
+            endgameScore += endgame[rook][endRow][rookEndCol] - endgame[rook][endRow][rookStartCol]
+
+        self.middlegameScore, self.endgameScore, self.gamePhase = middlegameScore, endgameScore, gamePhase
+
+    '''
+    Computes the middlegame score, endgame score and game phase of the current position from scratch. Used to initialize them, and to check the
+    incremental updates against
+    '''
+    def computeEvaluation(self):
+
+        middlegameScore, endgameScore, gamePhase = 0, 0, 0
+        for row in range(0, self.ROWS):
+
+            for col in range(0, self.COLS):
+
+                piece = self.board[row][col]
+                if piece != '--':
+
+                    middlegameScore += ChessEvaluation.MIDDLEGAME_VALUES[piece][row][col]
+                    endgameScore += ChessEvaluation.ENDGAME_VALUES[piece][row][col]
+                    gamePhase += ChessEvaluation.PHASE_WEIGHTS[piece[1]]
+
+        return middlegameScore, endgameScore, gamePhase
+
     '''
     Returns board back to its previous state by one move if possible
     '''
@@ -140,6 +341,20 @@ class GameState():
             self.castleLog.pop()
             self.wLRMove, self.wRRMove, self.wKMove, self.bLRMove, self.bRRMove, self.bKMove = self.castleLog[-1]
 
+            self.zobristLog.pop()
+            self.zobristHash = self.zobristLog[-1]
+            self.evaluationLog.pop()
+            self.middlegameScore, self.endgameScore, self.gamePhase = self.evaluationLog[-1]
+            if move.pieceCaptured != '--':
+
+                self.pieceCount += 1
+
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            if not self.whiteToMove: #black's move was undone
+
+                self.fullmoveNumber -= 1
+
             if move.isCastleMove:
                 
                 if move.endSq[1] - move.startSq[1] == 2:
@@ -225,6 +440,53 @@ class GameState():
             moves = self.getAllPossibleMoves()
             self.getCastleMoves(kingRow, kingCol, moves)
 
+        self.updateGameOver(moves)
+        return moves #in generation order, the AI search orders the moves itself
+
+    '''
+    Valid captures, en-passant captures and promotions only. Used by the search to generate the moves of a position in stages
+    '''
+    def getNoisyMoves(self):
+
+        return [move for move in self.getValidMoves() if move.pieceCaptured != '--' or move.isPawnPromotion]
+
+    '''
+    Valid moves that are not in getNoisyMoves, including castling
+    '''
+    def getQuietMoves(self):
+
+        return [move for move in self.getValidMoves() if move.pieceCaptured == '--' and not move.isPawnPromotion]
+
+    '''
+    Returns the valid move with the given moveID, or None if there is no such move in this position
+    '''
+    def getMove(self, moveID):
+
+        for move in self.getValidMoves():
+
+            if move.moveID == moveID:
+
+                return move
+
+        return None
+
+    '''
+    Returns True if neither side can mate: only the kings are left, or the kings and one knight or bishop. Uses pieceCount, which makeMove
+    keeps up to date, so it is cheap enough for every node of the search, the board is only looked at once 3 pieces are left
+    '''
+    def insufficientMaterial(self):
+
+        if self.pieceCount > 3:
+
+            return False
+
+        return self.pieceCount == 2 or any(piece[1] in 'NB' for row in self.board for piece in row)
+
+    '''
+    Sets the checkmate or stalemate flag for the current player based on their list of valid moves
+    '''
+    def updateGameOver(self, moves):
+
         if len(moves) == 0: #no possible moves to make, either checkmate or stalemate
 
             if self.inCheck():
@@ -248,9 +510,6 @@ class GameState():
         else:
 
             self.checkmate, self.stalemate = False, False
-        
-        sortedMoves = sorted(moves, key=lambda moves: moves.priorityScore) #sort the moves based on their priority score (captures/pawn promotions are higher prio)
-        return sortedMoves
 
     '''
     If player is in check, returns a list of pins and checks
@@ -349,19 +608,101 @@ class GameState():
     '''
     def squareUnderAttack(self, row, col):
 
-        #swap to other side, get all possible moves from that side, and swap back to original side
-        self.whiteToMove = not self.whiteToMove 
-        enemyMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
+        return self.isSquareAttacked(row, col, 'b' if self.whiteToMove else 'w')
+
+    '''
+    Returns True if a piece of attackerColor attacks (row, col). Looks outward from the square instead of generating the attacker's moves: a
+    pawn or knight or king of that color a step away, or a rook/queen or bishop/queen as the first piece along a ray. The piece on
+    liftedSquare is treated as if it wasn't there, so a king can't step back along the ray of the slider checking it
+    '''
+    def isSquareAttacked(self, row, col, attackerColor, liftedSquare = ()):
+
+        board = self.board
+        pawnRow = row + 1 if attackerColor == 'w' else row - 1 #white pawns capture towards row 0, so they attack from the row below
+        if 0 <= pawnRow < 8 and ((col > 0 and board[pawnRow][col - 1] == attackerColor + 'P') or (col < 7 and board[pawnRow][col + 1] == attackerColor + 'P')):
+
+            return True
 
-        for move in enemyMoves:
+        for endRow, endCol in KNIGHT_SQUARES[row][col]:
 
-            if move.endSq[0] == row and move.endSq[1] == col: #if square is under attack, return true, else false
+            if board[endRow][endCol] == attackerColor + 'N':
 
                 return True
-        
+
+        for endRow, endCol in KING_SQUARES[row][col]:
+
+            if board[endRow][endCol] == attackerColor + 'K':
+
+                return True
+
+        for rays, slider in ((ROOK_RAYS, attackerColor + 'R'), (BISHOP_RAYS, attackerColor + 'B')):
+
+            for ray in rays[row][col]:
+
+                for endRow, endCol in ray:
+
+                    piece = board[endRow][endCol]
+                    if piece != '--' and (endRow, endCol) != liftedSquare:
+
+                        if piece == slider or piece == attackerColor + 'Q':
+
+                            return True
+
+                        break
+
         return False
 
+    '''
+    Returns the set of squares (row * 8 + col) attacked by the pieces of attackerColor, with the piece on liftedSquare taken off the board.
+    Maps are cached for the current position, so asking for the same map again before a move is made costs nothing
+    '''
+    def getAttackMap(self, attackerColor, liftedSquare = ()):
+
+        if self.attackMapHash != self.zobristHash:
+
+            self.attackMaps, self.attackMapHash = {}, self.zobristHash
+
+        key = (attackerColor, liftedSquare)
+        if key not in self.attackMaps:
+
+            board = self.board
+            attacked = set()
+            for row in range(8):
+
+                for col in range(8):
+
+                    if board[row][col][0] != attackerColor:
+
+                        continue
+
+                    piece = board[row][col][1]
+                    if piece == 'P':
+
+                        pawnRow = row - 1 if attackerColor == 'w' else row + 1
+                        if 0 <= pawnRow < 8:
+
+                            attacked.update(pawnRow * 8 + endCol for endCol in (col - 1, col + 1) if 0 <= endCol < 8)
+
+                    elif piece == 'N' or piece == 'K':
+
+                        attacked.update(endRow * 8 + endCol for endRow, endCol in (KNIGHT_SQUARES if piece == 'N' else KING_SQUARES)[row][col])
+
+                    else:
+
+                        rays = (ROOK_RAYS[row][col] if piece != 'B' else []) + (BISHOP_RAYS[row][col] if piece != 'R' else [])
+                        for ray in rays:
+
+                            for endRow, endCol in ray:
+
+                                attacked.add(endRow * 8 + endCol)
+                                if board[endRow][endCol] != '--' and (endRow, endCol) != liftedSquare:
+
+                                    break
+
+            self.attackMaps[key] = attacked
+
+        return self.attackMaps[key]
+
     '''
     All moves without considering checks
     '''
@@ -656,39 +997,15 @@ class GameState():
     '''
     def getKingMoves(self, row, col, moves):
         
-        allyColor = 'w' if self.whiteToMove else 'b'
         enemyColor = 'b' if self.whiteToMove else 'w'
-        #8 directions: same as queen, but cant scale
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-
-        for r, c in directions:
-
-            endRow, endCol =  row + r, col + c #every direction
-                
-            if endRow >= 0 and endCol >= 0 and endRow < self.ROWS and endCol < self.COLS: #ensure endRow, endCol in bounds
-
-                if self.board[endRow][endCol][0] == enemyColor or self.board[endRow][endCol] == '--': #same logic applies as the knight
-
-                    if allyColor == 'w':
-
-                        self.whiteKingLocation = (endRow, endCol)
-
-                    else:
-
-                        self.blackKingLocation = (endRow, endCol)
+        #every square the enemy attacks with the king lifted off the board, so the king can't step back along a checking ray
+        attacked = self.getAttackMap(enemyColor, (row, col))
 
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-                    if not inCheck:
+        for endRow, endCol in KING_SQUARES[row][col]: #8 directions: same as queen, but cant scale
 
-                        moves.append(Move(5, (row, col), (endRow, endCol), self.board))
+            if (self.board[endRow][endCol][0] == enemyColor or self.board[endRow][endCol] == '--') and endRow * 8 + endCol not in attacked:
 
-                    if allyColor == 'w':
-
-                        self.whiteKingLocation = (row, col)
-
-                    else:
-
-                        self.blackKingLocation = (row, col)
+                moves.append(Move(5, (row, col), (endRow, endCol), self.board))
 
     '''
     Generates all valid castle moves for the king at (row, col) and add them to the list of moves.
@@ -717,6 +1034,36 @@ class GameState():
 
                     moves.append(Move(2, (row, col), (row, col + 2), self.board, isCastleMove = True))
     
+    '''
+    Rebuilds everything derived from the board, side to move, castle flags, en-passant square and halfmove clock after they were set directly
+    (e.g. from a FEN). The move, en-passant, castle, hash and clock logs restart from this position, so it can't be undone past it
+    '''
+    def reloadPosition(self):
+
+        for row in range(0, self.ROWS):
+
+            for col in range(0, self.COLS):
+
+                if self.board[row][col] == 'wK':
+
+                    self.whiteKingLocation = (row, col)
+
+                elif self.board[row][col] == 'bK':
+
+                    self.blackKingLocation = (row, col)
+
+        self.moveLog = []
+        self.checkmate, self.stalemate = False, False
+        self.enPassantLog = [(self.enPassantPossible)]
+        self.castleLog = [(self.wLRMove, self.wRRMove, self.wKMove, self.bLRMove, self.bRRMove, self.bKMove)]
+        self.getBoardMaterial()
+        self.pieceCount = sum(self.boardMaterial.values())
+        self.zobristHash = self.computeZobristHash()
+        self.zobristLog = [self.zobristHash]
+        self.middlegameScore, self.endgameScore, self.gamePhase = self.computeEvaluation()
+        self.evaluationLog = [(self.middlegameScore, self.endgameScore, self.gamePhase)]
+        self.halfmoveClockLog = [self.halfmoveClock]
+
     '''
     Updates the count of all pieces remaining on the current board
     '''
@@ -733,9 +1080,12 @@ class GameState():
                     self.boardMaterial[self.board[row][col]] += 1
 
 '''
-Stores all information regarding a given move.
+Stores all information regarding a given move. Uses __slots__ instead of a per-instance __dict__, since the search creates and throws away
+tens of thousands of moves
 '''
 class Move():
+
+    __slots__ = ('priorityScore', 'startSq', 'endSq', 'pieceMoved', 'pieceCaptured', 'isPawnPromotion', 'isEnpassantMove', 'isCastleMove', 'moveID')
     #Maps the board's (row, col) notation into proper chess notation. 
     #(In chess, rows go from 1-8 from bottom to top and cols go from a-h from left to right)
     ranksToRows = {'1': 7, '2': 6, '3': 5, '4': 4, '5': 3, '6': 2, '7': 1, '8': 0}
@@ -748,45 +1098,49 @@ class Move():
         self.priorityScore = priorityScore #Lower score is higher priority
         self.startSq = startSq
         self.endSq = endSq
-        self.pieceMoved = board[self.startSq[0]][self.startSq[1]]
-        self.pieceCaptured = board[self.endSq[0]][self.endSq[1]]
+        startRow, endRow = startSq[0], endSq[0]
+        self.pieceMoved = pieceMoved = board[startRow][startSq[1]]
+        self.pieceCaptured = board[endRow][endSq[1]]
         #True if white or black pawn reaches opposite side of the board, false otherwise
-        self.isPawnPromotion = (self.pieceMoved == 'wP' and self.endSq[0] == 0) or (self.pieceMoved == 'bP' and self.endSq[0] == 7)
+        self.isPawnPromotion = (endRow == 0 and pieceMoved == 'wP') or (endRow == 7 and pieceMoved == 'bP')
         self.isEnpassantMove = isEnpassantMove #true if en passant is possible, else false
-        if self.isEnpassantMove: #if move is an enpassant move, then the piececaptured will be '--', so we have to manually set it to 'wP' or 'bP'
+        if isEnpassantMove: #if move is an enpassant move, then the piececaptured will be '--', so we have to manually set it to 'wP' or 'bP'
 
-            self.pieceCaptured = 'bP' if self.pieceMoved == 'wP' else 'wP'
+            self.pieceCaptured = 'bP' if pieceMoved == 'wP' else 'wP'
 
         self.isCastleMove = isCastleMove #castle move
-        self.moveID = self.startSq[0] * 1000 + self.startSq[1] * 100 + self.endSq[0] * 10 + self.endSq[1] #Unique moveID, similar to hashfunction
+        self.moveID = startRow * 1000 + startSq[1] * 100 + endRow * 10 + endSq[1] #Unique moveID, similar to hashfunction
 
     '''
-    Overriding the equals method
+    Overriding the equals method. Moves are equal if they have the same moveID
     '''
     def __eq__(self, other):
 
-        if isinstance(other, Move): #ensures that the two objects being compared are Move objects
+        return other.__class__ is Move and self.moveID == other.moveID
 
-            return self.moveID == other.moveID
+    '''
+    The moveID is already unique, so moves can be used as dict keys and in sets
+    '''
+    def __hash__(self):
 
-        return False
+        return self.moveID
 
     '''
-    Returns the chess notation for starting (row,col) and end (row,col) as seen in chess. TO-DO: Check/mate moves
+    Returns the chess notation for starting (row,col) and end (row,col) as seen in chess. It only knows the move, not the position, so there is no
+    disambiguation or check mark: ChessPGN.getSAN gives the full SAN
     '''
-    #To Do: add additional notation for castle, en passant, check, etc
     def getChessNotation(self):
 
         if self.pieceMoved == 'wP' or self.pieceMoved == 'bP': #if pawn move
 
-            if self.pieceCaptured != '--': #return starting file, x if piece captured, ending rank + file, =P if pawn promotion
+            if self.pieceCaptured != '--': #return starting file, x if piece captured, ending rank + file, =Q if pawn promotion
 
-                return self.getRankFile(self.startSq[0], self.startSq[1])[0] + 'x' + self.getRankFile(self.endSq[0], self.endSq[1]) + '=P' if \
+                return self.getRankFile(self.startSq[0], self.startSq[1])[0] + 'x' + self.getRankFile(self.endSq[0], self.endSq[1]) + '=Q' if \
                 self.isPawnPromotion else self.getRankFile(self.startSq[0], self.startSq[1])[0] + 'x' + self.getRankFile(self.endSq[0], self.endSq[1])
 
-            elif self.isPawnPromotion: #pawn promotion but no capture
+            elif self.isPawnPromotion: #pawn promotion but no capture, always to a queen
 
-                return self.getRankFile(self.endSq[0], self.endSq[1]) + '=P'
+                return self.getRankFile(self.endSq[0], self.endSq[1]) + '=Q'
 
             else: #standard pawn move, return end file and rank
 
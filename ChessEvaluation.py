@@ -0,0 +1,109 @@
+'''
+Evaluation tables shared by the game state and the AI. GameState keeps a running middlegame and endgame score built from these values, so the
+AI can read the evaluation of a position instead of adding up the whole board.
+'''
+#Evaluation scores taken from https://www.chessprogramming.org/Simplified_Evaluation_Function
+pieceScore = {'K': 20000, 'Q': 900, 'R': 500, 'N': 320, 'B': 330, 'P': 100}
+#Board evaluations for each piece are given for white side, mirrored for black side
+pawnScores = [[ 0,  0,  0,  0,  0,  0,  0,  0],
+              [50, 50, 50, 50, 50, 50, 50, 50], 
+              [10, 10, 20, 30, 30, 20, 10, 10], 
+              [ 5,  5, 10, 25, 25, 10,  5,  5], 
+              [ 0,  0,  0, 20, 20,  0,  0,  0], 
+              [ 5, -5,-10,  0,  0,-10, -5, -5], 
+              [ 5, 10, 10,-20,-20, 10, 10,  5], 
+              [ 0,  0,  0,  0,  0,  0,  0,  0]]
+
+rookScores = [[ 0,  0,  0,  0,  0,  0,  0,  0],
+              [ 5, 10, 10, 10, 10, 10, 10, 10], 
+              [-5,  0,  0,  0,  0,  0,  0,  0], 
+              [-5,  0,  0,  0,  0,  0,  0,  0], 
+              [-5,  0,  0,  0,  0,  0,  0,  0], 
+              [-5,  0,  0,  0,  0,  0,  0,  0], 
+              [-5,  0,  0,  0,  0,  0,  0,  0], 
+              [ 0,  0,  0,  5,  5,  0,  0,  0]]
+
+knightScores = [[-50,-40,-30,-30,-30,-30,-40,-50],
+                [-40,-20,  0,  0,  0,  0,-20,-40], 
+                [-30, 0 , 10, 15, 15, 10,  0,-30], 
+                [-30,  5, 15, 20, 20, 15,  5,-30], 
+                [-30,  5, 15, 20, 20, 15,  5,-30], 
+                [-30, 0 , 10, 15, 15, 10,  0,-30], 
+                [-40,-20,  0,  0,  0,  0,-20,-40],
+                [-50,-40,-30,-30,-30,-30,-40,-50]]
+
+bishopScores = [[-20,-10,-10,-10,-10,-10,-10,-20],
+                [-10,  0,  0,  0,  0,  0,  0,-10], 
+                [-10,  0,  5, 10, 10,  5,  0,-10], 
+                [-10,  5,  5, 10, 10,  5,  5,-10], 
+                [-10,  0, 10, 10, 10, 10,  0,-10], 
+                [-10, 10, 10, 10, 10, 10, 10,-10], 
+                [-10,  5,  0,  0,  0,  0,  5,-10], 
+                [-20,-10,-10,-10,-10,-10,-10,-20]]
+
+queenScores = [[-20,-10,-10, -5, -5,-10,-10,-20],
+               [-10,  0,  0,  0,  0,  0,  0,-10], 
+               [-10,  0,  5,  5,  5,  5,  0,-10], 
+               [ -5,  0,  5,  5,  5,  5,  0, -5], 
+               [  0,  0,  5,  5,  5,  5,  0, -5], 
+               [-10,  0,  5,  5,  5,  5,  0,-10], 
+               [-10,  0,  5,  0,  0,  0,  0,-10], 
+               [-20,-10,-10, -5, -5,-10,-10,-20]]
+
+kingScores = [[-30,-40,-40,-50,-50,-40,-40,-30],
+              [-30,-40,-40,-50,-50,-40,-40,-30], 
+              [-30,-40,-40,-50,-50,-40,-40,-30], 
+              [-30,-40,-40,-50,-50,-40,-40,-30],
+              [-20,-30,-30,-40,-40,-30,-30,-20],
+              [-10,-20,-20,-20,-20,-20,-20,-10],
+              [ 20, 20,  0,  0,  0,  0, 20, 20],
+              [ 20, 30, 10,  0,  0, 10, 30, 20]]
+
+endGameKingScores = [[-50,-40,-30,-20,-20,-30,-40,-50],
+                     [-30,-20,-10,  0,  0,-10,-20,-30], 
+                     [-30,-10, 20, 30, 30, 20,-10,-30], 
+                     [-30,-10, 30, 40, 40, 30,-10,-30],
+                     [-30,-10, 30, 40, 40, 30,-10,-30],
+                     [-30,-10, 20, 30, 30, 20,-10,-30], 
+                     [-30,-30,  0,  0,  0,  0,-30,-30], 
+                     [-50,-30,-30,-30,-30,-30,-30,-50]]
+
+'''
+Mirrors a table for the other color, same as rotating the board 180 degrees
+'''
+def flip(table):
+
+    return [row[::-1] for row in table[::-1]]
+
+piecePositionScores = {'wP': pawnScores, 'bP': flip(pawnScores), 'wR': rookScores, 'bR': flip(rookScores), 'wN': knightScores, 'bN': flip(knightScores), 
+                       'wB': bishopScores, 'bB': flip(bishopScores), 'wQ': queenScores, 'bQ': flip(queenScores), 'wK': kingScores, 'bK': flip(kingScores),
+                       'endGameWK': endGameKingScores, 'endGameBK': flip(endGameKingScores)} #flip the values if black piece
+
+MAX_PHASE = 24 #game phase of the starting position, 0 when only kings and pawns are left
+PHASE_WEIGHTS = {'K': 0, 'Q': 4, 'R': 2, 'N': 1, 'B': 1, 'P': 0} #how much each piece counts towards the game phase
+ENDGAME_POSITION_SCALE = 2 #piece positions matter more once the heavy pieces are gone
+
+'''
+Returns the score of every piece on every square for the middlegame or endgame: material plus position, positive for white and negative for black
+'''
+def pieceSquareValues(endgame):
+
+    values = {}
+    for piece in ('wP', 'bP', 'wR', 'bR', 'wN', 'bN', 'wB', 'bB', 'wQ', 'bQ', 'wK', 'bK'):
+
+        sign = 1 if piece[0] == 'w' else -1
+        if piece[1] == 'K' and endgame:
+
+            positionScores = piecePositionScores['endGameWK' if piece[0] == 'w' else 'endGameBK']
+
+        else:
+
+            positionScores = piecePositionScores[piece]
+
+        scale = ENDGAME_POSITION_SCALE if endgame and piece[1] != 'K' else 1
+        values[piece] = [[sign * (pieceScore[piece[1]] + positionScores[row][col] * scale) for col in range(8)] for row in range(8)]
+
+    return values
+
+MIDDLEGAME_VALUES = pieceSquareValues(False)
+ENDGAME_VALUES = pieceSquareValues(True)
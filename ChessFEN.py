@@ -0,0 +1,281 @@
+'''
+FEN and EPD import and export. loadFEN sets up a GameState from a FEN (or the position fields of an EPD line) and rebuilds everything kept
+alongside the board: king locations, material, castle and en-passant logs, zobrist hash, evaluation and the halfmove clock and fullmove number.
+getFEN and getEPD write the current position back out. readPositions and loadPositions go through a file of FEN or EPD lines one at a time,
+so test suites and opening suites of any size can be loaded without reading the whole file.
+Usage:
+    python ChessFEN.py positions.epd            checks every position in the file and prints it back as FEN
+'''
+import argparse
+import re
+import ChessBitboard
+import ChessEngine
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+FEN_PIECES = {'P': 'wP', 'N': 'wN', 'B': 'wB', 'R': 'wR', 'Q': 'wQ', 'K': 'wK', 'p': 'bP', 'n': 'bN', 'b': 'bB', 'r': 'bR', 'q': 'bQ', 'k': 'bK'}
+PIECE_LETTERS = {piece: letter for letter, piece in FEN_PIECES.items()}
+#castling right: (king square, rook square, rook, castle flag of the rook)
+CASTLING_RIGHTS = {'K': ((7, 4), (7, 7), 'wR', 'wRRMove'), 'Q': ((7, 4), (7, 0), 'wR', 'wLRMove'),
+                   'k': ((0, 4), (0, 7), 'bR', 'bRRMove'), 'q': ((0, 4), (0, 0), 'bR', 'bLRMove')}
+EPD_OPERATION = re.compile(r'\s*([A-Za-z]\w*)((?:\s+(?:"[^"]*"|[^\s;]+))*)\s*;')
+EPD_OPERAND = re.compile(r'"([^"]*)"|([^\s;]+)')
+
+'''
+Returns the 8x8 board of the piece placement field of a FEN. Raises ValueError if it isn't 8 ranks of 8 squares
+'''
+def parseBoard(placement):
+
+    ranks = placement.split('/')
+    if len(ranks) != 8:
+
+        raise ValueError('FEN board has ' + str(len(ranks)) + ' ranks: ' + placement)
+
+    board = []
+    for rank in ranks:
+
+        row = []
+        for char in rank:
+
+            if char in '12345678':
+
+                row.extend(['--'] * int(char))
+
+            elif char in FEN_PIECES:
+
+                row.append(FEN_PIECES[char])
+
+            else:
+
+                raise ValueError('Invalid character ' + repr(char) + ' in FEN board: ' + placement)
+
+        if len(row) != 8:
+
+            raise ValueError('FEN rank ' + rank + ' is not 8 squares long')
+
+        board.append(row)
+
+    return board
+
+'''
+Sets up the game state from a FEN. The castling, en-passant and clock fields can be left out, like in the position part of an EPD line.
+Castling rights whose king or rook isn't on its starting square, and an en-passant square no pawn could have skipped, are dropped.
+Raises ValueError if the FEN can't be read or the position can't happen in a game: not one king per side, pawns on the first or last rank,
+or the side that just moved left in check. Returns the game state
+'''
+def loadFEN(gameState, fen):
+
+    fields = fen.split()
+    if len(fields) < 2 or fields[1] not in ('w', 'b'):
+
+        raise ValueError('FEN needs a board and a side to move: ' + fen)
+
+    board = parseBoard(fields[0])
+    castling = fields[2] if len(fields) > 2 else '-'
+    enPassant = fields[3] if len(fields) > 3 else '-'
+    if castling != '-' and (not castling or any(char not in 'KQkq' for char in castling)):
+
+        raise ValueError('Invalid FEN castling field ' + castling)
+
+    if enPassant != '-' and not re.fullmatch(r'[a-h][36]', enPassant):
+
+        raise ValueError('Invalid FEN en-passant field ' + enPassant)
+
+    try:
+
+        halfmoveClock, fullmoveNumber = int(fields[4]) if len(fields) > 4 else 0, int(fields[5]) if len(fields) > 5 else 1
+
+    except ValueError:
+
+        raise ValueError('Invalid FEN move counters: ' + ' '.join(fields[4:6])) from None
+
+    kings = {piece: [(row, col) for row in range(8) for col in range(8) if board[row][col] == piece] for piece in ('wK', 'bK')}
+    if len(kings['wK']) != 1 or len(kings['bK']) != 1:
+
+        raise ValueError('FEN needs exactly one king per side: ' + fen)
+
+    if any(board[row][col][1] == 'P' for row in (0, 7) for col in range(8)):
+
+        raise ValueError('FEN has a pawn on the first or last rank: ' + fen)
+
+    gameState.board = board
+    gameState.whiteToMove = fields[1] == 'w'
+    #the castle flags record if the king or rook has moved, so a missing castling right is treated as that rook having moved
+    for right, (kingSquare, rookSquare, rook, flag) in CASTLING_RIGHTS.items():
+
+        possible = right in castling and board[kingSquare[0]][kingSquare[1]] == rook[0] + 'K' and board[rookSquare[0]][rookSquare[1]] == rook
+        setattr(gameState, flag, not possible)
+
+    gameState.wKMove = gameState.wLRMove and gameState.wRRMove
+    gameState.bKMove = gameState.bLRMove and gameState.bRRMove
+    gameState.enPassantPossible = ()
+    if enPassant != '-':
+
+        row, col = ChessEngine.Move.ranksToRows[enPassant[1]], ChessEngine.Move.filesToCols[enPassant[0]]
+        pawnRow, pawn = (row + 1, 'bP') if gameState.whiteToMove else (row - 1, 'wP') #the pawn that skipped the square is one step past it
+        startRow = row - 1 if gameState.whiteToMove else row + 1
+        if (row == 2) == gameState.whiteToMove and board[pawnRow][col] == pawn and board[row][col] == '--' and board[startRow][col] == '--':
+
+            gameState.enPassantPossible = (row, col)
+
+    gameState.halfmoveClock, gameState.fullmoveNumber = max(halfmoveClock, 0), max(fullmoveNumber, 1)
+    king = kings['bK' if gameState.whiteToMove else 'wK'][0]
+    if gameState.isSquareAttacked(king[0], king[1], 'w' if gameState.whiteToMove else 'b'):
+
+        raise ValueError('FEN side not to move is in check: ' + fen)
+
+    gameState.reloadPosition()
+    return gameState
+
+'''
+Returns the FEN of the current position
+'''
+def getFEN(gameState):
+
+    ranks = []
+    for row in gameState.board:
+
+        rank, empty = '', 0
+        for piece in row:
+
+            if piece == '--':
+
+                empty += 1
+
+            else:
+
+                rank += (str(empty) if empty else '') + PIECE_LETTERS[piece]
+                empty = 0
+
+        ranks.append(rank + (str(empty) if empty else ''))
+
+    return ' '.join(['/'.join(ranks), 'w' if gameState.whiteToMove else 'b', getCastling(gameState), getEnPassant(gameState),
+                     str(gameState.halfmoveClock), str(gameState.fullmoveNumber)])
+
+'''
+Returns the castling field of a FEN, from the castle flags. Like loadFEN, a right also needs the king and rook on their starting squares
+'''
+def getCastling(gameState):
+
+    castling, board = '', gameState.board
+    for right, (kingSquare, rookSquare, rook, flag) in CASTLING_RIGHTS.items():
+
+        if not getattr(gameState, flag) and not getattr(gameState, rook[0] + 'KMove') and board[kingSquare[0]][kingSquare[1]] == rook[0] + 'K' and \
+           board[rookSquare[0]][rookSquare[1]] == rook:
+
+            castling += right
+
+    return castling or '-'
+
+'''
+Returns the en-passant field of a FEN. Like GameState, it is set after every double pawn push, whether or not a pawn can take en passant
+'''
+def getEnPassant(gameState):
+
+    if gameState.enPassantPossible == ():
+
+        return '-'
+
+    return ChessEngine.Move.colsToFiles[gameState.enPassantPossible[1]] + ChessEngine.Move.rowsToRanks[gameState.enPassantPossible[0]]
+
+'''
+Splits a FEN or EPD line into (fen, operations). operations maps every EPD opcode to its list of operands, with the quotes taken off strings
+(e.g. {'bm': ['Nf3'], 'id': ['WAC.001']}). An EPD line has no clock fields, so they come from its hmvc and fmvn operations if it has them
+'''
+def parseEPD(line):
+
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+
+        return ' '.join(fields), {}
+
+    rest = fields[4] if len(fields) > 4 else ''
+    clocks = re.match(r'(\d+)\s+(\d+)(?:\s+|$)', rest) #a FEN, maybe with operations after it
+    if clocks is not None:
+
+        rest = rest[clocks.end():]
+
+    operations = {}
+    for match in EPD_OPERATION.finditer(rest if rest.rstrip().endswith(';') else rest + ';'):
+
+        operations[match.group(1)] = [quoted if quoted else plain for quoted, plain in EPD_OPERAND.findall(match.group(2))]
+
+    if clocks is not None:
+
+        halfmoveClock, fullmoveNumber = clocks.group(1), clocks.group(2)
+
+    else:
+
+        halfmoveClock, fullmoveNumber = operations.get('hmvc', ['0'])[0], operations.get('fmvn', ['1'])[0]
+
+    return ' '.join(fields[:4] + [halfmoveClock, fullmoveNumber]), operations
+
+'''
+Returns the EPD line of the current position with the given operations, a dict of opcode to operand list like parseEPD returns. Operands
+with spaces or quotes in them are written as strings
+'''
+def getEPD(gameState, operations = None):
+
+    line = ' '.join(getFEN(gameState).split()[:4])
+    for opcode, operands in (operations or {}).items():
+
+        operands = [operand if re.fullmatch(r'[^\s;"]+', operand) else '"' + operand.replace('"', "'") + '"' for operand in operands]
+        line += ' ' + ' '.join([opcode] + operands) + ';'
+
+    return line
+
+'''
+Yields (line number, fen, operations) for every FEN or EPD line of a file, reading one line at a time. Empty lines and lines starting with #
+are skipped
+'''
+def readPositions(path):
+
+    with open(path, encoding = 'utf-8', errors = 'replace') as file:
+
+        for lineNumber, line in enumerate(file, 1):
+
+            line = line.strip()
+            if line and not line.startswith('#'):
+
+                fen, operations = parseEPD(line)
+                yield lineNumber, fen, operations
+
+'''
+Yields (game state, operations) for every position of a FEN or EPD file, each on a new game state of gameStateClass (the bitboard GameState
+by default). Raises ValueError with the line number at the first position that can't be loaded
+'''
+def loadPositions(path, gameStateClass = None):
+
+    gameStateClass = ChessBitboard.GameState if gameStateClass is None else gameStateClass
+    for lineNumber, fen, operations in readPositions(path):
+
+        try:
+
+            yield loadFEN(gameStateClass(), fen), operations
+
+        except ValueError as error:
+
+            raise ValueError('%s line %d: %s' % (path, lineNumber, error)) from None
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Checks the positions of a FEN or EPD file and prints them back as FEN.')
+    parser.add_argument('file')
+    args = parser.parse_args()
+    errors = 0
+    for lineNumber, fen, operations in readPositions(args.file):
+
+        try:
+
+            print(getFEN(loadFEN(ChessBitboard.GameState(), fen)))
+
+        except ValueError as error:
+
+            print('Line %d: %s' % (lineNumber, error))
+            errors += 1
+
+    return 1 if errors else 0
+
+#this is convention to protect from accidentally running the program when we import another class
+if __name__ == '__main__':
+
+    raise SystemExit(main())
@@ -2,50 +2,105 @@
 The main driver file. Responsible for handling user input and displaying current Game State Object
 '''
 import os
-
-import numpy as np
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 import math
+import struct
 import pygame as pg
 import ChessEngine
+import ChessBitboard
 import ChessAI
-from multiprocessing import Process, Queue
+import ChessWorker
 
 pg.init()
 BOARD_WIDTH, BOARD_HEIGHT = 768, 768
 MOVELOG_WIDTH, MOVELOG_HEIGHT = 256, BOARD_HEIGHT
+MOVELOG_RECT = pg.Rect(BOARD_WIDTH, 0, MOVELOG_WIDTH, MOVELOG_HEIGHT)
 DIMENSION = 8
 SQ_SIZE = BOARD_HEIGHT // DIMENSION
 MAX_FPS = 15
-IMAGES = {}
+IMAGES = {} #images loaded so far, see getImage
 WHITE = pg.Color('white')
 BLACK = pg.Color('black')
 DARKGRAY = pg.Color('darkgray')
 GREEN = pg.Color('green2')
 FONT = pg.font.SysFont('Helvitca', 30, True, False)
 SMALLFONT = pg.font.SysFont('Helvitca', 20, True, False)
-BG = pg.transform.scale(pg.image.load('images/tournament.png'), (BOARD_WIDTH, BOARD_HEIGHT))
+LARGEFONT = pg.font.SysFont('Helvitca', 40, True, False)
+GAME_STATE = ChessBitboard.GameState #board backend used for games, ChessEngine.GameState uses the 8x8 list only
+AI_WORKERS = 1 #processes the AI searches with, more than 1 splits the root moves across a process pool (see ChessParallel)
+SHOW_SEARCH_STATS = True #print the depth, score and hash stats of every AI search
+PONDER = True #keep the AI searching on the human's time, on the reply it expects (see ChessWorker.EngineWorker.ponder)
+BOARD_STYLES = ['green', 'walnut', 'tournament', 'sand', 'icysea'] #backgrounds, every other image is a piece named piece style + piece
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images')
+IMAGE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imagecache')
+IMAGE_CACHE_HEADER = b'CHESSIMG'
+IMAGE_CACHE_VERSION = 1
+IMAGE_CACHE_FORMAT = '<8sIqII' #header, version, modification time of the png in ns, width, height, followed by the RGBA pixels
+
+'''
+Returns an image, loading it the first time it is asked for, so only the piece and board styles in use are ever loaded. Images are kept
+in the display's pixel format, so the display has to be set up first. Access an image with getImage('__') instead of IMAGES['__']
+'''
+def getImage(name):
+
+    if name not in IMAGES:
+
+        size = (BOARD_WIDTH, BOARD_HEIGHT) if name in BOARD_STYLES else (SQ_SIZE, SQ_SIZE)
+        IMAGES[name] = loadImage(name, size).convert_alpha()
+
+    return IMAGES[name]
+
+'''
+Returns images/name.png scaled to size. Decoding and scaling a png is slow, so the scaled image is written to IMAGE_CACHE_DIR as raw pixels
+the first time and read back from there afterwards. The cache file is keyed by the png's modification time and the size, and is written
+again if either changed
+'''
+def loadImage(name, size):
+
+    source = os.path.join(IMAGE_DIR, name + '.png')
+    path = os.path.join(IMAGE_CACHE_DIR, '%s_%dx%d.raw' % (name, size[0], size[1]))
+    modified = os.stat(source).st_mtime_ns
+    try:
+
+        with open(path, 'rb') as file:
+
+            data = file.read()
+
+        header, version, cachedModified, width, height = struct.unpack_from(IMAGE_CACHE_FORMAT, data)
+        if header == IMAGE_CACHE_HEADER and version == IMAGE_CACHE_VERSION and cachedModified == modified and (width, height) == size and \
+           len(data) == struct.calcsize(IMAGE_CACHE_FORMAT) + width * height * 4:
+
+            return pg.image.frombuffer(memoryview(data)[struct.calcsize(IMAGE_CACHE_FORMAT):], size, 'RGBA')
+
+    except (OSError, struct.error): #no cache file yet, or a broken one
+
+        pass
+
+    image = pg.transform.scale(pg.image.load(source), size)
+    saveImage(path, image, modified)
+    return image
 
 '''
-Initialize a global dictionary of images. Only called once, since it will be expensive to call multiple times
+Writes a scaled image to its cache file. Written to a temporary file first so a half written file is never read
 '''
-def loadImages():
+def saveImage(path, image, modified):
+
+    tempPath = path + '.' + str(os.getpid()) + '.tmp'
+    try:
+
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok = True)
+        with open(tempPath, 'wb') as file:
+
+            file.write(struct.pack(IMAGE_CACHE_FORMAT, IMAGE_CACHE_HEADER, IMAGE_CACHE_VERSION, modified, image.get_width(), image.get_height()))
+            file.write(pg.image.tostring(image, 'RGBA'))
 
-    pieces = ['tournamentwP', 'tournamentwR', 'tournamentwN', 'tournamentwB', 'tournamentwQ', 'tournamentwK', 
-    'tournamentbP', 'tournamentbR', 'tournamentbN', 'tournamentbB', 'tournamentbQ', 'tournamentbK',
-    'classicwP', 'classicwR', 'classicwN', 'classicwB', 'classicwQ', 'classicwK', 'classicbP', 'classicbR', 'classicbN', 'classicbB', 'classicbQ', 'classicbK',
-    'neowP', 'neowR', 'neowN', 'neowB', 'neowQ', 'neowK', 'neobP', 'neobR', 'neobN', 'neobB', 'neobQ', 'neobK',
-    'woodwP', 'woodwR', 'woodwN', 'woodwB', 'woodwQ', 'woodwK', 'woodbP', 'woodbR', 'woodbN', 'woodbB', 'woodbQ', 'woodbK',
-    'glasswP', 'glasswR', 'glasswN', 'glasswB', 'glasswQ', 'glasswK', 'glassbP', 'glassbR', 'glassbN', 'glassbB', 'glassbQ', 'glassbK']
-    backgrounds = ['green', 'walnut', 'tournament', 'sand', 'icysea']
-    #now we can access an image at any board with 'IMAGES['__']'
-    for piece in pieces:
+        os.replace(tempPath, path)
 
-        IMAGES[piece] = pg.transform.scale(pg.image.load('images/' + piece + '.png'), (SQ_SIZE, SQ_SIZE))
+    except OSError: #read-only install, the image is still usable from memory
 
-    for background in backgrounds:
+        if os.path.exists(tempPath):
 
-        IMAGES[background] = pg.transform.scale(pg.image.load('images/' + background + '.png'), (BOARD_WIDTH, BOARD_HEIGHT))
+            os.remove(tempPath)
 
 '''
 Main driver to handle user input and updating the graphics.
@@ -55,8 +110,7 @@ def main():
     screen = pg.display.set_mode((BOARD_WIDTH + MOVELOG_WIDTH, BOARD_HEIGHT))
     clock = pg.time.Clock()
     screen.fill(WHITE)
-    screen.blit(BG, (0, 0))
-    gameState = ChessEngine.GameState()
+    gameState = GAME_STATE()
     validMoves = gameState.getValidMoves() #expensive operation to call every time, store possible valid moves to reduce repetition
     moveMade = False #flag variable -- only update validMoves list if user makes a move in the validMoves list
     animate = False
@@ -64,9 +118,9 @@ def main():
     gameStart, gameOver = False, False
     whitePlayer, blackPlayer = True, True #flag variable -- if true, then human plays for that color, if false, then AI plays for that color
     AIThinking = False
-    moveFinderProcess = None
+    engine = ChessWorker.EngineWorker(SHOW_SEARCH_STATS) #searches in its own process for the whole session, so its tables carry over between moves
+    ponderMoveID, startPonder = None, False #reply the AI expects to its last move, and if pondering should start once valid moves are updated
     moveUndone = False
-    fiftyMoveRuleCounter = 0
     firstPage = True
     choosingWhitePlayer, choosingBlackPlayer = True, True
     choosingPlayers, choosingBoardStyle, choosingPieceStyle = True, True, True
@@ -75,7 +129,7 @@ def main():
     flipped = False
     rotate = False
 
-    loadImages() #only do this once, before the while loop
+    renderer = BoardRenderer(screen)
 
     open = True
     sqClicked = () #keeps track of last click from user, (row, col)
@@ -87,7 +141,7 @@ def main():
     chooseBlackScreen(screen, DARKGRAY, DARKGRAY, BLACK, SMALLFONT)
     chooseBoardStyle(screen, DARKGRAY, DARKGRAY, DARKGRAY, DARKGRAY, BLACK, SMALLFONT)
     choosePieceStyle(screen, DARKGRAY, DARKGRAY, DARKGRAY, DARKGRAY, BLACK, SMALLFONT)  
-    background = IMAGES['tournament'] #default board background
+    boardStyle = 'tournament' #default board background
     backgroundColor = (164, 194, 91) #default board background color
     pieceStyle = 'tournament' #default piece style
 
@@ -97,6 +151,14 @@ def main():
 
         for event in pg.event.get():
 
+            if event.type in (pg.MOUSEBUTTONDOWN, pg.KEYDOWN): #the handlers draw the settings and move log straight onto the screen
+
+                renderer.markDirty(MOVELOG_RECT)
+
+            elif event.type == pg.VIDEOEXPOSE: #the window was uncovered
+
+                renderer.markDirty(screen.get_rect())
+
             #program ends if user X's out of window
             if event.type == pg.QUIT:
 
@@ -164,28 +226,28 @@ def main():
                             elif topLeft2.collidepoint(coord):
 
                                 choosingBoardStyle = False
-                                background = IMAGES['green']
+                                boardStyle = 'green'
                                 backgroundColor = (255, 255, 0)
                                 chooseBoardStyle(screen, GREEN, DARKGRAY, DARKGRAY, DARKGRAY, BLACK, SMALLFONT)
 
                             elif topRight2.collidepoint(coord):
 
                                 choosingBoardStyle = False
-                                background = IMAGES['icysea']
+                                boardStyle = 'icysea'
                                 backgroundColor = (94, 215, 241)
                                 chooseBoardStyle(screen, DARKGRAY, DARKGRAY, GREEN, DARKGRAY, BLACK, SMALLFONT)
 
                             elif botLeft2.collidepoint(coord):
 
                                 choosingBoardStyle = False
-                                background = IMAGES['walnut']
+                                boardStyle = 'walnut'
                                 backgroundColor = (209, 165, 45)
                                 chooseBoardStyle(screen, DARKGRAY, GREEN, DARKGRAY, DARKGRAY, BLACK, SMALLFONT)
 
                             elif botRight2.collidepoint(coord):
                                 
                                 choosingBoardStyle = False
-                                background = IMAGES['sand']
+                                boardStyle = 'sand'
                                 backgroundColor = (226, 188, 135)
                                 chooseBoardStyle(screen, DARKGRAY, DARKGRAY, DARKGRAY, GREEN, BLACK, SMALLFONT)
 
@@ -311,12 +373,16 @@ def main():
                     animate = False
                     gameOver = False
 
-                    if AIThinking: #if ai is still calculating move, then terminate it 
+                    if AIThinking: #if ai is still calculating move, then stop it 
 
-                        moveFinderProcess.terminate()
+                        engine.stop()
                         AIThinking = False
                         moveUndone = True
 
+                    elif engine.ponderMoves is not None: #the position being pondered is gone, don't let the search run on until the AI's turn
+
+                        engine.ponderHit([]) #never a hit, stops the ponder search
+
                 if event.key == pg.K_f: #flips the board
 
                     flipped = True if not flipped else False
@@ -355,7 +421,7 @@ def main():
                         blackScore += 0.5
                     
                     #reset all variables, new game started
-                    gameState = ChessEngine.GameState()
+                    gameState = GAME_STATE()
                     humanTurn = (gameState.whiteToMove and whitePlayer) or (not gameState.whiteToMove and blackPlayer)
                     validMoves = gameState.getValidMoves()
                     animate = False
@@ -367,10 +433,12 @@ def main():
                     gameState.getBoardMaterial()
                     if AIThinking:
 
-                        moveFinderProcess.terminate()
+                        engine.stop()
                         AIThinking = False
-                    
-                    fiftyMoveRuleCounter = 0
+
+                    elif engine.ponderMoves is not None:
+
+                        engine.ponderHit([]) #never a hit, stops the ponder search
 
                     screen.fill(WHITE, (BOARD_WIDTH, 20, BOARD_WIDTH + MOVELOG_WIDTH, BOARD_HEIGHT))
 
@@ -403,21 +471,19 @@ def main():
             if not AIThinking:
 
                 AIThinking = True
-                returnQueue = Queue() #used to pass data between threads
-                moveFinderProcess = Process(target = ChessAI.findBestNegaMaxAlphaBetaMove, args = (gameState, validMoves, returnQueue))
-                moveFinderProcess.start()
-
-            if not moveFinderProcess.is_alive():
-
-                move = returnQueue.get()
-                if move is None:
+                moveIDs = [move.moveID for move in gameState.moveLog]
+                if not engine.ponderHit(moveIDs): #unless the engine has already been searching this position while the human thought
+                    #only the moves played are sent to the engine, it already has the earlier position
+                    engine.setPosition(moveIDs)
+                    engine.go(workers = AI_WORKERS)
 
-                    print('Could not find optimal move.')
-                    move = ChessAI.findBestMove(gameState, validMoves)
+            result = engine.poll()
+            if result is not None:
 
+                move = next(move for move in validMoves if move.moveID == result[0])
                 gameState.makeMove(move)
-                highlightSquares(screen, gameState, validMoves, sqClicked, backgroundColor, flipped)
                 displayMoveLog(screen, gameState, move) 
+                renderer.markDirty(MOVELOG_RECT)
 
                 if math.ceil(len(gameState.moveLog) / 2) >= 37 and firstPage and gameState.whiteToMove:
 
@@ -436,31 +502,34 @@ def main():
                 moveMade = True
                 animate = True
                 AIThinking = False
+                ponderMoveID, startPonder = result[3], PONDER
 
         #if valid move was made, then we update the list of valid moves and reset flag variable
         if moveMade:
 
             if animate:
 
-                animateMove(screen, gameState, clock, gameState.moveLog[-1], validMoves, sqClicked, background, backgroundColor, pieceStyle, flipped)
+                renderer.animateMove(clock, gameState, gameState.moveLog[-1], validMoves, sqClicked, boardStyle, backgroundColor, pieceStyle, flipped)
 
             validMoves = gameState.getValidMoves()
             moveMade = False
             moveUndone = False
-            #Reset counter if piece was captured or pawn moved, else increment
-            if move.pieceCaptured != '--' or move.pieceMoved[1] == 'P':
+            if gameState.halfmoveClock >= 100: #If 50 moves (100 plies) without piece captured or pawn moving, then stalemate
 
-                fiftyMoveRuleCounter = 0
+                gameState.stalemate = True
 
-            else:
+            humanReplies = (gameState.whiteToMove and whitePlayer) or (not gameState.whiteToMove and blackPlayer)
+            if startPonder and humanReplies and validMoves and not gameState.stalemate: #the AI just moved, think on the human's time
 
-                fiftyMoveRuleCounter += 1
+                if all(validMove.moveID != ponderMoveID for validMove in validMoves):
 
-            if fiftyMoveRuleCounter >= 50: #If 50 moves without piece captured or pawn moving, then stalemate
+                    ponderMoveID = None
 
-                gameState.stalemate = True
+                engine.ponder([validMove.moveID for validMove in gameState.moveLog], ponderMoveID, workers = AI_WORKERS)
+
+            startPonder = False
 
-        createBoard(screen, gameState, validMoves, sqClicked, background, backgroundColor, pieceStyle, flipped)
+        renderer.draw(gameState, validMoves, sqClicked, boardStyle, backgroundColor, pieceStyle, flipped)
         if rotate: #human vs human, player made move, flip the board
 
             flipped = not flipped
@@ -468,142 +537,198 @@ def main():
 
         while reset: #display new game text as long as reset is true
 
-            newGame(screen)
+            renderer.markDirty(newGame(screen)) #the text is drawn over the board, the squares under it are redrawn next frame
             break
 
         if gameState.checkmate or gameState.stalemate:
 
             gameOver = True
-            gameCompleted(screen, gameState)
-            newGame(screen)
+            renderer.markDirty(gameCompleted(screen, gameState))
+            renderer.markDirty(newGame(screen))
             reset = True
             gameState.getBoardMaterial()
 
         clock.tick(MAX_FPS)
-        pg.display.flip()
+        renderer.update()
+
+    engine.quit()
 
 '''
-Highlight the square where piece is currently at and squares where piece can move to for the piece selected. Also highlights previous move.
+Draws the board part of the screen in layers: the board style's background, the highlights and the pieces, each converted once to the
+display's pixel format. It keeps what every square showed in the last frame and only redraws the squares that changed, and update sends
+just those squares (and any other area marked dirty) to the display, so a frame where nothing changed draws nothing.
+Note: the backgrounds are the same board turned around, so one board layer per style serves both orientations.
 '''
-def highlightSquares(screen, gameState, validMoves, sqSelected, backgroundColor, flipped):
+class BoardRenderer():
 
-    surface = pg.Surface((SQ_SIZE, SQ_SIZE))
-    surface.set_alpha(150)
-    surface.fill(backgroundColor)
-    flipValue = 7 if flipped else 0 #flipValue is so we can mirror the (row,col) if board is flipped
+    def __init__(self, screen):
 
-    if sqSelected != ():
+        self.screen = screen
+        self.boardLayer = (None, None) #(board style, background in the display's pixel format), only the style in use is kept
+        self.highlight = None #see-through square in the board style's highlight color
+        self.style = None #(board style, highlight color, piece style) the squares were drawn with
+        self.squares = [None] * (DIMENSION * DIMENSION) #what every square of the screen showed in the last frame, None to redraw it
+        self.dirtyRects = [screen.get_rect()] #areas to send to the display at the next update, the first frame sends everything
 
-        row, col = sqSelected
-        if gameState.board[row][col][0] == ('w' if gameState.whiteToMove else 'b'): #if piece selected is a piece that can be moved
+    def getBoardLayer(self, boardStyle):
 
-            screen.blit(surface, (abs(flipValue - col) * SQ_SIZE, abs(flipValue - row) * SQ_SIZE)) #highlight current square clicked
+        if self.boardLayer[0] != boardStyle: #some backgrounds have see-through edges, they are drawn over the window's white once
 
-            for move in validMoves: #show the possible moves for that piece, small gray circle for empty space and large gray circle for capturable piece
+            layer = pg.Surface((BOARD_WIDTH, BOARD_HEIGHT)).convert()
+            layer.fill(WHITE)
+            layer.blit(loadImage(boardStyle, (BOARD_WIDTH, BOARD_HEIGHT)), (0, 0))
+            self.boardLayer = (boardStyle, layer)
 
-                if move.startSq[0] == row and move.startSq[1] == col:
+        return self.boardLayer[1]
 
-                    if gameState.board[move.endSq[0]][move.endSq[1]] == '--':
+    '''
+    Returns what every square of the screen should show, from the top left: (piece, selected, move marker, part of the previous move). The
+    marker is 1 for a move to an empty square, 2 for a capture. While move is being animated its end square shows the piece it took
+    '''
+    def getSquares(self, gameState, validMoves, sqSelected, flipped, move = None):
 
-                        pg.draw.circle(screen, DARKGRAY, ((SQ_SIZE // 2) + SQ_SIZE * abs(flipValue - move.endSq[1]), 
-                                        (SQ_SIZE // 2) + SQ_SIZE * abs(flipValue - move.endSq[0])), SQ_SIZE//5, 0)
+        board = gameState.board
+        pieces = [piece for row in board for piece in row]
+        if move is not None:
 
-                    else:
+            pieces[move.endSq[0] * DIMENSION + move.endSq[1]] = '--' if move.isEnpassantMove else move.pieceCaptured
 
-                        pg.draw.circle(screen, DARKGRAY, ((SQ_SIZE // 2) + SQ_SIZE * abs(flipValue - move.endSq[1]), 
-                                        (SQ_SIZE // 2) + SQ_SIZE * abs(flipValue - move.endSq[0])), SQ_SIZE//2, 6)   
+        selected, markers, previousMove = -1, {}, ()
+        if sqSelected != () and board[sqSelected[0]][sqSelected[1]][0] == ('w' if gameState.whiteToMove else 'b'): #a piece that can be moved
 
-    if len(gameState.moveLog) > 0: #if at least 1 move in move log, then highlight the squares of previous move
+            selected = sqSelected[0] * DIMENSION + sqSelected[1]
+            for validMove in validMoves:
 
-        screen.blit(surface, (abs(flipValue - gameState.moveLog[-1].endSq[1]) * SQ_SIZE, abs(flipValue - gameState.moveLog[-1].endSq[0]) * SQ_SIZE))
-        screen.blit(surface, (abs(flipValue - gameState.moveLog[-1].startSq[1]) * SQ_SIZE, abs(flipValue - gameState.moveLog[-1].startSq[0]) * SQ_SIZE))
+                if validMove.startSq == sqSelected:
 
-'''
-Draw the squares on the board, as well as the pieces using the current gameState board.
-Note: The top left square is ALWAYS light regardless if black/white side. 
-'''
-def createBoard(screen, gameState, validMoves, sqClicked, background, backgroundColor, pieceStyle, flipped):
-    screen.blit(background, (0, 0))
-    surface = pg.Surface((BOARD_WIDTH, BOARD_HEIGHT))
-    surface.set_alpha(0)
-    for row in range(0, DIMENSION):
+                    markers[validMove.endSq[0] * DIMENSION + validMove.endSq[1]] = 1 if board[validMove.endSq[0]][validMove.endSq[1]] == '--' else 2
 
-        for col in range(0, DIMENSION):
+        if len(gameState.moveLog) > 0:
 
-            if ((row + col) % 2 == 0):
+            lastMove = gameState.moveLog[-1]
+            previousMove = (lastMove.startSq[0] * DIMENSION + lastMove.startSq[1], lastMove.endSq[0] * DIMENSION + lastMove.endSq[1])
 
-                screen.blit(surface, (SQ_SIZE * col, SQ_SIZE * row))
+        squares = [(pieces[index], index == selected, markers.get(index, 0), index in previousMove) for index in range(DIMENSION * DIMENSION)]
+        return squares[::-1] if flipped else squares #a flipped board shows square 63 - index at index
 
-            else:
+    '''
+    Redraws one square of the screen: background, selected highlight, move marker, previous move highlight, piece
+    '''
+    def drawSquare(self, index, square, boardStyle, pieceStyle):
 
-                screen.blit(surface, (SQ_SIZE * col, SQ_SIZE * row))
+        piece, selected, marker, previousMove = square
+        rect = pg.Rect(index % DIMENSION * SQ_SIZE, index // DIMENSION * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        self.screen.set_clip(rect) #the capture ring touches the edge of the square
+        self.screen.blit(self.getBoardLayer(boardStyle), rect, rect)
+        if selected:
 
-    highlightSquares(screen, gameState, validMoves, sqClicked, backgroundColor, flipped)
+            self.screen.blit(self.highlight, rect)
 
-    for row in range(0, DIMENSION):
+        if marker == 1:
 
-        for col in range(0, DIMENSION):
+            pg.draw.circle(self.screen, DARKGRAY, rect.center, SQ_SIZE // 5, 0)
 
-            if not flipped:
-                
-                if gameState.board[row][col] != '--': #if curr board not empty, draw the piece
+        elif marker == 2:
 
-                    screen.blit(IMAGES[pieceStyle + gameState.board[row][col]], (SQ_SIZE * col, SQ_SIZE * row))    
+            pg.draw.circle(self.screen, DARKGRAY, rect.center, SQ_SIZE // 2, 6)
 
-            else:
+        if previousMove:
 
-                if np.flip(gameState.board)[row][col] != '--':
+            self.screen.blit(self.highlight, rect)
 
-                    screen.blit(IMAGES[pieceStyle + np.flip(gameState.board)[row][col]], (SQ_SIZE * col, SQ_SIZE * row)) 
-'''
-Animates the valid move made
-'''
-def animateMove(screen, gameState, clock, move, validMoves, sqClicked, background, backgroundColor, pieceStyle, flipped):
+        if piece != '--':
+
+            self.screen.blit(getImage(pieceStyle + piece), rect)
+
+        self.screen.set_clip(None)
+        self.dirtyRects.append(rect)
 
-    flipValue = 7 if flipped else 0
+    '''
+    Draws the board and pieces of the game state, redrawing only the squares that changed since the last frame. move is the move being
+    animated, if any
+    '''
+    def draw(self, gameState, validMoves, sqSelected, boardStyle, backgroundColor, pieceStyle, flipped, move = None):
 
-    dRow, dCol = abs(flipValue - move.endSq[0]) - abs(flipValue - move.startSq[0]), abs(flipValue - move.endSq[1]) - abs(flipValue - move.startSq[1])
-    frameCount = (abs(dRow) + abs(dCol)) #total amount of frames to move from start to end square
+        if self.style != (boardStyle, tuple(backgroundColor), pieceStyle): #new style, every square changes
 
-    for frame in range(0, frameCount + 1):
+            self.style = (boardStyle, tuple(backgroundColor), pieceStyle)
+            self.highlight = pg.Surface((SQ_SIZE, SQ_SIZE))
+            self.highlight.set_alpha(150)
+            self.highlight.fill(backgroundColor)
+            self.squares = [None] * (DIMENSION * DIMENSION)
 
-        row, col = abs(flipValue - move.startSq[0]) + dRow * frame / frameCount, abs(flipValue - move.startSq[1]) + dCol * frame / frameCount
-        createBoard(screen, gameState, validMoves, sqClicked, background, backgroundColor, pieceStyle, flipped)
-        #erase the piece moved from the ending square
-        endSquare = pg.Rect(abs(flipValue - move.endSq[1]) * SQ_SIZE, abs(flipValue - move.endSq[0]) * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-        pg.draw.rect(screen, backgroundColor, endSquare)
-        #blit captured piece onto the screen
-        if move.pieceCaptured != '--':
+        for index, square in enumerate(self.getSquares(gameState, validMoves, sqSelected, flipped, move)):
+
+            if square != self.squares[index]:
+
+                self.drawSquare(index, square, boardStyle, pieceStyle)
+                self.squares[index] = square
+
+    '''
+    Marks an area of the screen that was drawn on outside the renderer: it is sent to the display at the next update, and the squares under
+    it are redrawn in the next frame
+    '''
+    def markDirty(self, rect):
+
+        rect = pg.Rect(rect)
+        self.dirtyRects.append(rect)
+        for index in range(DIMENSION * DIMENSION):
+
+            if rect.colliderect((index % DIMENSION * SQ_SIZE, index // DIMENSION * SQ_SIZE, SQ_SIZE, SQ_SIZE)):
+
+                self.squares[index] = None
+
+    '''
+    Sends the areas that changed since the last update to the display
+    '''
+    def update(self):
+
+        pg.display.update(self.dirtyRects)
+        self.dirtyRects = []
+
+    '''
+    Animates the valid move made. Every frame only the squares the piece just left and the piece itself are redrawn
+    '''
+    def animateMove(self, clock, gameState, move, validMoves, sqSelected, boardStyle, backgroundColor, pieceStyle, flipped):
+
+        flipValue = 7 if flipped else 0
+        dRow, dCol = abs(flipValue - move.endSq[0]) - abs(flipValue - move.startSq[0]), abs(flipValue - move.endSq[1]) - abs(flipValue - move.startSq[1])
+        frameCount = (abs(dRow) + abs(dCol)) #total amount of frames to move from start to end square
+        image = getImage(pieceStyle + move.pieceMoved)
+
+        for frame in range(0, frameCount + 1):
+
+            row, col = abs(flipValue - move.startSq[0]) + dRow * frame / frameCount, abs(flipValue - move.startSq[1]) + dCol * frame / frameCount
+            self.draw(gameState, validMoves, sqSelected, boardStyle, backgroundColor, pieceStyle, flipped, move)
+            #draw moving piece, the squares under it are redrawn in the next frame
+            pieceRect = pg.Rect(int(col * SQ_SIZE), int(row * SQ_SIZE), SQ_SIZE, SQ_SIZE)
+            self.screen.blit(image, pieceRect)
+            self.markDirty(pieceRect)
+            self.update()
+            clock.tick(60)
 
-            screen.blit(IMAGES[pieceStyle + move.pieceCaptured], endSquare)
-        #draw moving piece
-        screen.blit(IMAGES[pieceStyle + move.pieceMoved], pg.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        pg.display.flip()
-        clock.tick(60)
 '''
-Displays text on screen
+Displays text on screen, returns the area drawn on
 '''
 def newGame(screen):
 
-    font = pg.font.SysFont('Helvitca', 40, True, False)
-    text = font.render('Start a new game? Press y/n', True, pg.Color('black'))
-    screen.blit(text, text.get_rect(center = (BOARD_WIDTH / 2, BOARD_HEIGHT / 2)))
+    text = LARGEFONT.render('Start a new game? Press y/n', True, pg.Color('black'))
+    return screen.blit(text, text.get_rect(center = (BOARD_WIDTH / 2, BOARD_HEIGHT / 2)))
 
 '''
-Displays text on screen based on if checkmate or stalemate. 
+Displays text on screen based on if checkmate or stalemate, returns the area drawn on
 '''
 def gameCompleted(screen, gameState):
 
-    font = pg.font.SysFont('Helvitca', 40, True, False)
-    checkmateText = font.render('Checkmate. White wins.' if not gameState.whiteToMove else 'Checkmate. Black wins.', True, BLACK)
-    stalemateText = font.render('Stalemate. The game is a draw.', True, BLACK)
     if gameState.checkmate:
 
-        screen.blit(checkmateText, checkmateText.get_rect(center  = (BOARD_WIDTH / 2, (BOARD_HEIGHT / 2) - 50)))
+        text = LARGEFONT.render('Checkmate. White wins.' if not gameState.whiteToMove else 'Checkmate. Black wins.', True, BLACK)
+
+    else:
 
-    elif gameState.stalemate:
+        text = LARGEFONT.render('Stalemate. The game is a draw.', True, BLACK)
 
-        screen.blit(stalemateText, stalemateText.get_rect(center  = (BOARD_WIDTH / 2, (BOARD_HEIGHT / 2) - 50)))
+    return screen.blit(text, text.get_rect(center  = (BOARD_WIDTH / 2, (BOARD_HEIGHT / 2) - 50)))
 
 '''
 Displays the move's chess notation for white / black on right side of the screen
@@ -0,0 +1,325 @@
+'''
+PGN import and export with standard algebraic notation (SAN). readGames streams a PGN file one game at a time, so memory use doesn't grow with
+the size of the file, and replayGame plays a game's moves on a GameState. gameToPGN and writeGame write a game from a GameState's moveLog,
+with full SAN: disambiguation, captures, promotions, castling and check and mate marks.
+GameState always promotes to a queen, so games with an under-promotion can only be replayed up to it.
+Usage:
+    python ChessPGN.py games.pgn                            replays every game and reports the ones that can't be played
+    python ChessPGN.py games.pgn --output clean.pgn         also writes the replayed games back out with normalized SAN and tags
+'''
+import argparse
+import re
+import ChessBitboard
+import ChessFEN
+
+SEVEN_TAG_ROSTER = ['Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result'] #always written, in this order, before any other tags
+TAG_DEFAULTS = {'Event': '?', 'Site': '?', 'Date': '????.??.??', 'Round': '?', 'White': '?', 'Black': '?', 'Result': '*'}
+LINE_LENGTH = 79 #movetext is wrapped at this many characters, as the PGN standard recommends
+TAG_PAIR = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+GAME_END = re.compile(r'(?:^|\s)(?:1-0|0-1|1/2-1/2|\*)$') #the result at the end of the movetext
+SAN_MOVE = re.compile(r'([KQRBNP]?)([a-h]?)([1-8]?)x?([a-h][1-8])(?:=?([QRBN]))?')
+
+'''
+Returns the SAN of a valid move in the current position of the game state (e.g. Nbd2, exd5, O-O, e8=Q+). validMoves are the valid moves of
+the position, generated if not given
+'''
+def getSAN(gameState, move, validMoves = None):
+
+    if move.isCastleMove:
+
+        san = 'O-O' if move.endSq[1] == 6 else 'O-O-O'
+
+    else:
+
+        validMoves = gameState.getValidMoves() if validMoves is None else validMoves
+        piece, target = move.pieceMoved[1], move.getRankFile(move.endSq[0], move.endSq[1])
+        start = move.getRankFile(move.startSq[0], move.startSq[1])
+        capture = 'x' if move.pieceCaptured != '--' else ''
+        if piece == 'P':
+
+            san = (start[0] + capture if capture else '') + target + ('=Q' if move.isPawnPromotion else '')
+
+        else: #the file of the piece if it tells it apart from the others that can move to the same square, otherwise its rank, otherwise both
+
+            others = [other for other in validMoves if other.pieceMoved == move.pieceMoved and other.endSq == move.endSq and other.startSq != move.startSq]
+            if not others:
+
+                disambiguation = ''
+
+            elif all(other.startSq[1] != move.startSq[1] for other in others):
+
+                disambiguation = start[0]
+
+            elif all(other.startSq[0] != move.startSq[0] for other in others):
+
+                disambiguation = start[1]
+
+            else:
+
+                disambiguation = start
+
+            san = piece + disambiguation + capture + target
+
+    return san + getCheckMark(gameState, move)
+
+'''
+Returns '#' if the move mates, '+' if it checks, '' otherwise. The game state's checkmate and stalemate flags are left as they were
+'''
+def getCheckMark(gameState, move):
+
+    checkmate, stalemate = gameState.checkmate, gameState.stalemate
+    gameState.makeMove(move)
+    mark = ('#' if not gameState.getValidMoves() else '+') if gameState.inCheck() else ''
+    gameState.undoMove()
+    gameState.checkmate, gameState.stalemate = checkmate, stalemate
+    return mark
+
+'''
+Returns the valid move matching a move in SAN, or None if there is no unique match. Check marks, annotations (!, ?) and 0-0 style castling
+are accepted. Under-promotions return None, since GameState always promotes to a queen
+'''
+def moveFromSAN(san, validMoves):
+
+    san = san.rstrip('+#!?').replace('0', 'O')
+    if san.endswith('e.p.'):
+
+        san = san[:-4]
+
+    if san in ('O-O', 'O-O-O'):
+
+        return next((move for move in validMoves if move.isCastleMove and (move.endSq[1] == 6) == (san == 'O-O')), None)
+
+    match = SAN_MOVE.fullmatch(san)
+    if match is None or (match.group(5) or 'Q') != 'Q':
+
+        return None
+
+    piece, fromFile, fromRank, target = match.group(1) or 'P', match.group(2), match.group(3), match.group(4)
+    candidates = [move for move in validMoves if move.pieceMoved[1] == piece and move.getRankFile(move.endSq[0], move.endSq[1]) == target and
+                  (not fromFile or move.getRankFile(move.startSq[0], move.startSq[1])[0] == fromFile) and
+                  (not fromRank or move.getRankFile(move.startSq[0], move.startSq[1])[1] == fromRank)]
+    return candidates[0] if len(candidates) == 1 else None
+
+'''
+Returns the SAN moves of the main line of a game's movetext. Comments, variations, NAGs, move numbers and the result are skipped
+'''
+def parseMovetext(movetext):
+
+    movetext = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', movetext) #comments
+    while '(' in movetext: #variations, innermost first since they can be nested
+
+        movetext, count = re.subn(r'\([^()]*\)', ' ', movetext)
+        if count == 0:
+
+            break
+
+    movetext = re.sub(r'\d+\.+', ' ', movetext) #move numbers, also when written without a space before the move (1.e4)
+    return [token for token in movetext.split() if not re.fullmatch(r'\$\d+|1-0|0-1|1/2-1/2|\*', token)]
+
+'''
+Yields (tags, SAN moves) for every game of a PGN file, reading one line at a time, so only the game being read is ever held in memory. tags
+is a dict of the tag pairs, with Result taken from the end of the movetext if the game has no Result tag. A game ends at its result, or at
+the tags of the next game if the result is missing
+'''
+def readGames(path):
+
+    tags, movetext, openComments = {}, [], 0
+    with open(path, encoding = 'utf-8', errors = 'replace') as file:
+
+        for line in file:
+
+            line = line.strip()
+            if line.startswith('[') and not openComments: #tag pair, a new game starts with the tags after some movetext
+
+                if movetext:
+
+                    yield finishGame(tags, movetext)
+                    tags, movetext = {}, []
+
+                tag = TAG_PAIR.match(line)
+                if tag is not None:
+
+                    tags[tag.group(1)] = re.sub(r'\\(.)', r'\1', tag.group(2))
+
+            elif line and not line.startswith('%'):
+
+                movetext.append(line)
+                openComments += line.count('{') - line.count('}') #{ } comments can span lines but not nest
+                if openComments <= 0 and GAME_END.search(re.sub(r';.*', '', line)):
+
+                    yield finishGame(tags, movetext)
+                    tags, movetext, openComments = {}, [], 0
+
+    if movetext or tags:
+
+        yield finishGame(tags, movetext)
+
+'''
+Returns (tags, SAN moves) of a game read by readGames
+'''
+def finishGame(tags, movetext):
+
+    movetext = '\n'.join(movetext) #kept on separate lines so a ; comment only runs to the end of its line
+    if 'Result' not in tags:
+
+        ending = re.search(r'(1-0|0-1|1/2-1/2|\*)\s*$', movetext)
+        tags['Result'] = ending.group(1) if ending is not None else '*'
+
+    return tags, parseMovetext(movetext)
+
+'''
+Returns a game state in the starting position of a game: the FEN tag's position if it has one, the normal starting position otherwise
+'''
+def startingPosition(tags, gameStateClass = None):
+
+    gameStateClass = ChessBitboard.GameState if gameStateClass is None else gameStateClass
+    return ChessFEN.loadFEN(gameStateClass(), tags['FEN']) if 'FEN' in tags else gameStateClass()
+
+'''
+Plays the SAN moves of a game from its starting position and returns the game state after the last one. Raises ValueError, naming the
+move, if a move can't be played (illegal, ambiguous or an under-promotion) or the FEN tag is invalid
+'''
+def replayGame(tags, sanMoves, gameStateClass = None):
+
+    gameState = startingPosition(tags, gameStateClass)
+    for san in sanMoves:
+
+        move = moveFromSAN(san, gameState.getValidMoves())
+        if move is None:
+
+            raise ValueError('Move %d%s %s can\'t be played' % (gameState.fullmoveNumber, '.' if gameState.whiteToMove else '...', san))
+
+        gameState.makeMove(move)
+
+    gameState.getBoardMaterial()
+    gameState.getValidMoves() #sets checkmate and stalemate for the final position
+    return gameState
+
+'''
+Returns the SAN of every move in the game state's moveLog, and the FEN of the position before the first one. The moves are taken back and
+played again to get there, the game state ends up as it was
+'''
+def getMovetext(gameState):
+
+    moves = list(gameState.moveLog)
+    checkmate, stalemate = gameState.checkmate, gameState.stalemate
+    while gameState.moveLog:
+
+        gameState.undoMove()
+
+    startFEN, sanMoves = ChessFEN.getFEN(gameState), []
+    for move in moves:
+
+        sanMoves.append(getSAN(gameState, move))
+        gameState.makeMove(move)
+
+    gameState.checkmate, gameState.stalemate = checkmate, stalemate
+    return startFEN, sanMoves
+
+'''
+Returns the result of the game state's final position: '1-0' or '0-1' for checkmate, '1/2-1/2' for stalemate, '*' if the game isn't over
+'''
+def getResult(gameState):
+
+    checkmate, stalemate = gameState.checkmate, gameState.stalemate
+    gameState.getValidMoves()
+    result = ('0-1' if gameState.whiteToMove else '1-0') if gameState.checkmate else '1/2-1/2' if gameState.stalemate else '*'
+    gameState.checkmate, gameState.stalemate = checkmate, stalemate
+    return result
+
+'''
+Returns the PGN of the game in the game state's moveLog. tags are added to the seven tag roster (missing ones get their unknown value), a
+game that didn't start from the normal starting position gets SetUp and FEN tags, and the Result tag is worked out from the final position
+if it isn't given
+'''
+def gameToPGN(gameState, tags = None):
+
+    tags = dict(tags or {})
+    startFEN, sanMoves = getMovetext(gameState)
+    tags.setdefault('Result', getResult(gameState))
+    if startFEN != ChessFEN.START_FEN:
+
+        tags['SetUp'], tags['FEN'] = '1', startFEN
+
+    lines = ['[%s "%s"]' % (name, str(tags.get(name, TAG_DEFAULTS.get(name, '?'))).replace('\\', '\\\\').replace('"', '\\"'))
+             for name in SEVEN_TAG_ROSTER + [name for name in tags if name not in SEVEN_TAG_ROSTER]]
+    lines.append('')
+    fields = startFEN.split()
+    moveNumber, whiteToMove = int(fields[5]), fields[1] == 'w'
+    tokens = []
+    for index, san in enumerate(sanMoves):
+
+        if whiteToMove:
+
+            tokens.append('%d.' % moveNumber)
+
+        elif index == 0: #the game starts with a black move
+
+            tokens.append('%d...' % moveNumber)
+
+        tokens.append(san)
+        moveNumber += not whiteToMove
+        whiteToMove = not whiteToMove
+
+    tokens.append(tags['Result'])
+    line = ''
+    for token in tokens:
+
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+
+            lines.append(line)
+            line = token
+
+        else:
+
+            line = line + ' ' + token if line else token
+
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+'''
+Writes the game in the game state's moveLog to an open text file, see gameToPGN. Games written one after the other make a multi-game PGN file
+'''
+def writeGame(file, gameState, tags = None):
+
+    file.write(gameToPGN(gameState, tags))
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Replays every game of a PGN file, and optionally writes them back out.')
+    parser.add_argument('file')
+    parser.add_argument('--output', help = 'PGN file to write the replayed games to')
+    args = parser.parse_args()
+    output = open(args.output, 'w', encoding = 'utf-8') if args.output else None
+    games, errors = 0, 0
+    try:
+
+        for games, (tags, sanMoves) in enumerate(readGames(args.file), 1):
+
+            try:
+
+                gameState = replayGame(tags, sanMoves)
+
+            except ValueError as error:
+
+                print('Game %d (%s - %s): %s' % (games, tags.get('White', '?'), tags.get('Black', '?'), error))
+                errors += 1
+                continue
+
+            if output is not None:
+
+                writeGame(output, gameState, {name: value for name, value in tags.items() if name not in ('SetUp', 'FEN')})
+
+    finally:
+
+        if output is not None:
+
+            output.close()
+
+    print('Replayed %d of %d games' % (games - errors, games))
+    return 1 if errors else 0
+
+#this is convention to protect from accidentally running the program when we import another class
+if __name__ == '__main__':
+
+    raise SystemExit(main())
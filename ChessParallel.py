@@ -0,0 +1,214 @@
+'''
+Multi-core AI search by root splitting. Each iteration of the iterative deepening searches the previous best root move first to get a score
+to beat, then hands the other root moves out to a pool of worker processes, which only have to prove a move is worse than that score (or find
+its exact score if it is better). Every worker keeps its own transposition table between root moves, iterations and searches.
+With 1 worker, or a node budget, the normal single process search in ChessAI is used, which is deterministic.
+A search can be stopped from another process through a shared stop value: every search has an ID, and it stops once the stop value reaches it.
+Usage (time-to-depth benchmark):
+    python ChessParallel.py --depth 4 --workers 1 2 4
+'''
+import argparse
+import multiprocessing
+import os
+import pickle
+import time
+import ChessAI
+import ChessBitboard
+import ChessFEN
+
+WORKERS = os.cpu_count() or 1 #default number of worker processes for the parallel search
+
+pool, poolWorkers, poolStopValue = None, 0, None
+searchCount = 0
+lastSearchStats = {} #workers, depth, nodes, time and nodesPerSecond of the last parallel search, plus the time each depth was completed at
+#worker process state: the last position received and its valid moves, so each root move job doesn't have to unpickle it again
+workerPosition, workerGameState, workerMoves, workerSearchID = None, None, None, None
+workerStopValue = None
+
+'''
+Returns a pool with the given number of worker processes, reusing the existing one if it has the same size and stop value
+'''
+def getPool(workers, stopValue = None):
+
+    global pool, poolWorkers, poolStopValue
+    if pool is None or poolWorkers != workers or poolStopValue is not stopValue:
+
+        closePool()
+        pool, poolWorkers, poolStopValue = multiprocessing.Pool(workers, initWorker, (stopValue,)), workers, stopValue
+
+    return pool
+
+def closePool():
+
+    global pool, poolWorkers, poolStopValue
+    if pool is not None:
+
+        pool.terminate()
+        pool.join()
+        pool, poolWorkers, poolStopValue = None, 0, None
+
+'''
+Runs once in every worker process when the pool starts. The shared stop value can only be handed to the workers here, not with each job
+'''
+def initWorker(stopValue):
+
+    global workerStopValue
+    workerStopValue = stopValue
+
+'''
+Runs in a worker process: searches one root move to depth - 1 with the window (alpha, CHECKMATE). Returns (moveID, score, nodes), the score
+is None if the deadline passed or the search was stopped before it finished. stopID is None if the job can't be stopped
+'''
+def searchRootMove(job):
+
+    global workerPosition, workerGameState, workerMoves, workerSearchID
+    position, searchID, moveID, depth, alpha, deadlineTimestamp, stopID = job
+    if position != workerPosition:
+
+        workerPosition, workerGameState = position, pickle.loads(position)
+        workerMoves = {move.moveID: move for move in workerGameState.getValidMoves()}
+
+    if searchID != workerSearchID: #new search, entries from the earlier ones become the first to be replaced
+
+        workerSearchID = searchID
+        ChessAI.newSearch()
+
+    gameState = workerGameState
+    ChessAI.rootDepth = depth #the move is searched from depth - 1, so nothing below counts as the root
+    ChessAI.nodesSearched, ChessAI.quiescenceNodes, ChessAI.nodeLimit = 0, 0, None
+    #time.time() is comparable across processes, the search itself uses perf_counter
+    ChessAI.deadline = time.perf_counter() + (deadlineTimestamp - time.time()) if deadlineTimestamp is not None else None
+    ChessAI.stopCheck = (lambda: workerStopValue.value >= stopID) if stopID is not None and workerStopValue is not None else None
+    startingMoves = len(gameState.moveLog)
+    gameState.makeMove(workerMoves[moveID])
+    try:
+
+        score = -ChessAI.findNegaMaxAlphaBetaMove(gameState, None, depth - 1, -ChessAI.CHECKMATE, -alpha, 1 if gameState.whiteToMove else -1)
+
+    except ChessAI.SearchAborted:
+
+        score = None
+
+    while len(gameState.moveLog) > startingMoves:
+
+        gameState.undoMove()
+
+    return moveID, score, ChessAI.nodesSearched + ChessAI.quiescenceNodes
+
+'''
+Same as ChessAI.iterativeDeepening, but every iteration is split across the worker processes. Returns (move, score, depth) of the last
+completed iteration, or a move from the opening book with score and depth 0. Falls back to the single process search for 1 worker or a node budget.
+stopValue is a shared multiprocessing.Value, the search stops (like when the time runs out) once its value reaches stopID
+'''
+def parallelIterativeDeepening(gameState, validMoves, maxDepth = None, maxTimeMs = None, maxNodes = None, workers = None, stopValue = None, stopID = None):
+
+    global searchCount, lastSearchStats
+    workers = WORKERS if workers is None else workers
+    shouldStop = (lambda: stopValue.value >= stopID) if stopValue is not None and stopID is not None else None
+    bookMove = ChessAI.findBookMove(gameState, validMoves) if workers > 1 else None #the single process search checks the book itself
+    if bookMove is not None:
+
+        lastSearchStats = {'workers': workers, 'depth': 0}
+        return bookMove, 0, 0
+
+    if workers <= 1 or maxNodes is not None or len(validMoves) <= 1:
+
+        return ChessAI.iterativeDeepening(gameState, validMoves, maxDepth, maxTimeMs, maxNodes, shouldStop)
+
+    maxDepth = ChessAI.DEPTH if maxDepth is None else maxDepth
+    workerPool = getPool(workers, stopValue)
+    searchCount += 1
+    position = pickle.dumps(gameState)
+    start = time.perf_counter()
+    deadlineTimestamp = time.time() + maxTimeMs / 1000 if maxTimeMs is not None else None
+    orderedMoves = list(validMoves)
+    bestMove, bestScore, completedDepth, totalNodes = None, 0, 0, 0
+    lastSearchStats = {'workers': workers, 'depthTimes': []}
+
+    for depth in range(1, maxDepth + 1):
+        #the 1st iteration always completes, so there is a move to return
+        iterationDeadline = deadlineTimestamp if depth > 1 else None
+        iterationStopID = stopID if depth > 1 and shouldStop is not None else None
+        moveID, firstScore, nodes = workerPool.apply(searchRootMove, ((position, searchCount, orderedMoves[0].moveID, depth, -ChessAI.CHECKMATE, iterationDeadline,
+                                                                       iterationStopID),))
+        totalNodes += nodes
+        if firstScore is None:
+
+            break
+
+        scores = {moveID: firstScore}
+        jobs = [(position, searchCount, move.moveID, depth, firstScore, iterationDeadline, iterationStopID) for move in orderedMoves[1:]]
+        aborted = False
+        for moveID, score, nodes in workerPool.imap_unordered(searchRootMove, jobs):
+
+            totalNodes += nodes
+            aborted = aborted or score is None
+            scores[moveID] = score
+
+        if aborted:
+
+            break
+        #highest score first, ties keep the order they were searched in. moves that didn't beat the 1st move only have an upper bound, so they stay behind it
+        orderedMoves = sorted(orderedMoves, key = lambda move: -scores[move.moveID])
+        bestMove, bestScore, completedDepth = orderedMoves[0], scores[orderedMoves[0].moveID], depth
+        lastSearchStats['depthTimes'].append(time.perf_counter() - start)
+        if abs(bestScore) >= ChessAI.CHECKMATE or (deadlineTimestamp is not None and time.time() >= deadlineTimestamp) or (shouldStop is not None and shouldStop()):
+
+            break
+
+    elapsed = time.perf_counter() - start
+    lastSearchStats.update({'depth': completedDepth, 'nodes': totalNodes, 'time': elapsed, 'nodesPerSecond': totalNodes / elapsed if elapsed else 0})
+    return bestMove, bestScore, completedDepth
+
+'''
+Calls the parallel search and adds the best move to the return queue, same as ChessAI.findBestNegaMaxAlphaBetaMove
+'''
+def findBestParallelMove(gameState, validMoves, returnQueue, maxDepth = None, maxTimeMs = None, maxNodes = None, workers = None):
+
+    move, score, depth = parallelIterativeDeepening(gameState, validMoves, maxDepth, maxTimeMs, maxNodes, workers)
+    if ChessAI.SHOW_SEARCH_STATS and depth == 0 and move is not None:
+
+        print('Book move ' + move.getChessNotation())
+
+    elif ChessAI.SHOW_SEARCH_STATS and lastSearchStats.get('depth') == depth:
+
+        print('Depth %d, score %d, %d nodes in %.0fms on %d workers (%.0f nodes/s)' % (depth, score, lastSearchStats['nodes'],
+              lastSearchStats['time'] * 1000, lastSearchStats['workers'], lastSearchStats['nodesPerSecond']))
+
+    returnQueue.put(move)
+
+'''
+Times the search to depth from the FEN position with each worker count, on fresh transposition tables, and prints the time-to-depth speedup over
+the single process search
+'''
+def benchmark(fen, depth, workerCounts):
+
+    baseline = None
+    for workers in workerCounts:
+
+        closePool()
+        ChessAI.transpositionTable.clear()
+        gameState = ChessFEN.loadFEN(ChessBitboard.GameState(), fen)
+        validMoves = gameState.getValidMoves()
+        start = time.perf_counter()
+        move, score, completedDepth = parallelIterativeDeepening(gameState, validMoves, depth, workers = workers)
+        elapsed = time.perf_counter() - start
+        baseline = elapsed if baseline is None else baseline
+        print('%2d workers: depth %d in %.2fs, speedup %.2fx, best move %s score %d' % (workers, completedDepth, elapsed, baseline / elapsed,
+              move.getChessNotation(), score))
+
+    closePool()
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Measures the time-to-depth of the parallel AI search for different worker counts.')
+    parser.add_argument('--fen', default = ChessFEN.START_FEN)
+    parser.add_argument('--depth', type = int, default = ChessAI.DEPTH)
+    parser.add_argument('--workers', type = int, nargs = '+', default = [1, WORKERS])
+    args = parser.parse_args()
+    benchmark(args.fen, args.depth, args.workers)
+
+#this is convention to protect from accidentally running the program when we import another class
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,187 @@
+'''
+Perft (performance test) for the move generator. Counts every leaf of the valid move tree to a fixed depth from a FEN position, which checks
+getValidMoves against known counts and measures how fast it is. The last ply is bulk counted (the number of valid moves is added without
+making them), root moves can be split across a process pool, and repeated positions can be answered from a hash table.
+Usage:
+    python ChessPerft.py 5                                   perft 5 from the starting position
+    python ChessPerft.py 4 --fen "<fen>" --divide            leaf count of every root move
+    python ChessPerft.py 5 --processes 4 --hash 64           4 worker processes, each with a 64MB perft hash table
+    python ChessPerft.py --suite                             every reference position against its known counts
+'''
+import argparse
+import multiprocessing
+import time
+from array import array
+import ChessBitboard
+import ChessEngine
+import ChessFEN
+
+BACKENDS = {'bitboard': ChessBitboard.GameState, 'list': ChessEngine.GameState}
+#Standard perft positions (https://www.chessprogramming.org/Perft_Results) with their leaf counts for depth 1, 2, 3, ...
+#GameState always promotes to a queen, so in positions where promotions show up the counts only include queen promotions. Those counts were
+#generated with an independent move generator restricted to queen promotions, the others are the published counts.
+REFERENCE_POSITIONS = [('Initial position', ChessFEN.START_FEN, [20, 400, 8902, 197281, 4865609]),
+                       ('Kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862, 4074224]),
+                       ('Position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238, 674624]),
+                       ('Position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 228, 8087, 320802]),
+                       ('Position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [41, 1373, 54007]),
+                       ('Position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', [46, 2079, 89890])]
+
+'''
+Fixed size table of perft counts, keyed by zobrist hash and remaining depth. Always replaces, collisions just cost a recount
+'''
+class PerftHashTable():
+
+    def __init__(self, sizeMB):
+
+        self.size = max(1, (sizeMB * 1024 * 1024) // 16)
+        self.keys = array('Q', [0]) * self.size
+        self.counts = array('Q', [0]) * self.size #count << 8 | depth, 0 if the slot is empty
+
+    def probe(self, key, depth):
+
+        index = key % self.size
+        if self.keys[index] == key and self.counts[index] and self.counts[index] & 0xFF == depth:
+
+            return self.counts[index] >> 8
+
+        return None
+
+    def store(self, key, depth, count):
+
+        index = key % self.size
+        self.keys[index] = key
+        self.counts[index] = (count << 8) | depth
+
+'''
+Returns the number of leaf nodes depth plies below the current position. The last ply is bulk counted
+'''
+def perft(gameState, depth, hashTable = None):
+
+    if depth == 0:
+
+        return 1
+
+    if hashTable is not None:
+
+        count = hashTable.probe(gameState.zobristHash, depth)
+        if count is not None:
+
+            return count
+
+    moves = gameState.getValidMoves()
+    if depth == 1:
+
+        count = len(moves)
+
+    else:
+
+        count = 0
+        for move in moves:
+
+            gameState.makeMove(move)
+            count += perft(gameState, depth - 1, hashTable)
+            gameState.undoMove()
+
+    if hashTable is not None:
+
+        hashTable.store(gameState.zobristHash, depth, count)
+
+    return count
+
+'''
+Returns the move in coordinate notation, e.g. e2e4, which is how other engines print their divide output
+'''
+def moveName(move):
+
+    return move.getRankFile(move.startSq[0], move.startSq[1]) + move.getRankFile(move.endSq[0], move.endSq[1])
+
+'''
+Worker for the process pool: sets up its own game state from the FEN, makes one root move and counts the leaves below it
+'''
+def perftRootMove(job):
+
+    fen, backend, moveID, depth, hashMB = job
+    gameState = ChessFEN.loadFEN(BACKENDS[backend](), fen)
+    move = [move for move in gameState.getValidMoves() if move.moveID == moveID][0]
+    gameState.makeMove(move)
+    return moveName(move), perft(gameState, depth - 1, PerftHashTable(hashMB) if hashMB else None)
+
+'''
+Returns a list of (move, leaf count) for every root move of the FEN position. With more than 1 process the root moves are split across a pool
+'''
+def divide(fen, depth, backend = 'bitboard', processes = 1, hashMB = 0):
+
+    gameState = ChessFEN.loadFEN(BACKENDS[backend](), fen)
+    rootMoves = gameState.getValidMoves()
+    if processes > 1:
+
+        with multiprocessing.Pool(processes) as pool:
+
+            results = pool.map(perftRootMove, [(fen, backend, move.moveID, depth, hashMB) for move in rootMoves])
+
+    else:
+
+        hashTable = PerftHashTable(hashMB) if hashMB else None #1 table shared by every root move
+        results = []
+        for move in rootMoves:
+
+            gameState.makeMove(move)
+            results.append((moveName(move), perft(gameState, depth - 1, hashTable)))
+            gameState.undoMove()
+
+    return sorted(results)
+
+'''
+Runs perft on every reference position up to maxDepth (or its deepest known count) and prints if the counts match. Returns True if all matched
+'''
+def runSuite(maxDepth, backend = 'bitboard', processes = 1, hashMB = 0):
+
+    allPassed = True
+    for name, fen, counts in REFERENCE_POSITIONS:
+
+        for depth in range(1, min(maxDepth, len(counts)) + 1):
+
+            start = time.perf_counter()
+            count = sum(count for move, count in divide(fen, depth, backend, processes, hashMB))
+            elapsed = time.perf_counter() - start
+            passed = count == counts[depth - 1]
+            allPassed = allPassed and passed
+            print('%-16s depth %d: %10d %s (expected %d) %8.2fs %10.0f nodes/s' % (name, depth, count, 'ok  ' if passed else 'FAIL', counts[depth - 1],
+                  elapsed, count / elapsed if elapsed else 0))
+
+    return allPassed
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Counts the leaf nodes of the valid move tree to check and time the move generator.')
+    parser.add_argument('depth', type = int, nargs = '?', default = 4)
+    parser.add_argument('--fen', default = ChessFEN.START_FEN)
+    parser.add_argument('--divide', action = 'store_true', help = 'print the leaf count of every root move')
+    parser.add_argument('--processes', type = int, default = 1, help = 'split the root moves across this many processes')
+    parser.add_argument('--hash', type = int, default = 0, help = 'perft hash table size in MB per process, 0 to disable')
+    parser.add_argument('--backend', choices = sorted(BACKENDS), default = 'bitboard')
+    parser.add_argument('--suite', action = 'store_true', help = 'check the reference positions up to depth')
+    args = parser.parse_args()
+
+    if args.suite:
+
+        return 0 if runSuite(args.depth, args.backend, args.processes, args.hash) else 1
+
+    start = time.perf_counter()
+    results = divide(args.fen, args.depth, args.backend, args.processes, args.hash)
+    elapsed = time.perf_counter() - start
+    if args.divide:
+
+        for move, count in results:
+
+            print(move + ': ' + str(count))
+
+    total = sum(count for move, count in results)
+    print('Nodes: %d\nTime: %.3fs\nNodes/s: %.0f' % (total, elapsed, total / elapsed if elapsed else 0))
+    return 0
+
+#this is convention to protect from accidentally running the program when we import another class
+if __name__ == '__main__':
+
+    raise SystemExit(main())
@@ -0,0 +1,361 @@
+'''
+Headless engine-vs-engine matches, to check that a change to the AI actually makes it play stronger. Two engine configurations play each
+opening of an opening suite twice, once with each color, in parallel worker processes, without pygame. Games are adjudicated on checkmate,
+stalemate, insufficient material, the fifty-move rule, threefold repetition, the endgame bitbases and, once both engines agree on the score,
+resignation or a draw. The result is reported as an Elo difference with its 95% error margin, and a sequential probability ratio test (SPRT)
+can stop the match as soon as it is clear whether the first engine is at least elo1 stronger than the second (pass) or at most elo0 (fail).
+An engine configuration is a list of key=value settings separated by commas:
+    name        name in the report
+    depth       maximum search depth, ChessAI.DEPTH by default unless there is a node or time budget
+    nodes       node budget per move
+    movetime    time budget per move in milliseconds
+    tc          game clock as base+increment in seconds, e.g. 10+0.1. The engine loses on time if its clock runs out
+    hash        transposition table size in MB
+    book        1 or 0, play from the opening book (ChessBook). Off by default, the opening suite already varies the games
+    bitbases    1 or 0, probe the endgame bitbases (ChessBitbase)
+Usage:
+    python ChessTournament.py --engine1 "name=new,depth=4" --engine2 "name=old,depth=3" --games 200 --workers 4 --pgn games.pgn
+    python ChessTournament.py --engine1 "nodes=20000" --engine2 "nodes=10000" --openings suite.epd --sprt --elo0 0 --elo1 10
+'''
+import argparse
+import math
+import multiprocessing
+import os
+import time
+import ChessAI
+import ChessBitbase
+import ChessBitboard
+import ChessFEN
+import ChessPGN
+import ChessTranspositionTable
+
+#a few balanced positions after common openings, used if no opening suite is given
+OPENINGS = ['rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2',
+            'rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq c6 0 2',
+            'rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+            'rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+            'rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq d6 0 2',
+            'rnbqkb1r/pppppppp/5n2/8/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 1 2',
+            'rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR b KQkq c3 0 1',
+            'rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R b KQkq - 1 1',
+            'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+            'rnbqkb1r/pppp1ppp/4pn2/8/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3']
+ENGINE_SETTINGS = {'name': str, 'depth': int, 'nodes': int, 'movetime': int, 'tc': str, 'hash': int, 'book': int, 'bitbases': int}
+MAX_PLIES = 400 #games still going after this many plies are drawn
+MAX_DEPTH = 64 #depth limit of engines searching under a node or time budget
+RESIGN_SCORE, RESIGN_PLIES = 1000, 8 #a game is lost once both engines score it at least this far apart for this many plies in a row
+DRAW_SCORE, DRAW_PLIES, DRAW_START = 10, 16, 80 #and drawn once both score it within DRAW_SCORE for DRAW_PLIES plies, after DRAW_START plies
+CLOCK_MOVES = 30 #a clock is shared out as if this many moves were left
+#worker process state: the transposition and history tables of each engine, so the engines never see each other's searches
+workerTables = {}
+
+'''
+Parses an engine configuration string into a dict of settings. Raises ValueError for an unknown setting
+'''
+def parseEngine(text, defaultName):
+
+    engine = {'name': defaultName, 'depth': None, 'nodes': None, 'movetime': None, 'tc': None, 'hash': ChessAI.HASH_SIZE_MB, 'book': 0,
+              'bitbases': 1}
+    for setting in filter(None, (part.strip() for part in text.split(','))):
+
+        key, _, value = setting.partition('=')
+        if key not in ENGINE_SETTINGS:
+
+            raise ValueError('Unknown engine setting ' + key)
+
+        engine[key] = ENGINE_SETTINGS[key](value)
+
+    if engine['tc'] is not None:
+
+        base, _, increment = engine['tc'].partition('+')
+        engine['tc'] = (float(base), float(increment or 0))
+
+    if engine['depth'] is None: #with a node or time budget the depth is only limited by the budget
+
+        engine['depth'] = ChessAI.DEPTH if engine['nodes'] is None and engine['movetime'] is None and engine['tc'] is None else MAX_DEPTH
+
+    return engine
+
+'''
+Reads an opening suite: one FEN or EPD position per line, empty lines and lines starting with # are skipped
+'''
+def loadOpenings(path):
+
+    return [fen for lineNumber, fen, operations in ChessFEN.readPositions(path)]
+
+'''
+Points ChessAI at the tables of the engine, creating them the first time. Every new game starts from empty tables
+'''
+def useEngine(engine, newGame):
+
+    tables = workerTables.get(engine['name'])
+    if tables is None or tables[0].sizeMB != engine['hash']:
+
+        tables = (ChessTranspositionTable.TranspositionTable(engine['hash']), [[0] * 4096 for color in range(2)])
+        workerTables[engine['name']] = tables
+
+    elif newGame:
+
+        tables[0].clear()
+        for history in tables[1]:
+
+            history[:] = [0] * len(history)
+
+    ChessAI.transpositionTable, ChessAI.historyTable = tables
+    ChessAI.USE_OPENING_BOOK, ChessAI.USE_BITBASES = bool(engine['book']), bool(engine['bitbases'])
+
+'''
+Returns the result of the game if it is over: ('1-0', '0-1' or '1/2-1/2', reason), otherwise None. validMoves are the moves of the current
+position, which also set its checkmate and stalemate flags
+'''
+def adjudicate(gameState, validMoves):
+
+    if gameState.checkmate:
+
+        return ('0-1' if gameState.whiteToMove else '1-0'), 'checkmate'
+
+    elif gameState.stalemate:
+
+        return '1/2-1/2', 'stalemate' if not validMoves else 'insufficient material'
+
+    elif gameState.halfmoveClock >= 100:
+
+        return '1/2-1/2', 'fifty-move rule'
+
+    elif gameState.zobristLog.count(gameState.zobristHash) >= 3:
+
+        return '1/2-1/2', 'threefold repetition'
+
+    result = ChessBitbase.probe(gameState)
+    if result is not None:
+
+        if result[0] == 0:
+
+            return '1/2-1/2', 'bitbase draw'
+
+        return ('1-0' if (result[0] > 0) == gameState.whiteToMove else '0-1'), 'bitbase win'
+
+    return None
+
+'''
+Runs in a worker process: plays one game from the opening between the white and black engine configurations. Returns (game, result, reason,
+plies, pgn), game being the index the job was given. pgn is the game in PGN if the job asks for it, otherwise None
+'''
+def playGame(job):
+
+    game, opening, white, black, savePGN = job
+    gameState = ChessFEN.loadFEN(ChessBitboard.GameState(), opening)
+    result, reason, plies = playMoves(gameState, white, black)
+    pgn = None
+    if savePGN:
+
+        termination = 'time forfeit' if reason == 'time forfeit' else 'adjudication' if reason.startswith(('adjudicated', 'bitbase', 'game too long')) else 'normal'
+        pgn = ChessPGN.gameToPGN(gameState, {'Event': 'Engine match', 'Date': time.strftime('%Y.%m.%d'), 'Round': str(game + 1), 'White': white['name'],
+                                             'Black': black['name'], 'Result': result, 'Termination': termination})
+
+    return game, result, reason, plies, pgn
+
+'''
+Plays the game on the game state until it is over or adjudicated, returns (result, reason, plies)
+'''
+def playMoves(gameState, white, black):
+
+    clocks = {True: white['tc'][0] if white['tc'] else None, False: black['tc'][0] if black['tc'] else None}
+    started = set()
+    resignPlies, drawPlies, lastScore = 0, 0, None
+    for ply in range(MAX_PLIES):
+
+        validMoves = gameState.getValidMoves()
+        result = adjudicate(gameState, validMoves)
+        if result is not None:
+
+            return result[0], result[1], ply
+
+        engine = white if gameState.whiteToMove else black
+        useEngine(engine, engine['name'] not in started)
+        started.add(engine['name'])
+        maxTimeMs = engine['movetime']
+        clock = clocks[gameState.whiteToMove]
+        if clock is not None:
+
+            budget = clock * 1000 / CLOCK_MOVES + engine['tc'][1] * 1000
+            maxTimeMs = min(maxTimeMs, budget) if maxTimeMs is not None else budget
+
+        start = time.perf_counter()
+        move, score, depth = ChessAI.iterativeDeepening(gameState, validMoves, engine['depth'], maxTimeMs, engine['nodes'])
+        if clock is not None:
+
+            clocks[gameState.whiteToMove] = clock - (time.perf_counter() - start) + engine['tc'][1]
+            if clocks[gameState.whiteToMove] < 0:
+
+                return ('0-1' if gameState.whiteToMove else '1-0'), 'time forfeit', ply
+
+        #score adjudication, only once both engines agree. Book moves have no score
+        if depth > 0 and lastScore is not None:
+
+            agreed = abs(score) >= RESIGN_SCORE and abs(lastScore) >= RESIGN_SCORE and (score > 0) != (lastScore > 0)
+            resignPlies = resignPlies + 1 if agreed else 0
+            drawPlies = drawPlies + 1 if ply >= DRAW_START and abs(score) <= DRAW_SCORE and abs(lastScore) <= DRAW_SCORE else 0
+
+        else:
+
+            resignPlies, drawPlies = 0, 0
+
+        lastScore = score if depth > 0 else None
+        if resignPlies >= RESIGN_PLIES:
+
+            return ('1-0' if (score > 0) == gameState.whiteToMove else '0-1'), 'adjudicated win', ply
+
+        elif drawPlies >= DRAW_PLIES:
+
+            return '1/2-1/2', 'adjudicated draw', ply
+
+        gameState.makeMove(move)
+        if move.pieceCaptured != '--' or move.isPawnPromotion:
+
+            gameState.getBoardMaterial()
+
+    return '1/2-1/2', 'game too long', MAX_PLIES
+
+'''
+Returns (elo, margin) for a match score: the Elo difference that makes the expected score equal the one played, and its 95% error margin
+from the per game variance of the results. wins, draws and losses are from the first engine's side
+'''
+def eloDifference(wins, draws, losses):
+
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    if score <= 0 or score >= 1:
+
+        return (-math.inf if score <= 0 else math.inf), math.inf
+
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    elo = lambda s: -400 * math.log10(1 / s - 1)
+    deviation = 1.96 * math.sqrt(variance / games)
+    low, high = max(score - deviation, 1e-9), min(score + deviation, 1 - 1e-9)
+    return elo(score), (elo(high) - elo(low)) / 2
+
+'''
+Returns the log-likelihood ratio of the results for the hypotheses that the first engine is elo1 stronger against elo0 stronger, with the
+game results approximated as normally distributed
+'''
+def logLikelihoodRatio(wins, draws, losses, elo0, elo1):
+
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0: #all results the same so far, nothing to estimate the variance from
+
+        return 0.0
+
+    expected = lambda elo: 1 / (1 + 10 ** (-elo / 400))
+    score0, score1 = expected(elo0), expected(elo1)
+    return (score1 - score0) * (2 * score - score0 - score1) * games / (2 * variance)
+
+'''
+Returns the (lower, upper) log-likelihood ratio bounds of the SPRT, it fails below the lower and passes above the upper one
+'''
+def sprtBounds(alpha, beta):
+
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+'''
+Plays the match and prints every result as it comes in. Returns (wins, draws, losses) for engine1
+'''
+def runMatch(engine1, engine2, openings, games, workers, sprt = None, pgnPath = None):
+
+    jobs = []
+    for game in range(games): #every opening is played twice, with the colors swapped
+
+        opening = openings[(game // 2) % len(openings)]
+        jobs.append((game, opening, engine1, engine2, pgnPath is not None) if game % 2 == 0 else (game, opening, engine2, engine1, pgnPath is not None))
+
+    wins, draws, losses = 0, 0, 0
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    pgnFile = open(pgnPath, 'w', encoding = 'utf-8') if pgnPath is not None else None
+    start = time.perf_counter()
+    try:
+
+        for game, result, reason, plies, pgn in (pool.imap_unordered(playGame, jobs) if pool is not None else map(playGame, jobs)):
+
+            if pgnFile is not None: #in the order the games finish
+
+                pgnFile.write(pgn)
+                pgnFile.flush()
+
+            engine1White = game % 2 == 0
+            points = {'1-0': 1, '0-1': 0, '1/2-1/2': 0.5}[result] if engine1White else {'1-0': 0, '0-1': 1, '1/2-1/2': 0.5}[result]
+            wins, draws, losses = wins + (points == 1), draws + (points == 0.5), losses + (points == 0)
+            elo, margin = eloDifference(wins, draws, losses)
+            print('Game %d (%s vs %s): %s %s after %d plies. Score %d-%d-%d, Elo %+.1f +/- %.1f' % (game + 1, *((engine1['name'], engine2['name'])
+                  if engine1White else (engine2['name'], engine1['name'])), result, reason, plies, wins, losses, draws, elo, margin), end = '')
+            if sprt is not None:
+
+                llr = logLikelihoodRatio(wins, draws, losses, sprt['elo0'], sprt['elo1'])
+                lower, upper = sprtBounds(sprt['alpha'], sprt['beta'])
+                print(', LLR %.2f (%.2f, %.2f)' % (llr, lower, upper))
+                if llr <= lower or llr >= upper:
+
+                    print('SPRT %s: %s is %s' % ('passed' if llr >= upper else 'failed', engine1['name'], ('at least %g Elo stronger' % sprt['elo1'])
+                          if llr >= upper else ('not more than %g Elo stronger' % sprt['elo0'])))
+                    break
+
+            else:
+
+                print()
+
+    finally:
+
+        if pool is not None:
+
+            pool.terminate()
+            pool.join()
+
+        if pgnFile is not None:
+
+            pgnFile.close()
+
+    print('Finished %d games in %.1fs' % (wins + draws + losses, time.perf_counter() - start))
+    return wins, draws, losses
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Plays a headless match between two engine configurations.')
+    parser.add_argument('--engine1', default = '', help = 'engine configuration, e.g. "name=new,depth=4,hash=32"')
+    parser.add_argument('--engine2', default = '', help = 'engine configuration of the opponent')
+    parser.add_argument('--games', type = int, default = 100)
+    parser.add_argument('--workers', type = int, default = os.cpu_count() or 1)
+    parser.add_argument('--openings', help = 'file with one FEN or EPD position per line')
+    parser.add_argument('--pgn', help = 'file to save the games to')
+    parser.add_argument('--sprt', action = 'store_true', help = 'stop as soon as the SPRT passes or fails')
+    parser.add_argument('--elo0', type = float, default = 0)
+    parser.add_argument('--elo1', type = float, default = 10)
+    parser.add_argument('--alpha', type = float, default = 0.05)
+    parser.add_argument('--beta', type = float, default = 0.05)
+    args = parser.parse_args()
+    try:
+
+        engine1, engine2 = parseEngine(args.engine1, 'engine1'), parseEngine(args.engine2, 'engine2')
+
+    except ValueError as error:
+
+        parser.error(str(error))
+
+    if engine1['name'] == engine2['name']:
+
+        parser.error('the engines need different names')
+
+    openings = loadOpenings(args.openings) if args.openings else OPENINGS
+    sprt = {'elo0': args.elo0, 'elo1': args.elo1, 'alpha': args.alpha, 'beta': args.beta} if args.sprt else None
+    wins, draws, losses = runMatch(engine1, engine2, openings, args.games, args.workers, sprt, args.pgn)
+    if wins + draws + losses:
+
+        elo, margin = eloDifference(wins, draws, losses)
+        print('%s vs %s: +%d =%d -%d, Elo %+.1f +/- %.1f' % (engine1['name'], engine2['name'], wins, draws, losses, elo, margin))
+
+    return 0
+
+#this is convention to protect from accidentally running the program when we import another class
+if __name__ == '__main__':
+
+    raise SystemExit(main())
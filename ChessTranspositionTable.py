@@ -0,0 +1,112 @@
+'''
+Fixed size transposition table for the AI search, keyed by the GameState zobrist hash. Entries are packed into a flat array of 64-bit ints,
+so the memory used is exactly the size asked for no matter how many positions get stored.
+The table is split into buckets of 2 slots. The 1st slot is depth-preferred: it keeps the deepest search of the current move and is only
+overwritten by an equal or deeper search (or by anything once it is left over from an older move). The 2nd slot is always-replace and
+holds whatever was stored most recently, so shallow results near the leaves still get cached.
+'''
+from array import array
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 1, 2, 3 #bound types: score is exact, score is at least this (beta cutoff), score is at most this (fail low)
+SLOT_SIZE = 16 #bytes per slot: 1 int for the key, 1 int for the packed entry
+BUCKET_SLOTS = 2
+SCORE_OFFSET = 1 << 19 #scores are stored unsigned in 20 bits
+GENERATIONS = 64
+
+class TranspositionTable():
+
+    def __init__(self, sizeMB = 16):
+
+        self.resize(sizeMB)
+
+    '''
+    Allocates an empty table using sizeMB megabytes
+    '''
+    def resize(self, sizeMB):
+
+        self.sizeMB = sizeMB
+        self.buckets = max(1, (sizeMB * 1024 * 1024) // (SLOT_SIZE * BUCKET_SLOTS))
+        self.table = array('Q', [0]) * (self.buckets * BUCKET_SLOTS * 2) #each bucket is [key0, entry0, key1, entry1]
+        self.generation = 0
+        self.resetStats()
+
+    def clear(self):
+
+        self.resize(self.sizeMB)
+
+    def resetStats(self):
+
+        self.probes, self.hits, self.stores = 0, 0, 0
+
+    '''
+    Called before every new search, so entries left over from earlier moves can be told apart and replaced first
+    '''
+    def newSearch(self):
+
+        self.generation = (self.generation + 1) % GENERATIONS
+        self.resetStats()
+
+    '''
+    Returns (depth, score, bound, moveID) stored for the position, or None if the position isn't in the table. moveID is None if no best move was stored
+    '''
+    def probe(self, key):
+
+        self.probes += 1
+        index = (key % self.buckets) * 4
+        table = self.table
+        if table[index] == key and table[index + 1]:
+
+            entry = table[index + 1]
+
+        elif table[index + 2] == key and table[index + 3]:
+
+            entry = table[index + 3]
+
+        else:
+
+            return None
+
+        self.hits += 1
+        moveID = (entry >> 30) & 0xFFFF
+        return (entry >> 20) & 0xFF, (entry & 0xFFFFF) - SCORE_OFFSET, (entry >> 28) & 0x3, moveID - 1 if moveID else None
+
+    '''
+    Stores a search result for the position. moveID is the Move.moveID of the best move found, or None
+    '''
+    def store(self, key, depth, score, bound, moveID):
+
+        self.stores += 1
+        index = (key % self.buckets) * 4
+        table = self.table
+        entry = ((score + SCORE_OFFSET) | (depth << 20) | (bound << 28) | ((moveID + 1 if moveID is not None else 0) << 30) |
+                 (self.generation << 46))
+        deepEntry = table[index + 1]
+        #depth-preferred slot: take it if its empty, holds the same position, is from an older search or was searched less deep
+        if not deepEntry or table[index] == key or (deepEntry >> 46) != self.generation or depth >= (deepEntry >> 20) & 0xFF:
+
+            table[index], table[index + 1] = key, entry
+
+        else:
+
+            table[index + 2], table[index + 3] = key, entry
+
+    '''
+    Percentage of probes that found their position
+    '''
+    def hitRate(self):
+
+        return 100 * self.hits / self.probes if self.probes else 0
+
+    '''
+    Percentage of slots in use, estimated from the first 1000 buckets
+    '''
+    def fillPercentage(self):
+
+        sampled = min(self.buckets, 1000)
+        used = sum(1 for slot in range(1, sampled * 4, 2) if self.table[slot])
+        return 100 * used / (sampled * BUCKET_SLOTS)
+
+    def getStats(self):
+
+        return {'sizeMB': self.sizeMB, 'probes': self.probes, 'hits': self.hits, 'stores': self.stores,
+                'hitRate': self.hitRate(), 'fillPercentage': self.fillPercentage()}
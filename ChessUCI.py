@@ -0,0 +1,342 @@
+'''
+UCI (Universal Chess Interface) front-end, so the AI can be driven by match managers and analysis GUIs on machines without a display.
+Reads commands from stdin and writes replies to stdout, never imports pygame. The engine modules (numpy, tables, book, bitbases) are only
+imported once the GUI sends isready, position, go or setoption, so the engine answers the uci handshake straight away.
+Supported commands: uci, isready, ucinewgame, setoption (Hash, Threads), position [startpos | fen <fen>] [moves ...],
+go [depth n] [nodes n] [movetime ms] [wtime ms] [btime ms] [winc ms] [binc ms] [movestogo n] [infinite], stop, quit.
+The search runs in a thread, so stop and isready are answered while it runs. Threads > 1 uses the parallel search in ChessParallel.
+Usage:
+    python ChessUCI.py
+'''
+import multiprocessing
+import re
+import sys
+import threading
+import time
+
+ENGINE_NAME = 'ChessAI'
+ENGINE_AUTHOR = 'ChessAI authors'
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+MAX_DEPTH = 64 #depth limit when the search is only limited by time, nodes or stop
+CLOCK_MOVES = 30 #a move gets this share of the remaining clock when the GUI doesn't say how many moves are left until the time control
+MOVE_OVERHEAD_MS = 50 #kept back from the clock for the GUI and process overhead, so the engine never loses on time by a few milliseconds
+ChessAI, ChessBitboard, ChessFEN, ChessParallel, ChessWorker = None, None, None, None, None #imported by loadEngine
+outputLock = threading.Lock()
+
+'''
+Writes a line to the GUI. The search thread and the command loop both write, so lines are never interleaved
+'''
+def send(line):
+
+    with outputLock:
+
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+'''
+Imports the engine modules, the first time it is called
+'''
+def loadEngine():
+
+    global ChessAI, ChessBitboard, ChessFEN, ChessParallel, ChessWorker
+    if ChessAI is None:
+
+        import ChessAI
+        import ChessBitboard
+        import ChessFEN
+        import ChessParallel
+        import ChessWorker
+
+'''
+Returns the moveID of a move in UCI notation (e.g. e2e4, e7e8q). Raises ValueError if it isn't one, or if it is an under-promotion,
+since GameState always promotes to a queen
+'''
+def moveIDFromUCI(text):
+
+    if not re.fullmatch(r'[a-h][1-8][a-h][1-8]q?', text):
+
+        raise ValueError('Move ' + text + ' is not supported')
+
+    startRow, startCol, endRow, endCol = 8 - int(text[1]), 'abcdefgh'.index(text[0]), 8 - int(text[3]), 'abcdefgh'.index(text[2])
+    return startRow * 1000 + startCol * 100 + endRow * 10 + endCol
+
+'''
+Returns a move in UCI notation
+'''
+def moveToUCI(move):
+
+    return move.getRankFile(move.startSq[0], move.startSq[1]) + move.getRankFile(move.endSq[0], move.endSq[1]) + ('q' if move.isPawnPromotion else '')
+
+'''
+Returns the UCI score of a search score: centipawns from the side to move, or mate in moves once a mate was found (the search doesn't keep
+the distance to mate, so it is the most moves the mate can take at the depth searched)
+'''
+def scoreToUCI(score, depth):
+
+    if abs(score) >= ChessAI.CHECKMATE:
+
+        return 'mate %d' % ((depth + 1) // 2 if score > 0 else -(depth // 2))
+
+    return 'cp %d' % score
+
+'''
+Holds the position and options set by the GUI, and the search thread
+'''
+class UCIEngine():
+
+    def __init__(self):
+
+        self.gameState, self.startFEN = None, None
+        self.hashMB, self.threads = 16, 1
+        self.searchThread = None
+        self.stopValue = None #shared with the parallel search processes, a search stops once it reaches the search ID
+        self.searchID = 0
+        self.stopped = threading.Event() #set by stop, so an infinite search that finished early knows when to report its move
+
+    def uci(self):
+
+        send('id name ' + ENGINE_NAME)
+        send('id author ' + ENGINE_AUTHOR)
+        send('option name Hash type spin default %d min 1 max %d' % (self.hashMB, MAX_HASH_MB))
+        send('option name Threads type spin default %d min 1 max %d' % (self.threads, MAX_THREADS))
+        send('uciok')
+
+    '''
+    Imports the engine on the first call and creates the game state in the starting position
+    '''
+    def ready(self):
+
+        if self.gameState is None:
+
+            loadEngine()
+            self.stopValue = multiprocessing.Value('q', 0)
+            self.gameState = ChessBitboard.GameState()
+            self.gameState.getBoardMaterial()
+
+    def setOption(self, tokens):
+
+        text = ' '.join(tokens)
+        match = re.fullmatch(r'name\s+(.+?)(?:\s+value\s+(.*))?', text)
+        if match is None:
+
+            return
+
+        self.ready()
+        name, value = match.group(1).lower(), match.group(2)
+        try:
+
+            if name == 'hash':
+
+                self.hashMB = min(max(int(value), 1), MAX_HASH_MB)
+                ChessAI.HASH_SIZE_MB = self.hashMB
+                ChessAI.transpositionTable.resize(self.hashMB)
+                ChessParallel.closePool() #the pool processes get their tables from this process when they start
+                self.startPool()
+
+            elif name == 'threads':
+
+                self.threads = min(max(int(value), 1), MAX_THREADS)
+                self.startPool()
+
+            else:
+
+                send('info string Unknown option ' + match.group(1))
+
+        except (TypeError, ValueError):
+
+            send('info string Invalid value for option ' + match.group(1))
+
+    '''
+    Forgets everything learned in the last game
+    '''
+    def newGame(self):
+
+        self.ready()
+        ChessAI.transpositionTable.clear()
+        for history in ChessAI.historyTable:
+
+            history[:] = [0] * len(history)
+
+        ChessParallel.closePool()
+        self.startPool()
+
+    '''
+    Starts the process pool of the parallel search for Threads > 1. It has to be started from the command loop between two reads: a process
+    forked from the search thread while the command loop is blocked reading stdin hangs on the stdin lock as it starts up
+    '''
+    def startPool(self):
+
+        if self.threads > 1:
+
+            ChessParallel.getPool(self.threads, self.stopValue)
+
+    '''
+    position [startpos | fen <fen>] [moves <move> ...]
+    '''
+    def position(self, tokens):
+
+        self.ready()
+        self.stop() #the GUI shouldn't send a position while searching, but the search mustn't see the game state change under it
+        movesIndex = tokens.index('moves') if 'moves' in tokens else len(tokens)
+        fen = ' '.join(tokens[1:movesIndex]) if tokens and tokens[0] == 'fen' else None
+        try:
+
+            moveIDs = [moveIDFromUCI(text) for text in tokens[movesIndex + 1:]]
+            if fen != self.startFEN:
+
+                self.gameState = ChessFEN.loadFEN(ChessBitboard.GameState(), fen) if fen is not None else ChessBitboard.GameState()
+                self.startFEN = fen
+
+            ChessWorker.setPosition(self.gameState, moveIDs)
+
+        except ValueError as error: #the position stays at the last valid move
+
+            send('info string ' + str(error))
+
+    '''
+    Starts a search of the current position in the search thread, with the budget given by the go parameters
+    '''
+    def go(self, tokens):
+
+        self.ready()
+        self.stop()
+        parameters, infinite = {}, False
+        for index, token in enumerate(tokens):
+
+            if token == 'infinite':
+
+                infinite = True
+
+            elif index + 1 < len(tokens) and re.fullmatch(r'-?\d+', tokens[index + 1]):
+
+                parameters[token] = int(tokens[index + 1])
+
+        maxTimeMs = parameters.get('movetime')
+        clock = parameters.get('wtime' if self.gameState.whiteToMove else 'btime')
+        if clock is not None and not infinite: #share of the clock left, plus the increment, never more than is left on the clock
+
+            increment = parameters.get('winc' if self.gameState.whiteToMove else 'binc', 0)
+            budget = clock / max(parameters.get('movestogo', CLOCK_MOVES), 1) + increment
+            budget = max(min(budget, clock - MOVE_OVERHEAD_MS), 1)
+            maxTimeMs = min(maxTimeMs, budget) if maxTimeMs is not None else budget
+
+        maxNodes = parameters.get('nodes')
+        maxDepth = parameters.get('depth')
+        if maxDepth is None:
+
+            maxDepth = MAX_DEPTH if infinite or maxTimeMs is not None or maxNodes is not None else ChessAI.DEPTH
+
+        self.searchID += 1
+        self.stopped.clear()
+        self.searchThread = threading.Thread(target = self.search, args = (self.searchID, maxDepth, maxTimeMs, maxNodes, infinite), daemon = True)
+        self.searchThread.start()
+
+    '''
+    Runs in the search thread: searches, reports the result and the best move. An infinite search only reports its move once it is stopped
+    '''
+    def search(self, searchID, maxDepth, maxTimeMs, maxNodes, infinite):
+
+        gameState = self.gameState
+        validMoves = gameState.getValidMoves()
+        if not validMoves:
+
+            send('info depth 0 score ' + ('mate 0' if gameState.inCheck() else 'cp 0'))
+            if infinite:
+
+                self.stopped.wait()
+
+            send('bestmove 0000')
+            return
+
+        start = time.perf_counter()
+        move, score, depth = ChessParallel.parallelIterativeDeepening(gameState, validMoves, maxDepth, maxTimeMs, maxNodes, self.threads,
+                                                                      self.stopValue, searchID)
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        usedPool = self.threads > 1 and maxNodes is None and len(validMoves) > 1 #otherwise the parallel search runs the single process one
+        nodes = ChessParallel.lastSearchStats.get('nodes', 0) if usedPool else ChessAI.nodesSearched + ChessAI.quiescenceNodes
+        line = ChessAI.principalVariation(gameState, move, max(depth, 1))
+        send('info depth %d score %s nodes %d nps %d time %d pv %s' % (depth, scoreToUCI(score, depth), nodes, nodes / elapsed, elapsed * 1000,
+             ' '.join(moveToUCI(played) for played in line)))
+        if infinite:
+
+            self.stopped.wait()
+
+        send('bestmove ' + moveToUCI(move) + (' ponder ' + moveToUCI(line[1]) if len(line) > 1 else ''))
+
+    '''
+    Stops the search, if one is running, and waits for it to report its best move
+    '''
+    def stop(self):
+
+        if self.searchThread is not None:
+
+            with self.stopValue.get_lock():
+
+                self.stopValue.value = self.searchID
+
+            self.stopped.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+    def quit(self):
+
+        self.stop()
+        if ChessParallel is not None:
+
+            ChessParallel.closePool()
+
+'''
+Reads commands until quit or the end of the input. Unknown commands are ignored, as the protocol asks
+'''
+def main():
+
+    engine = UCIEngine()
+    for line in sys.stdin:
+
+        tokens = line.split()
+        if not tokens:
+
+            continue
+
+        command, arguments = tokens[0], tokens[1:]
+        if command == 'uci':
+
+            engine.uci()
+
+        elif command == 'isready':
+
+            engine.ready()
+            send('readyok')
+
+        elif command == 'setoption':
+
+            engine.setOption(arguments)
+
+        elif command == 'ucinewgame':
+
+            engine.newGame()
+
+        elif command == 'position':
+
+            engine.position(arguments)
+
+        elif command == 'go':
+
+            engine.go(arguments)
+
+        elif command == 'stop':
+
+            engine.stop()
+
+        elif command == 'quit':
+
+            break
+
+    engine.quit()
+    return 0
+
+#this is convention to protect from accidentally running the program when we import another class
+if __name__ == '__main__':
+
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+'''
+Long-lived engine process the UI talks to over a command channel, instead of starting a new process (and pickling the whole game state into
+it) for every AI move. The UI sends small commands: set the position (as the moveIDs played since the start, optionally from a FEN), go,
+stop, and reads back the result. The worker keeps its game state, transposition table and process pool between moves, so everything the
+search learned carries over for the rest of the game.
+'''
+import atexit
+import multiprocessing
+import queue
+import time
+import ChessAI
+import ChessBitboard
+import ChessFEN
+import ChessParallel
+
+'''
+Runs in the engine process: applies commands from the command queue until 'quit'. Search results are put on the result queue as
+(searchID, moveID, score, depth, ponderMoveID), moveID is None if there was no valid move or the search was stopped before it started.
+ponderMoveID is the reply the search expects, None if it doesn't know one. showStats sets ChessAI.SHOW_SEARCH_STATS in this process
+'''
+def workerLoop(commands, results, stopValue, showStats):
+
+    ChessAI.SHOW_SEARCH_STATS = showStats
+    gameState, startFEN = ChessBitboard.GameState(), None
+    while True:
+
+        command = commands.get()
+        if command[0] == 'position':
+
+            fen, moveIDs = command[1], command[2]
+            try:
+
+                if fen != startFEN:
+
+                    gameState = ChessFEN.loadFEN(ChessBitboard.GameState(), fen) if fen is not None else ChessBitboard.GameState()
+                    startFEN = fen
+
+                setPosition(gameState, moveIDs)
+
+            except ValueError as error: #keeps the moves that were valid (or the last position if the FEN is invalid), the next position command starts from there
+
+                print(error)
+
+        elif command[0] == 'go':
+
+            searchID, maxDepth, maxTimeMs, maxNodes, workers = command[1:]
+            validMoves = gameState.getValidMoves()
+            if stopValue.value >= searchID or not validMoves: #stopped before it got to run
+
+                results.put((searchID, None, 0, 0, None))
+                continue
+
+            start = time.perf_counter()
+            move, score, depth = ChessParallel.parallelIterativeDeepening(gameState, validMoves, maxDepth, maxTimeMs, maxNodes, workers, stopValue, searchID)
+            if ChessAI.SHOW_SEARCH_STATS and depth == 0:
+
+                print('Book move ' + move.getChessNotation())
+
+            elif ChessAI.SHOW_SEARCH_STATS:
+
+                print('Depth %d, score %d in %.0fms on %d workers' % (depth, score, (time.perf_counter() - start) * 1000, workers), end = '')
+                if workers <= 1: #the parallel search fills the tables of the pool processes instead
+
+                    stats = ChessAI.transpositionTable.getStats()
+                    print('. Hash: %.1f%% hits (%d/%d probes), %.1f%% full of %dMB' % (stats['hitRate'], stats['hits'], stats['probes'],
+                          stats['fillPercentage'], stats['sizeMB']), end = '')
+
+                print()
+
+            results.put((searchID, move.moveID if move is not None else None, score, depth, expectedReply(gameState, move) if move is not None else None))
+
+        elif command[0] == 'quit':
+
+            ChessParallel.closePool()
+            break
+
+'''
+Returns the moveID of the best reply to move stored in the transposition table, which is the one the search expects, or None if there isn't one.
+The parallel search fills the tables of the pool processes instead, so it only finds one if the position was searched before
+'''
+def expectedReply(gameState, move):
+
+    gameState.makeMove(move)
+    entry = ChessAI.transpositionTable.probe(gameState.zobristHash)
+    reply = gameState.getMove(entry[3]) if entry is not None and entry[3] is not None else None
+    gameState.undoMove()
+    return reply.moveID if reply is not None else None
+
+'''
+Brings the game state to the position after the given moveIDs. Moves both positions have in common are kept, so following a game only makes
+the new moves. Raises ValueError for a moveID that isn't valid in its position
+'''
+def setPosition(gameState, moveIDs):
+
+    common = 0
+    while common < len(gameState.moveLog) and common < len(moveIDs) and gameState.moveLog[common].moveID == moveIDs[common]:
+
+        common += 1
+
+    while len(gameState.moveLog) > common:
+
+        gameState.undoMove()
+
+    for moveID in moveIDs[common:]:
+
+        moves = {move.moveID: move for move in gameState.getValidMoves()}
+        if moveID not in moves:
+
+            raise ValueError('Move ' + str(moveID) + ' is not valid in this position')
+
+        gameState.makeMove(moves[moveID])
+
+    gameState.getBoardMaterial()
+    gameState.getValidMoves() #sets checkmate and stalemate for the new position
+
+'''
+Handle to the engine process. Every go gets a new search ID, stale results (from searches that were stopped) are dropped when reading results.
+While the opponent thinks, the engine can ponder: search the position after the reply it expects, so if that reply is played its search has
+already been running (or is done) and the result comes back straight away
+'''
+class EngineWorker():
+
+    def __init__(self, showStats = False):
+
+        self.commands, self.results = multiprocessing.Queue(), multiprocessing.Queue()
+        self.stopValue = multiprocessing.Value('q', 0) #ID of the last search told to stop
+        self.searchID = 0
+        self.ponderMoves = None #moveIDs of the position being pondered, None if not pondering
+        #not a daemon, since daemon processes can't start the process pool of a parallel search
+        self.process = multiprocessing.Process(target = workerLoop, args = (self.commands, self.results, self.stopValue, showStats))
+        self.process.start()
+        atexit.register(self.quit)
+
+    '''
+    Sets the position to search, as the moveIDs played from the starting position, or from the FEN position if one is given
+    '''
+    def setPosition(self, moves = (), fen = None):
+
+        self.commands.put(('position', fen, list(moves)))
+
+    '''
+    Starts searching the current position with the given budget (see ChessAI.iterativeDeepening) on the given number of processes.
+    Returns the search ID, the result comes back through poll or result
+    '''
+    def go(self, maxDepth = None, maxTimeMs = None, maxNodes = None, workers = 1):
+
+        self.ponderMoves = None
+        self.searchID += 1
+        self.commands.put(('go', self.searchID, maxDepth, maxTimeMs, maxNodes, workers))
+        return self.searchID
+
+    '''
+    Starts pondering the position after moves and the expected reply ponderMoveID (see result), with the budget of a normal search. A time
+    budget counts from now, so time spent pondering is time saved once the reply is played. Without an expected reply the position after moves
+    is searched instead, which still fills the transposition table with the replies. Returns the search ID
+    '''
+    def ponder(self, moves, ponderMoveID = None, maxDepth = None, maxTimeMs = None, maxNodes = None, workers = 1):
+
+        ponderMoves = list(moves) + ([ponderMoveID] if ponderMoveID is not None else [])
+        self.setPosition(ponderMoves)
+        searchID = self.go(maxDepth, maxTimeMs, maxNodes, workers)
+        self.ponderMoves = ponderMoves
+        return searchID
+
+    '''
+    Called once the opponent has moved, moves being every moveID played so far. Returns True if the engine was pondering this position, the
+    ponder search then carries on as the search for this move and its result comes through poll or result. Otherwise the ponder search is
+    stopped and False is returned, the caller starts a new search
+    '''
+    def ponderHit(self, moves):
+
+        ponderMoves, self.ponderMoves = self.ponderMoves, None
+        if ponderMoves is not None and ponderMoves == list(moves):
+
+            return True
+
+        if ponderMoves is not None:
+
+            self.stop()
+
+        return False
+
+    '''
+    Stops the current search. Its result is thrown away, and the engine is ready for the next position as soon as the search notices
+    '''
+    def stop(self):
+
+        with self.stopValue.get_lock():
+
+            self.stopValue.value = self.searchID
+
+    '''
+    Returns (moveID, score, depth, ponderMoveID) of the current search if it has finished, otherwise None. Never blocks
+    '''
+    def poll(self):
+
+        return self.result(0)
+
+    '''
+    Waits up to timeout seconds (forever if None) for the result of the current search. Returns (moveID, score, depth, ponderMoveID), or None on
+    timeout. ponderMoveID is the reply the engine expects, for ponder. Always None while pondering, the result is kept until ponderHit
+    '''
+    def result(self, timeout = None):
+
+        if self.ponderMoves is not None:
+
+            return None
+
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        while True:
+
+            try:
+
+                remaining = max(0, deadline - time.perf_counter()) if deadline is not None else None
+                searchID, moveID, score, depth, ponderMoveID = self.results.get(remaining is None or remaining > 0, remaining)
+
+            except queue.Empty:
+
+                return None
+
+            if searchID == self.searchID and searchID > self.stopValue.value:
+
+                return moveID, score, depth, ponderMoveID
+
+    def quit(self):
+
+        if self.process.is_alive():
+
+            self.stop()
+            self.commands.put(('quit',))
+            self.process.join(5)
+            if self.process.is_alive():
+
+                self.process.terminate()